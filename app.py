@@ -4,9 +4,9 @@ import pandas as pd
 st.set_page_config(layout="wide", page_title="e-MCM App - GST Audit 1")
 
 # --- Custom Module Imports ---
-from config import MASTER_DRIVE_FOLDER_NAME # Example of using config
+from config import MASTER_DRIVE_FOLDER_NAME, DRIVE_CHANGES_WATCHER_ENABLED # Example of using config
 from css_styles import load_custom_css
-from google_utils import get_google_services, initialize_drive_structure
+from google_utils import get_google_services, initialize_drive_structure, start_drive_changes_watcher
 from ui_login import login_page
 from ui_pco import pco_dashboard
 from ui_audit_group import audit_group_dashboard
@@ -35,7 +35,7 @@ if 'drive_structure_initialized' not in st.session_state: st.session_state.drive
 if not st.session_state.logged_in:
     login_page()
 else:
-    # Initialize Google Services if not already done
+    # Attach the process-wide Google clients to this session if not already done
     if 'drive_service' not in st.session_state or 'sheets_service' not in st.session_state or \
             st.session_state.drive_service is None or st.session_state.sheets_service is None:
         with st.spinner("Initializing Google Services..."):
@@ -48,6 +48,8 @@ else:
 
     # Proceed only if Google services are available
     if st.session_state.drive_service and st.session_state.sheets_service:
+        if DRIVE_CHANGES_WATCHER_ENABLED:
+            start_drive_changes_watcher() # Process-wide, started once; invalidates caches as files change
         # Initialize Drive Structure if not already done
         if not st.session_state.get('drive_structure_initialized'):
             with st.spinner(
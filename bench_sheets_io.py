@@ -0,0 +1,168 @@
+# bench_sheets_io.py
+# Benchmarks the Sheets I/O helpers in google_utils (read, append, update, delete) against the
+# offline storage backend (local_storage_backend.py) with realistic 14-column DAR rows.
+#
+# Usage:
+#   python bench_sheets_io.py                                   # 1k/10k/100k rows -> bench_results.json
+#   python bench_sheets_io.py --sizes 1000 10000 --output out.json --latency 0.05
+#
+# Every (operation, size) case runs in its own subprocess against a fresh storage directory, so
+# peak RSS, API call counts and payload bytes are attributable to that case alone. Results are
+# written as JSON for comparison between releases.
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+OPERATIONS = ['read', 'read_typed', 'read_columns', 'read_chunked', 'append', 'update_incremental', 'update_full', 'delete']
+RESULT_MARKER = "BENCH_RESULT "
+APPEND_BATCH_ROWS = 20  # About one DAR's worth of paras
+CHANGED_ROW_FRACTION = 0.01  # Rows edited / deleted by the update and delete cases
+
+def generate_dar_rows(num_rows, seed=42):
+    """Deterministic rows in DAR_SHEET_COLUMNS order, grouped into DARs of 1-12 paras."""
+    rng = random.Random(seed)
+    rows = []
+    categories = ['Large', 'Medium', 'Small']
+    statuses = ['Agreed and Paid', 'Agreed yet to pay', 'Partially agreed and paid', 'Not agreed']
+    while len(rows) < num_rows:
+        group = rng.randint(1, 30)
+        gstin = f"{rng.randint(10, 37)}{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))}{rng.randint(1000, 9999)}A1Z{rng.randint(1, 9)}"
+        trade_name = f"Trade Name {rng.randint(1, 10**6)} Private Limited"
+        url = f"https://drive.google.com/file/d/{''.join(rng.choice('abcdef0123456789') for _ in range(33))}/view?usp=drivesdk"
+        created = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+        detected, recovered = rng.randint(10**4, 10**8), rng.randint(0, 10**7)
+        for para_no in range(1, rng.randint(1, 12) + 1):
+            rows.append([
+                group, (group - 1) // 3 + 1, gstin, trade_name, rng.choice(categories), detected, recovered,
+                para_no, f"Short payment of tax on {rng.choice(['outward supplies', 'RCM services', 'ITC reversal', 'interest'])} for FY 2023-24",
+                round(rng.uniform(0, 50), 2), round(rng.uniform(0, 10), 2), rng.choice(statuses), url, created
+            ])
+    return rows[:num_rows]
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1) # bytes on macOS, KiB on Linux
+
+def run_case(operation, num_rows):
+    """Runs one case in this process (expects the local backend environment) and returns its metrics."""
+    import google_utils as gu
+
+    drive_service, sheets_service = gu.get_google_services()
+    backend = sheets_service.backend
+    spreadsheet_id, _ = gu.create_spreadsheet(sheets_service, drive_service, f"bench_{operation}_{num_rows}")
+    gu.append_to_spreadsheet(sheets_service, spreadsheet_id, generate_dar_rows(num_rows))
+
+    # Untimed preparation for the write cases
+    rng = random.Random(7)
+    changed_count = max(1, int(num_rows * CHANGED_ROW_FRACTION))
+    if operation.startswith('update'):
+        df = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+        edited_rows = rng.sample(range(len(df)), changed_count)
+        df.loc[edited_rows, 'Status of para'] = 'Agreed and Paid (revised)'
+    elif operation == 'delete':
+        # Deletes come in runs, like removing all paras of a DAR
+        starts = rng.sample(range(0, max(1, num_rows - 5)), max(1, changed_count // 5))
+        delete_indices = sorted({i for start in starts for i in range(start, min(start + 5, num_rows))})
+    elif operation == 'append':
+        new_rows = generate_dar_rows(APPEND_BATCH_ROWS, seed=99)
+
+    rss_after_setup = _peak_rss_mb()
+    gu.reset_api_call_stats()
+    backend.reset_transfer_stats()
+    started = time.perf_counter()
+    if operation == 'read':
+        result_size = len(gu.read_from_spreadsheet(sheets_service, spreadsheet_id, use_cache=False))
+    elif operation == 'read_typed':
+        result_size = len(gu.read_from_spreadsheet(sheets_service, spreadsheet_id, use_cache=False, typed=True))
+    elif operation == 'read_chunked':
+        result_size = len(gu.read_spreadsheet_chunked(sheets_service, spreadsheet_id, typed=True))
+    elif operation == 'read_columns':
+        result_size = len(gu.read_spreadsheet_columns(sheets_service, spreadsheet_id, ['Audit Group Number', 'DAR PDF URL']))
+    elif operation == 'append':
+        result_size = bool(gu.append_to_spreadsheet(sheets_service, spreadsheet_id, new_rows)) and len(new_rows)
+    elif operation == 'update_incremental':
+        result_size = gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, df, incremental=True) and changed_count
+    elif operation == 'update_full':
+        result_size = gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, df, incremental=False) and len(df)
+    elif operation == 'delete':
+        result_size = gu.delete_spreadsheet_rows(sheets_service, spreadsheet_id, None, delete_indices) and len(delete_indices)
+    else:
+        raise ValueError(f"Unknown operation: {operation}")
+    wall_seconds = time.perf_counter() - started
+
+    api_stats = gu.get_api_call_stats()
+    transfer = backend.get_transfer_stats()
+    return {
+        'operation': operation,
+        'rows': num_rows,
+        'rows_affected': int(result_size or 0),
+        'wall_seconds': round(wall_seconds, 4),
+        'api_calls': sum(s['calls'] for s in api_stats.values()),
+        'api_calls_by_method': {method: s['calls'] for method, s in sorted(api_stats.items())},
+        'request_bytes': transfer['request_bytes'],
+        'response_bytes': transfer['response_bytes'],
+        'peak_rss_mb_after_setup': rss_after_setup,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def _run_case_subprocess(operation, num_rows, latency_seconds):
+    with tempfile.TemporaryDirectory(prefix="bench_sheets_io_") as storage_root:
+        env = dict(os.environ,
+                   EMCM_STORAGE_BACKEND="local",
+                   EMCM_LOCAL_STORAGE_ROOT=storage_root,
+                   EMCM_LOCAL_STORAGE_LATENCY_SECONDS=str(latency_seconds),
+                   EMCM_LOCAL_STORAGE_MEASURE_PAYLOAD="1")
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', operation, '--rows', str(num_rows)],
+                                   env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'operation': operation, 'rows': num_rows, 'error': (completed.stderr or completed.stdout).strip()[-2000:]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark google_utils Sheets I/O against the offline storage backend.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Sheet sizes in data rows")
+    parser.add_argument('--operations', nargs='+', default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds of latency per API call")
+    parser.add_argument('--output', default='bench_results.json', help="Machine-readable results file")
+    parser.add_argument('--run-case', choices=OPERATIONS, help=argparse.SUPPRESS) # Internal: child process mode
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(RESULT_MARKER + json.dumps(run_case(args.run_case, args.rows)))
+        return
+
+    results = []
+    for num_rows in args.sizes:
+        for operation in args.operations:
+            result = _run_case_subprocess(operation, num_rows, args.latency)
+            results.append(result)
+            if 'error' in result:
+                print(f"{operation:>20} {num_rows:>8} rows  FAILED: {result['error'].splitlines()[-1] if result['error'] else ''}")
+            else:
+                print(f"{operation:>20} {num_rows:>8} rows  {result['wall_seconds']:>9.3f}s  {result['api_calls']:>3} calls  "
+                      f"{(result['request_bytes'] + result['response_bytes']) / 1024:>10.1f} KiB  {result['peak_rss_mb']:>7.1f} MiB peak")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': 'local',
+            'latency_seconds': args.latency,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,49 @@
 # config.py
+import os
 import streamlit as st
 
 # --- Google API Configuration ---
 SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
+GOOGLE_API_MAX_WORKERS = 8  # Upper bound for thread pools that fan out Drive/Sheets calls
+SHEET_READ_BLOCK_ROWS = 5000  # Rows per values.get in chunked reads of large sheets
+DRIVE_DOWNLOAD_CHUNK_BYTES = 4 * 1024 * 1024  # Bytes per get_media range request (the client default is 100 MiB)
+DRIVE_DOWNLOAD_MEMORY_THRESHOLD_BYTES = 8 * 1024 * 1024  # Larger downloads spill to a memory-mapped temp file
+DRIVE_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024  # Bytes per resumable upload request; must be a multiple of 256 KiB
+
+# --- Google API quotas (requests per minute for the service account) ---
+DRIVE_REQUESTS_PER_MINUTE = 12000
+SHEETS_READ_REQUESTS_PER_MINUTE = 60
+SHEETS_WRITE_REQUESTS_PER_MINUTE = 60
+GOOGLE_API_MAX_RETRIES = 5  # Retries on 429/5xx/rate-limit 403 before the error is surfaced
 # CREDENTIALS_FILE = 'credentials.json' # Kept for reference, but get_google_services uses st.secrets
 
+# --- Storage backend ---
+# "google" talks to Drive/Sheets; "local" swaps in the offline stand-in from local_storage_backend.py
+# (filesystem + SQLite) for load tests and benchmarks without Google credentials.
+STORAGE_BACKEND = os.environ.get("EMCM_STORAGE_BACKEND", "google")
+LOCAL_STORAGE_ROOT = os.environ.get("EMCM_LOCAL_STORAGE_ROOT", "local_storage")
+LOCAL_STORAGE_LATENCY_SECONDS = float(os.environ.get("EMCM_LOCAL_STORAGE_LATENCY_SECONDS", "0"))  # Added to every call
+LOCAL_STORAGE_ERROR_RATE = float(os.environ.get("EMCM_LOCAL_STORAGE_ERROR_RATE", "0"))  # Fraction of calls failing with 503
+LOCAL_STORAGE_ENFORCE_QUOTAS = os.environ.get("EMCM_LOCAL_STORAGE_ENFORCE_QUOTAS", "0") == "1"  # 429 past the Sheets per-minute quotas
+LOCAL_STORAGE_MEASURE_PAYLOAD = os.environ.get("EMCM_LOCAL_STORAGE_MEASURE_PAYLOAD", "0") == "1"  # Count JSON bytes per call
+
+# --- Drive changes watcher (push-style cache invalidation, see google_utils) ---
+DRIVE_CHANGES_WATCHER_ENABLED = True
+DRIVE_CHANGES_POLL_SECONDS = 15
+DRIVE_CHANGES_PAGE_TOKEN_FILE = "drive_changes_page_token.txt"  # Lets a restarted app resume from where it stopped
+
+# --- Local mirror of period spreadsheets (see sheet_mirror.py) ---
+LOCAL_MIRROR_ENABLED = True  # Dashboards read period sheets from the local SQLite mirror
+LOCAL_MIRROR_DB_PATH = "sheet_mirror.sqlite3"
+LOCAL_MIRROR_SYNC_INTERVAL_SECONDS = 60  # How often the background thread checks Drive for changes
+
 # --- Google Drive Master Configuration ---
 MASTER_DRIVE_FOLDER_NAME = "e-MCM_Root_DAR_App"  # Master folder on Google Drive
 MCM_PERIODS_FILENAME_ON_DRIVE = "mcm_periods_config.json"  # Config file on Google Drive
+MCM_PERIODS_REVALIDATE_SECONDS = 30  # Max age of the shared in-process copy before its Drive revision is rechecked
+DEFERRED_DAR_UPLOAD_ENABLED = True  # Upload DAR PDFs in the background during extraction; awaited at submit
+DRIVE_SHARING_MODE = "folder"  # "folder": files inherit their folder's public read permission; "per_file": share every file
+DRIVE_SHARING_RECONCILE_BATCH_SIZE = 100  # Items listed and fixed per batch by the sharing reconciliation job
 
 # --- User Credentials ---
 USER_CREDENTIALS = {
@@ -1,25 +1,127 @@
 # google_utils.py
 import streamlit as st
 import os
+import copy
+import csv
+import hashlib
 import json
-from io import BytesIO
+import time
+import random
+import threading
+import weakref
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from io import BytesIO, StringIO, RawIOBase, SEEK_SET, SEEK_CUR, SEEK_END
+import numpy as np
 import pandas as pd
+import mmap
+import tempfile
 import math # Added for ceil, though not directly used here, good to have if needed
 
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaIoBaseDownload
+from googleapiclient.http import HttpRequest, MediaFileUpload, MediaIoBaseUpload, MediaIoBaseDownload
 
-from config import SCOPES, MASTER_DRIVE_FOLDER_NAME, MCM_PERIODS_FILENAME_ON_DRIVE
+from config import (
+    SCOPES, MASTER_DRIVE_FOLDER_NAME, MCM_PERIODS_FILENAME_ON_DRIVE, GOOGLE_API_MAX_WORKERS,
+    DRIVE_REQUESTS_PER_MINUTE, SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_WRITE_REQUESTS_PER_MINUTE,
+    GOOGLE_API_MAX_RETRIES, STORAGE_BACKEND, LOCAL_STORAGE_ROOT, LOCAL_STORAGE_LATENCY_SECONDS,
+    LOCAL_STORAGE_ERROR_RATE, LOCAL_STORAGE_ENFORCE_QUOTAS, LOCAL_STORAGE_MEASURE_PAYLOAD,
+    DRIVE_CHANGES_POLL_SECONDS, DRIVE_CHANGES_PAGE_TOKEN_FILE, MCM_PERIODS_REVALIDATE_SECONDS,
+    DRIVE_SHARING_MODE, DRIVE_SHARING_RECONCILE_BATCH_SIZE, SHEET_READ_BLOCK_ROWS,
+    DRIVE_DOWNLOAD_CHUNK_BYTES, DRIVE_DOWNLOAD_MEMORY_THRESHOLD_BYTES, DRIVE_UPLOAD_CHUNK_BYTES
+)
+from local_storage_backend import build_local_services
+
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+# Current 14-column layout of every MCM period spreadsheet
+DAR_SHEET_COLUMNS = [
+    "Audit Group Number", "Audit Circle Number", "GSTIN", "Trade Name", "Category",
+    "Total Amount Detected (Overall Rs)", "Total Amount Recovered (Overall Rs)",
+    "Audit Para Number", "Audit Para Heading",
+    "Revenue Involved (Lakhs Rs)", "Revenue Recovered (Lakhs Rs)", "Status of para",
+    "DAR PDF URL", "Record Created Date"
+]
+
+# dtypes used by typed reads (read_from_spreadsheet(..., typed=True)) of period spreadsheets
+DAR_SHEET_SCHEMA = {
+    "Audit Group Number": "Int16", "Audit Circle Number": "Int16", "Audit Para Number": "Int16",
+    "Total Amount Detected (Overall Rs)": "float64", "Total Amount Recovered (Overall Rs)": "float64",
+    "Revenue Involved (Lakhs Rs)": "float64", "Revenue Recovered (Lakhs Rs)": "float64",
+    "Category": "category", "Status of para": "category",
+    "Record Created Date": "datetime64[ns]",
+}
+
+# --- Shared (process-wide) Google API clients ---
+# One credentials object and one Drive/Sheets service pair serve every Streamlit session.
+# httplib2 is not thread-safe, so each HTTP request is bound to the calling thread's own
+# authorized transport instead of a single shared connection stack.
+_thread_local_transport = threading.local()
+_credentials_refresh_lock = threading.Lock()
+
+def _refresh_credentials_if_needed(creds):
+    """Refreshes the shared access token; concurrent callers wait for a single refresh."""
+    if creds.valid:
+        return
+    with _credentials_refresh_lock:
+        if not creds.valid:
+            creds.refresh(google_auth_httplib2.Request(httplib2.Http()))
+
+def _get_thread_authorized_http(creds):
+    authorized_http = getattr(_thread_local_transport, 'authorized_http', None)
+    if authorized_http is None:
+        authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        _thread_local_transport.authorized_http = authorized_http
+    return authorized_http
+
+def _make_request_builder(creds):
+    def build_request(http, *args, **kwargs):
+        _refresh_credentials_if_needed(creds)
+        return HttpRequest(_get_thread_authorized_http(creds), *args, **kwargs)
+    return build_request
+
+@st.cache_resource(show_spinner=False)
+def _get_shared_credentials():
+    creds_dict = st.secrets["google_credentials"]
+    creds = service_account.Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+    _refresh_credentials_if_needed(creds)
+    return creds
+
+@st.cache_resource(show_spinner=False)
+def _get_local_storage_services():
+    # Offline stand-in selected by STORAGE_BACKEND = "local"; one backend shared by all threads
+    return build_local_services(
+        LOCAL_STORAGE_ROOT,
+        latency_seconds=LOCAL_STORAGE_LATENCY_SECONDS,
+        error_rate=LOCAL_STORAGE_ERROR_RATE,
+        sheets_read_quota_per_minute=SHEETS_READ_REQUESTS_PER_MINUTE if LOCAL_STORAGE_ENFORCE_QUOTAS else None,
+        sheets_write_quota_per_minute=SHEETS_WRITE_REQUESTS_PER_MINUTE if LOCAL_STORAGE_ENFORCE_QUOTAS else None,
+        measure_payload=LOCAL_STORAGE_MEASURE_PAYLOAD
+    )
+
+@st.cache_resource(show_spinner=False)
+def _get_shared_google_clients():
+    if STORAGE_BACKEND == "local":
+        return _get_local_storage_services()
+    creds = _get_shared_credentials()
+    request_builder = _make_request_builder(creds)
+    # Static discovery documents ship with google-api-python-client, so no discovery fetch is made.
+    drive_service = build('drive', 'v3', http=_get_thread_authorized_http(creds),
+                          requestBuilder=request_builder, static_discovery=True, cache_discovery=False)
+    sheets_service = build('sheets', 'v4', http=_get_thread_authorized_http(creds),
+                           requestBuilder=request_builder, static_discovery=True, cache_discovery=False)
+    return drive_service, sheets_service
 
 def get_google_services():
-    creds = None
+    if STORAGE_BACKEND == "local":
+        return _get_local_storage_services()
     try:
-        creds_dict = st.secrets["google_credentials"]
-        creds = service_account.Credentials.from_service_account_info(
-            creds_dict, scopes=SCOPES
-        )
+        _get_shared_credentials()
     except KeyError:
         st.error("Google credentials not found in Streamlit secrets. Ensure 'google_credentials' are set.")
         return None, None
@@ -27,12 +129,8 @@ def get_google_services():
         st.error(f"Failed to load service account credentials from secrets: {e}")
         return None, None
 
-    if not creds: return None, None
-
     try:
-        drive_service = build('drive', 'v3', credentials=creds)
-        sheets_service = build('sheets', 'v4', credentials=creds)
-        return drive_service, sheets_service
+        return _get_shared_google_clients()
     except HttpError as error:
         st.error(f"An error occurred initializing Google services: {error}")
         return None, None
@@ -40,6 +138,299 @@ def get_google_services():
         st.error(f"An unexpected error with Google services: {e}")
         return None, None
 
+# --- Per-thread clients for worker pools ---
+# Service objects built here are owned by a single thread and talk to Google through a
+# requests AuthorizedSession, so tasks fanned out over a thread pool never share a connection.
+_thread_local_clients = threading.local()
+
+class _AuthorizedSessionHttp:
+    """Minimal httplib2.Http stand-in that lets googleapiclient run on an AuthorizedSession."""
+    def __init__(self, creds, timeout=120):
+        self.credentials_for_refresh = creds
+        self.session = AuthorizedSession(creds)
+        self.timeout = timeout
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        _refresh_credentials_if_needed(self.credentials_for_refresh)
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        info = dict(response.headers)
+        info['status'] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+def get_thread_google_services():
+    """Returns (drive_service, sheets_service) owned by the calling thread, built once per thread."""
+    if STORAGE_BACKEND == "local":
+        return _get_local_storage_services() # The local backend is thread-safe and shared
+    services = getattr(_thread_local_clients, 'services', None)
+    if services is None:
+        creds = _get_shared_credentials()
+        session_http = _AuthorizedSessionHttp(creds)
+        drive_service = build('drive', 'v3', http=session_http, static_discovery=True, cache_discovery=False)
+        sheets_service = build('sheets', 'v4', http=session_http, static_discovery=True, cache_discovery=False)
+        services = (drive_service, sheets_service)
+        _thread_local_clients.services = services
+    return services
+
+def _attach_script_run_ctx(ctx):
+    # Lets st.warning/st.error raised inside worker threads reach the session that started them
+    if ctx is not None:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+def map_google_tasks(task, items, max_workers=GOOGLE_API_MAX_WORKERS):
+    """
+    Runs task(drive_service, sheets_service, item) for every item on a thread pool, each worker
+    using its own thread-local clients from get_thread_google_services().
+
+    Yields (index, result, error) tuples in completion order, so callers can report progress
+    from the main script thread. error is the raised exception, or None on success.
+    """
+    items = list(items)
+    if not items:
+        return
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+
+    def run_task(item):
+        drive_service, sheets_service = get_thread_google_services()
+        return task(drive_service, sheets_service, item)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))),
+                            initializer=_attach_script_run_ctx, initargs=(ctx,)) as executor:
+        futures = {executor.submit(run_task, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
+
+# --- Quota-aware request executor ---
+# Every Drive/Sheets call made by this module goes through execute_google_request(): a token
+# bucket per quota (Drive, Sheets reads, Sheets writes) paces the process below the per-minute
+# limits, and retryable failures (429, 5xx, rate-limit 403s, dropped connections) are retried
+# with exponential backoff and full jitter. Calls, retries, errors and time spent throttled are
+# counted per API method.
+#
+# Calls that create something are not idempotent: a 5xx or a dropped connection can arrive after
+# Google already applied the call, and resending it would duplicate DAR rows, files or permissions.
+# Those are retried only on 429 and rate-limit 403s, which Google returns before doing any work.
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+_NON_IDEMPOTENT_METHODS = {
+    'sheets.spreadsheets.values.append', 'sheets.spreadsheets.create',
+    'drive.files.create', 'drive.permissions.create',
+}
+_RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 32.0
+
+class _TokenBucket:
+    def __init__(self, requests_per_minute):
+        self.capacity = float(requests_per_minute)
+        self.tokens = float(requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_seconds = (1 - self.tokens) / self.refill_per_second
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+_quota_buckets = {
+    'drive': _TokenBucket(DRIVE_REQUESTS_PER_MINUTE),
+    'sheets_read': _TokenBucket(SHEETS_READ_REQUESTS_PER_MINUTE),
+    'sheets_write': _TokenBucket(SHEETS_WRITE_REQUESTS_PER_MINUTE),
+}
+_api_call_stats = {}
+_api_call_stats_lock = threading.Lock()
+
+def _quota_bucket_for(request):
+    if (getattr(request, 'methodId', None) or '').startswith('sheets.'):
+        return _quota_buckets['sheets_read' if getattr(request, 'method', 'GET') == 'GET' else 'sheets_write']
+    return _quota_buckets['drive']
+
+def _record_api_call(endpoint, calls=0, retries=0, errors=0, throttled_seconds=0.0):
+    with _api_call_stats_lock:
+        stats = _api_call_stats.setdefault(endpoint, {'calls': 0, 'retries': 0, 'errors': 0, 'throttled_seconds': 0.0})
+        stats['calls'] += calls
+        stats['retries'] += retries
+        stats['errors'] += errors
+        stats['throttled_seconds'] += throttled_seconds
+
+def get_api_call_stats():
+    """Returns a snapshot of per-endpoint counters: {methodId: {calls, retries, errors, throttled_seconds}}."""
+    with _api_call_stats_lock:
+        return {endpoint: dict(stats) for endpoint, stats in _api_call_stats.items()}
+
+def reset_api_call_stats():
+    with _api_call_stats_lock:
+        _api_call_stats.clear()
+
+def _is_retryable_error(error, endpoint=None):
+    """Whether a failed call to endpoint (an API methodId) may be sent again; see _NON_IDEMPOTENT_METHODS."""
+    may_have_been_applied_ok = endpoint not in _NON_IDEMPOTENT_METHODS
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429:
+            return True
+        if status in _RETRYABLE_STATUSES:
+            return may_have_been_applied_ok
+        if status == 403:
+            content = error.content.decode('utf-8', 'ignore') if isinstance(error.content, bytes) else str(error.content)
+            return any(reason in content for reason in _RATE_LIMIT_REASONS)
+        return False
+    # Dropped connections and timeouts from httplib2 or requests
+    return may_have_been_applied_ok and isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+def _backoff_delay(attempt, error):
+    retry_after = None
+    if isinstance(error, HttpError):
+        retry_after = error.resp.get('retry-after')
+    if retry_after and str(retry_after).isdigit():
+        return float(retry_after)
+    return random.uniform(0, min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def execute_google_request(request, max_retries=GOOGLE_API_MAX_RETRIES):
+    """
+    Executes a googleapiclient request under the quota limiter, retrying retryable failures.
+    Non-retryable errors, and retryable ones once max_retries is exhausted, are re-raised.
+    """
+    endpoint = getattr(request, 'methodId', None) or 'unknown'
+    bucket = _quota_bucket_for(request)
+    attempt = 0
+    while True:
+        throttled_seconds = bucket.acquire()
+        _record_api_call(endpoint, calls=1, throttled_seconds=throttled_seconds)
+        try:
+            return request.execute()
+        except Exception as error:
+            if attempt >= max_retries or not _is_retryable_error(error, endpoint):
+                _record_api_call(endpoint, errors=1)
+                raise
+            _record_api_call(endpoint, retries=1)
+            time.sleep(_backoff_delay(attempt, error))
+            attempt += 1
+
+# --- Batched requests ---
+# Drive and Sheets accept up to 100 calls in one multipart batch HTTP request, which saves a
+# round-trip per call for maintenance jobs touching many files. Every sub-request still costs a
+# quota unit, so the buckets are charged per sub-request; sub-requests failing with a retryable
+# error are collected and resent together in a later batch after a backoff.
+GOOGLE_BATCH_MAX_REQUESTS = 100
+
+def execute_google_batch(service, requests, batch_size=GOOGLE_BATCH_MAX_REQUESTS, max_retries=GOOGLE_API_MAX_RETRIES):
+    """
+    Executes requests (all built from service) as batch HTTP requests of at most batch_size calls.
+    Returns a list of (response, error) tuples in the order of requests: error is None on success,
+    otherwise the exception of the sub-request's last attempt.
+    """
+    requests = list(requests)
+    outcomes = [(None, None)] * len(requests)
+    batch_size = max(1, min(batch_size, GOOGLE_BATCH_MAX_REQUESTS))
+    pending = list(range(len(requests)))
+    attempt = 0
+    while pending:
+        retry_indices, retry_error = [], None
+        for chunk_start in range(0, len(pending), batch_size):
+            chunk = pending[chunk_start:chunk_start + batch_size]
+            chunk_results = {}
+            batch = service.new_batch_http_request(
+                callback=lambda request_id, response, exception: chunk_results.__setitem__(int(request_id), (response, exception)))
+            for index in chunk:
+                throttled_seconds = _quota_bucket_for(requests[index]).acquire()
+                _record_api_call(getattr(requests[index], 'methodId', None) or 'unknown', calls=1, throttled_seconds=throttled_seconds)
+                batch.add(requests[index], request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as error: # The whole envelope failed: every sub-request shares its fate
+                chunk_results = {index: (None, error) for index in chunk}
+            for index in chunk:
+                response, error = chunk_results.get(index, (None, RuntimeError("No response for batched sub-request")))
+                endpoint = getattr(requests[index], 'methodId', None) or 'unknown'
+                if error is None:
+                    outcomes[index] = (response, None)
+                elif attempt < max_retries and _is_retryable_error(error, endpoint):
+                    _record_api_call(endpoint, retries=1)
+                    retry_indices.append(index)
+                    retry_error = retry_error or error
+                else:
+                    _record_api_call(endpoint, errors=1)
+                    outcomes[index] = (None, error)
+        if retry_indices:
+            time.sleep(_backoff_delay(attempt, retry_error))
+            attempt += 1
+        pending = retry_indices
+    return outcomes
+
+def _stream_drive_media(request, fh, chunk_size, max_retries):
+    """Writes a files().get_media request into fh chunk by chunk, one Drive quota token per chunk."""
+    if not isinstance(request, HttpRequest): # Local storage backend: the body comes back from execute()
+        fh.write(execute_google_request(request, max_retries))
+        return
+    downloader = MediaIoBaseDownload(fh, request, chunksize=chunk_size)
+    done = False
+    while not done:
+        throttled_seconds = _quota_buckets['drive'].acquire()
+        _record_api_call('drive.files.get_media', calls=1, throttled_seconds=throttled_seconds)
+        status, done = downloader.next_chunk(num_retries=max_retries)
+
+def download_drive_media(request, fh, max_retries=GOOGLE_API_MAX_RETRIES, chunk_size=DRIVE_DOWNLOAD_CHUNK_BYTES):
+    """Streams a files().get_media request into fh and rewinds it."""
+    _stream_drive_media(request, fh, chunk_size, max_retries)
+    fh.seek(0)
+    return fh
+
+class _SpillingDownloadBuffer:
+    """Write sink for downloads: a BytesIO up to memory_threshold bytes, an anonymous temp file beyond that."""
+    def __init__(self, memory_threshold):
+        self.memory_threshold = memory_threshold
+        self.size = 0
+        self._buffer = BytesIO()
+        self._file = None
+
+    def write(self, data):
+        if self._file is None and self.size + len(data) > self.memory_threshold:
+            self._file = tempfile.TemporaryFile(prefix="emcm_download_")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None # Drop the in-memory copy as soon as it is on disk
+        (self._file or self._buffer).write(data)
+        self.size += len(data)
+        return len(data)
+
+    def readable_view(self):
+        """The downloaded bytes as a seekable binary file-like object, positioned at 0."""
+        if self._file is None:
+            self._buffer.seek(0)
+            return self._buffer
+        self._file.flush()
+        # mmap supports read/seek/tell, which is all PdfReader and pdfplumber need. The mapping keeps its own
+        # handle, so the already-unlinked temp file is released when the view is closed or garbage-collected.
+        view = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file.close()
+        self._file = None
+        return view
+
+def download_drive_media_spooled(request, chunk_size=DRIVE_DOWNLOAD_CHUNK_BYTES,
+                                 memory_threshold=DRIVE_DOWNLOAD_MEMORY_THRESHOLD_BYTES, max_retries=GOOGLE_API_MAX_RETRIES):
+    """
+    Downloads a files().get_media request with bounded memory.
+    Returns a BytesIO for files up to memory_threshold bytes; larger ones are spooled to a temp file and returned
+    as a read-only memory-mapped view, so the pages live in the OS page cache rather than the Python heap.
+    """
+    sink = _SpillingDownloadBuffer(memory_threshold)
+    _stream_drive_media(request, sink, chunk_size, max_retries)
+    return sink.readable_view()
+
 def find_drive_item_by_name(drive_service, name, mime_type=None, parent_id=None):
     query = f"name = '{name}' and trashed = false"
     if mime_type:
@@ -47,7 +438,7 @@ def find_drive_item_by_name(drive_service, name, mime_type=None, parent_id=None)
     if parent_id:
         query += f" and '{parent_id}' in parents"
     try:
-        response = drive_service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+        response = execute_google_request(drive_service.files().list(q=query, spaces='drive', fields='files(id, name)'))
         items = response.get('files', [])
         if items:
             return items[0].get('id')
@@ -60,11 +451,113 @@ def find_drive_item_by_name(drive_service, name, mime_type=None, parent_id=None)
 def set_public_read_permission(drive_service, file_id):
     try:
         permission = {'type': 'anyone', 'role': 'reader'}
-        drive_service.permissions().create(fileId=file_id, body=permission).execute()
+        execute_google_request(drive_service.permissions().create(fileId=file_id, body=permission))
+        return True
     except HttpError as error:
         st.warning(f"Could not set public read permission for file ID {file_id}: {error}.")
     except Exception as e:
         st.warning(f"Unexpected error setting public permission for file ID {file_id}: {e}")
+    return False
+
+# --- Sharing ---
+# DRIVE_SHARING_MODE "folder": the anyone-reader permission is granted once per folder and files
+# created inside inherit it, saving a permissions.create call (and a quota unit) per upload or
+# new spreadsheet. "per_file" keeps sharing every new file individually.
+_shared_folder_ids = set() # Folders known to carry anyone-reader in this process
+_shared_folder_ids_lock = threading.Lock()
+
+def _has_public_read_permission(permissions):
+    return any(p.get('type') == 'anyone' and p.get('role') in ('reader', 'commenter', 'writer') for p in permissions or [])
+
+def _mark_folder_shared(folder_id):
+    with _shared_folder_ids_lock:
+        _shared_folder_ids.add(folder_id)
+
+def ensure_folder_shared(drive_service, folder_id):
+    """Grants anyone-reader on folder_id unless it already has it; checked once per folder per process."""
+    with _shared_folder_ids_lock:
+        if folder_id in _shared_folder_ids:
+            return True
+    try:
+        folder = execute_google_request(drive_service.files().get(fileId=folder_id, fields='permissions(type,role)'))
+    except HttpError as error:
+        st.warning(f"Could not check sharing of folder ID {folder_id}: {error}.")
+        return False
+    if _has_public_read_permission(folder.get('permissions')) or set_public_read_permission(drive_service, folder_id):
+        _mark_folder_shared(folder_id)
+        return True
+    return False
+
+def _share_new_drive_item(drive_service, file_id, parent_folder_id=None, is_folder=False):
+    if is_folder:
+        if DRIVE_SHARING_MODE == "folder" and parent_folder_id and ensure_folder_shared(drive_service, parent_folder_id):
+            _mark_folder_shared(file_id) # Inherits its (shared) parent's permission
+        elif set_public_read_permission(drive_service, file_id):
+            _mark_folder_shared(file_id)
+    elif DRIVE_SHARING_MODE == "folder" and parent_folder_id:
+        ensure_folder_shared(drive_service, parent_folder_id) # The file inherits the folder's permission
+    else:
+        set_public_read_permission(drive_service, file_id)
+
+def reconcile_drive_sharing(drive_service, root_folder_id, batch_size=DRIVE_SHARING_RECONCILE_BATCH_SIZE):
+    """
+    Brings the sharing of root_folder_id and everything below it in line with DRIVE_SHARING_MODE:
+    every folder gets anyone-reader, and in "per_file" mode every file does too. Items are listed
+    one page of batch_size at a time and each page's fixes go out as one batch request; yields running totals
+    {'folders', 'files', 'fixed', 'errors'} after each batch so callers can show progress.
+    """
+    stats = {'folders': 0, 'files': 0, 'fixed': 0, 'errors': 0}
+
+    def needs_fix(item_id, permissions, is_folder):
+        stats['folders' if is_folder else 'files'] += 1
+        if not is_folder and DRIVE_SHARING_MODE == "folder":
+            return False # Inherits its folder's permission
+        if _has_public_read_permission(permissions):
+            if is_folder:
+                _mark_folder_shared(item_id)
+            return False
+        return True
+
+    def fix_items(items):
+        # One batch HTTP request per page instead of a permissions.create round-trip per item
+        requests = [drive_service.permissions().create(fileId=item_id, body={'type': 'anyone', 'role': 'reader'}, fields='id')
+                    for item_id, _ in items]
+        for (item_id, is_folder), (_, error) in zip(items, execute_google_batch(drive_service, requests)):
+            if error is not None:
+                stats['errors'] += 1
+                continue
+            stats['fixed'] += 1
+            if is_folder:
+                _mark_folder_shared(item_id)
+
+    root = execute_google_request(drive_service.files().get(fileId=root_folder_id, fields='id, permissions(type,role)'))
+    if needs_fix(root_folder_id, root.get('permissions'), is_folder=True):
+        fix_items([(root_folder_id, True)])
+    pending_folders = [root_folder_id]
+    while pending_folders:
+        folder_id = pending_folders.pop(0)
+        page_token = None
+        while True:
+            response = execute_google_request(drive_service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                spaces='drive',
+                pageSize=batch_size,
+                pageToken=page_token,
+                fields='nextPageToken, files(id, mimeType, permissions(type,role))'
+            ))
+            to_fix = []
+            for item in response.get('files', []):
+                is_folder = item.get('mimeType') == 'application/vnd.google-apps.folder'
+                if is_folder:
+                    pending_folders.append(item['id'])
+                if needs_fix(item['id'], item.get('permissions'), is_folder):
+                    to_fix.append((item['id'], is_folder))
+            if to_fix:
+                fix_items(to_fix)
+            yield dict(stats)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
 
 def create_drive_folder(drive_service, folder_name, parent_id=None):
     try:
@@ -75,10 +568,10 @@ def create_drive_folder(drive_service, folder_name, parent_id=None):
         if parent_id:
             file_metadata['parents'] = [parent_id]
 
-        folder = drive_service.files().create(body=file_metadata, fields='id, webViewLink').execute()
+        folder = execute_google_request(drive_service.files().create(body=file_metadata, fields='id, webViewLink'))
         folder_id = folder.get('id')
         if folder_id:
-            set_public_read_permission(drive_service, folder_id)
+            _share_new_drive_item(drive_service, folder_id, parent_id, is_folder=True)
         return folder_id, folder.get('webViewLink')
     except HttpError as error:
         st.error(f"An error occurred creating Drive folder '{folder_name}': {error}")
@@ -114,10 +607,51 @@ def initialize_drive_structure(drive_service):
             st.session_state.mcm_periods_drive_file_id = mcm_file_id
     return True
 
+# --- Process-wide cache of the MCM periods config ---
+# Shared by every session. An entry is reused without any call while the changes watcher reports
+# no change to the file; otherwise it is revalidated against Drive's headRevisionId (a metadata-only
+# call) at most every MCM_PERIODS_REVALIDATE_SECONDS, so out-of-band edits are picked up and the
+# JSON is only downloaded when it actually changed. save_mcm_periods writes through.
+_mcm_periods_cache = {}
+_mcm_periods_cache_lock = threading.Lock()
+
+def _store_mcm_periods_cache(file_id, head_revision_id, periods):
+    with _mcm_periods_cache_lock:
+        _mcm_periods_cache.clear()
+        _mcm_periods_cache.update({
+            'file_id': file_id, 'head_revision_id': head_revision_id, 'periods': copy.deepcopy(periods),
+            'generation': get_drive_file_generation(file_id), 'checked_at': time.time()
+        })
+
+def _cached_mcm_periods(drive_service, file_id):
+    """Returns a copy of the cached periods if still current, else None."""
+    with _mcm_periods_cache_lock:
+        cached = dict(_mcm_periods_cache)
+    if cached.get('file_id') != file_id:
+        return None
+    if is_drive_changes_watcher_healthy():
+        if cached['generation'] == get_drive_file_generation(file_id):
+            return copy.deepcopy(cached['periods'])
+    elif time.time() - cached['checked_at'] < MCM_PERIODS_REVALIDATE_SECONDS:
+        return copy.deepcopy(cached['periods'])
+    generation = get_drive_file_generation(file_id)
+    file_meta = execute_google_request(drive_service.files().get(fileId=file_id, fields='headRevisionId'))
+    if file_meta.get('headRevisionId') != cached['head_revision_id']:
+        return None # Edited since we cached it (possibly outside this app)
+    with _mcm_periods_cache_lock:
+        if _mcm_periods_cache.get('file_id') == file_id:
+            _mcm_periods_cache['checked_at'] = time.time()
+            _mcm_periods_cache['generation'] = generation
+    return copy.deepcopy(cached['periods'])
+
 def load_mcm_periods(drive_service):
     mcm_periods_file_id = st.session_state.get('mcm_periods_drive_file_id')
     if not mcm_periods_file_id:
-        if st.session_state.get('master_drive_folder_id'):
+        with _mcm_periods_cache_lock:
+            mcm_periods_file_id = _mcm_periods_cache.get('file_id') # Found by another session already
+        if mcm_periods_file_id:
+            st.session_state.mcm_periods_drive_file_id = mcm_periods_file_id
+        elif st.session_state.get('master_drive_folder_id'):
             mcm_periods_file_id = find_drive_item_by_name(drive_service, MCM_PERIODS_FILENAME_ON_DRIVE,
                                                           parent_id=st.session_state.master_drive_folder_id)
             st.session_state.mcm_periods_drive_file_id = mcm_periods_file_id
@@ -126,17 +660,21 @@ def load_mcm_periods(drive_service):
 
     if mcm_periods_file_id:
         try:
+            cached_periods = _cached_mcm_periods(drive_service, mcm_periods_file_id)
+            if cached_periods is not None:
+                return cached_periods
+            # Revision first: if the file changes during the download the next check refetches it
+            head_revision_id = execute_google_request(drive_service.files().get(
+                fileId=mcm_periods_file_id, fields='headRevisionId')).get('headRevisionId')
             request = drive_service.files().get_media(fileId=mcm_periods_file_id)
-            fh = BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            fh.seek(0)
-            return json.load(fh)
+            periods = json.load(download_drive_media_spooled(request))
+            _store_mcm_periods_cache(mcm_periods_file_id, head_revision_id, periods)
+            return periods
         except HttpError as error:
             if error.resp.status == 404:
                 st.session_state.mcm_periods_drive_file_id = None
+                with _mcm_periods_cache_lock:
+                    _mcm_periods_cache.clear()
             else:
                 st.error(f"Error loading '{MCM_PERIODS_FILENAME_ON_DRIVE}' from Drive: {error}")
             return {}
@@ -148,6 +686,28 @@ def load_mcm_periods(drive_service):
             return {}
     return {}
 
+def get_cached_mcm_periods(drive_service, cache_key, ttl_seconds=None):
+    """
+    Session-cached load_mcm_periods. While the Drive changes watcher is healthy the cached copy is
+    reused until the config file's generation moves; otherwise it is reused for ttl_seconds
+    (None means always reload).
+    """
+    file_id = st.session_state.get('mcm_periods_drive_file_id')
+    cached = st.session_state.get(cache_key)
+    if cached is not None and file_id == cached['file_id']:
+        if is_drive_changes_watcher_healthy() and file_id:
+            if cached['generation'] == get_drive_file_generation(file_id):
+                return copy.deepcopy(cached['periods']) # Callers edit the dict before saving
+        elif ttl_seconds is not None and time.time() - cached['loaded_at'] < ttl_seconds:
+            return copy.deepcopy(cached['periods'])
+    generation = get_drive_file_generation(file_id) if file_id else 0
+    periods = load_mcm_periods(drive_service)
+    st.session_state[cache_key] = {
+        'periods': periods, 'loaded_at': time.time(), 'generation': generation,
+        'file_id': st.session_state.get('mcm_periods_drive_file_id') # load_mcm_periods may have looked it up
+    }
+    return copy.deepcopy(periods)
+
 def save_mcm_periods(drive_service, periods_data):
     master_folder_id = st.session_state.get('master_drive_folder_id')
     if not master_folder_id:
@@ -157,25 +717,28 @@ def save_mcm_periods(drive_service, periods_data):
     mcm_periods_file_id = st.session_state.get('mcm_periods_drive_file_id')
     file_content = json.dumps(periods_data, indent=4).encode('utf-8')
     fh = BytesIO(file_content)
-    media_body = MediaIoBaseUpload(fh, mimetype='application/json', resumable=True)
+    media_body = MediaIoBaseUpload(fh, mimetype='application/json', resumable=False) # A few KB: one multipart call, no upload session
 
     try:
         if mcm_periods_file_id:
             file_metadata_update = {'name': MCM_PERIODS_FILENAME_ON_DRIVE}
-            drive_service.files().update(
+            saved_file = execute_google_request(drive_service.files().update(
                 fileId=mcm_periods_file_id,
                 body=file_metadata_update,
                 media_body=media_body,
-                fields='id, name'
-            ).execute()
+                fields='id, name, headRevisionId'
+            ))
         else:
             file_metadata_create = {'name': MCM_PERIODS_FILENAME_ON_DRIVE, 'parents': [master_folder_id]}
-            new_file = drive_service.files().create(
+            saved_file = execute_google_request(drive_service.files().create(
                 body=file_metadata_create,
                 media_body=media_body,
-                fields='id, name'
-            ).execute()
-            st.session_state.mcm_periods_drive_file_id = new_file.get('id')
+                fields='id, name, headRevisionId'
+            ))
+            st.session_state.mcm_periods_drive_file_id = saved_file.get('id')
+        _bump_drive_file_generation(st.session_state.mcm_periods_drive_file_id) # Our own write: don't wait for the watcher
+        # Write-through: every session sees the saved config without downloading it again
+        _store_mcm_periods_cache(st.session_state.mcm_periods_drive_file_id, saved_file.get('headRevisionId'), periods_data)
         return True
     except HttpError as error:
         st.error(f"Error saving '{MCM_PERIODS_FILENAME_ON_DRIVE}' to Drive: {error}")
@@ -184,60 +747,508 @@ def save_mcm_periods(drive_service, periods_data):
         st.error(f"Unexpected error saving '{MCM_PERIODS_FILENAME_ON_DRIVE}': {e}")
         return False
 
-def upload_to_drive(drive_service, file_content_or_path, folder_id, filename_on_drive):
+# --- Change sets for the MCM periods config ---
+# UI edits (Active toggles, deletions) are staged in a plain dict kept in session state and
+# committed together by commit_mcm_period_changes as a single media update. Each staged field
+# also records the value it was changed from, so edits made elsewhere meanwhile can be detected.
+def new_mcm_period_changeset(base_revision_id=None):
+    return {'base_revision_id': base_revision_id, 'updates': {}, 'originals': {}, 'deleted': []}
+
+def stage_mcm_period_update(changeset, original_periods, period_key, **fields):
+    """Stages field changes for one period; fields equal to the original value are unstaged."""
+    staged = changeset['updates'].setdefault(period_key, {})
+    originals = changeset.setdefault('originals', {}).setdefault(period_key, {})
+    original = original_periods.get(period_key, {})
+    for field_name, value in fields.items():
+        if original.get(field_name) == value:
+            staged.pop(field_name, None)
+            originals.pop(field_name, None)
+        else:
+            staged[field_name] = value
+            originals.setdefault(field_name, original.get(field_name))
+    if not staged:
+        del changeset['updates'][period_key]
+        changeset['originals'].pop(period_key, None)
+
+def stage_mcm_period_delete(changeset, period_key):
+    changeset['updates'].pop(period_key, None)
+    if period_key not in changeset['deleted']:
+        changeset['deleted'].append(period_key)
+
+def mcm_period_changeset_size(changeset):
+    return sum(len(fields) for fields in changeset['updates'].values()) + len(changeset['deleted'])
+
+def find_mcm_period_conflicts(periods, changeset):
+    """
+    Staged updates that cannot be applied cleanly to periods (the config as it is now): updates to
+    periods deleted elsewhere, and fields changed elsewhere to another value since they were staged.
+    Returns a list of {'period_key', 'field', 'message'} dicts, empty when everything applies.
+    """
+    conflicts = []
+    for period_key, fields in changeset['updates'].items():
+        originals = changeset.get('originals', {}).get(period_key, {})
+        if period_key not in periods:
+            conflicts.extend({'period_key': period_key, 'field': field_name,
+                              'message': f"{period_key}: the period was deleted elsewhere, so your change to '{field_name}' was not applied"}
+                             for field_name in fields)
+            continue
+        for field_name, value in fields.items():
+            current = periods[period_key].get(field_name)
+            if field_name in originals and current != originals[field_name] and current != value:
+                conflicts.append({'period_key': period_key, 'field': field_name,
+                                  'message': f"{period_key}: '{field_name}' was changed elsewhere to {current!r}, so your value {value!r} was not applied"})
+    return conflicts
+
+def drop_mcm_period_conflicts(changeset, conflicts):
+    """Unstages the updates listed in conflicts (as returned by find_mcm_period_conflicts)."""
+    for conflict in conflicts:
+        staged = changeset['updates'].get(conflict['period_key'], {})
+        staged.pop(conflict['field'], None)
+        changeset.get('originals', {}).get(conflict['period_key'], {}).pop(conflict['field'], None)
+        if not staged:
+            changeset['updates'].pop(conflict['period_key'], None)
+            changeset.get('originals', {}).pop(conflict['period_key'], None)
+
+def _revision_before(drive_service, file_id, revision_id):
+    # Id of the revision saved just before revision_id (revisions.list is oldest first), or None
+    previous_id, page_token = None, None
+    while True:
+        response = execute_google_request(drive_service.revisions().list(
+            fileId=file_id, fields='nextPageToken, revisions(id)', pageSize=1000, pageToken=page_token))
+        for revision in response.get('revisions', []):
+            if revision['id'] == revision_id:
+                return previous_id
+            previous_id = revision['id']
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return None
+
+def apply_mcm_period_changeset(periods, changeset):
+    """Returns a new periods dict with the change set applied; updates to periods that no longer exist are dropped."""
+    result = copy.deepcopy(periods)
+    for period_key in changeset['deleted']:
+        result.pop(period_key, None)
+    for period_key, fields in changeset['updates'].items():
+        if period_key in result:
+            result[period_key].update(fields)
+    return result
+
+def commit_mcm_period_changes(drive_service, changeset):
+    """
+    Applies changeset to the config file on Drive in one non-resumable media update.
+
+    Drive v3 has no conditional (If-Match) update, so concurrency is optimistic: the file's
+    headRevisionId is read right before the write. If it moved since the change set was started,
+    the changes are rebased onto the newer content when they apply cleanly; if any conflict
+    (see find_mcm_period_conflicts) nothing is written. After the write, the revision history
+    shows whether another save landed between that read and the upload, in which case it was
+    overwritten and is reported as a conflict too.
+    Returns (saved, rebased, conflicts), conflicts being a list of {'period_key', 'field', 'message'}.
+    """
+    if not mcm_period_changeset_size(changeset):
+        return True, False, []
+    mcm_periods_file_id = st.session_state.get('mcm_periods_drive_file_id')
+    if not mcm_periods_file_id:
+        st.error(f"'{MCM_PERIODS_FILENAME_ON_DRIVE}' not found on Drive. Cannot save changes.")
+        return False, False, []
+    try:
+        head_revision_id = execute_google_request(drive_service.files().get(
+            fileId=mcm_periods_file_id, fields='headRevisionId')).get('headRevisionId')
+        with _mcm_periods_cache_lock:
+            cached = dict(_mcm_periods_cache)
+        if cached.get('file_id') == mcm_periods_file_id and cached.get('head_revision_id') == head_revision_id:
+            base_periods = copy.deepcopy(cached['periods'])
+        else:
+            base_periods = json.load(download_drive_media(drive_service.files().get_media(fileId=mcm_periods_file_id), BytesIO()))
+        rebased = changeset.get('base_revision_id') is not None and changeset['base_revision_id'] != head_revision_id
+        conflicts = find_mcm_period_conflicts(base_periods, changeset)
+        if conflicts:
+            # Sessions pick up the newer config we just read instead of the one the edits were made on
+            _bump_drive_file_generation(mcm_periods_file_id)
+            _store_mcm_periods_cache(mcm_periods_file_id, head_revision_id, base_periods)
+            return False, rebased, conflicts
+
+        new_periods = apply_mcm_period_changeset(base_periods, changeset)
+        media_body = MediaIoBaseUpload(BytesIO(json.dumps(new_periods, indent=4).encode('utf-8')),
+                                       mimetype='application/json', resumable=False)
+        saved_file = execute_google_request(drive_service.files().update(
+            fileId=mcm_periods_file_id,
+            media_body=media_body,
+            fields='id, headRevisionId'
+        ))
+        _bump_drive_file_generation(mcm_periods_file_id)
+        _store_mcm_periods_cache(mcm_periods_file_id, saved_file.get('headRevisionId'), new_periods)
+        try:
+            overwritten = _revision_before(drive_service, mcm_periods_file_id, saved_file.get('headRevisionId')) != head_revision_id
+        except HttpError: # The write itself succeeded; only the check could not run
+            overwritten = False
+        if overwritten:
+            conflicts.append({'period_key': None, 'field': None,
+                              'message': "Another change to the period configuration was saved at the same moment and was "
+                                         "overwritten by this save; check the periods and redo it if needed"})
+        return True, rebased, conflicts
+    except HttpError as error:
+        st.error(f"Error saving changes to '{MCM_PERIODS_FILENAME_ON_DRIVE}': {error}")
+        return False, False, []
+    except Exception as e:
+        st.error(f"Unexpected error saving changes to '{MCM_PERIODS_FILENAME_ON_DRIVE}': {e}")
+        return False, False, []
+
+def get_mcm_periods_revision_id():
+    """headRevisionId of the cached MCM periods config, or None; used as a change set's base."""
+    with _mcm_periods_cache_lock:
+        return _mcm_periods_cache.get('head_revision_id')
+
+# --- Content-hash deduplication for uploads ---
+# Every file uploaded by upload_to_drive carries appProperties.sha256. A per-folder
+# {sha256: (file_id, webViewLink)} index, filled from uploads and Drive lookups, lets a re-upload
+# of identical bytes (e.g. clicking "Extract Data from PDF" again) return the existing file with
+# no upload and no permission call. Entries are forgotten when the file is seen changing, since
+# it may have been trashed; the next lookup then goes back to Drive.
+UPLOAD_HASH_APP_PROPERTY = 'sha256'
+_upload_hash_index = {}
+_upload_hash_index_lock = threading.Lock()
+
+def _content_sha256(file_content_or_path):
+    digest = hashlib.sha256()
+    if isinstance(file_content_or_path, str):
+        with open(file_content_or_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    elif isinstance(file_content_or_path, BytesIO): # Includes Streamlit's UploadedFile
+        digest.update(file_content_or_path.getbuffer())
+    elif isinstance(file_content_or_path, (bytes, bytearray, memoryview, mmap.mmap)):
+        digest.update(file_content_or_path)
+    else: # Any other seekable binary stream
+        file_content_or_path.seek(0)
+        for chunk in iter(lambda: file_content_or_path.read(1024 * 1024), b''):
+            digest.update(chunk)
+        file_content_or_path.seek(0)
+    return digest.hexdigest()
+
+def _remember_uploaded_file(folder_id, content_hash, file_id, web_view_link):
+    with _upload_hash_index_lock:
+        _upload_hash_index.setdefault(folder_id, {})[content_hash] = (file_id, web_view_link)
+
+def _forget_uploaded_file(file_id):
+    with _upload_hash_index_lock:
+        for folder_index in _upload_hash_index.values():
+            for content_hash in [h for h, (indexed_id, _) in folder_index.items() if indexed_id == file_id]:
+                del folder_index[content_hash]
+
+def _find_uploaded_file_by_hash(drive_service, folder_id, content_hash):
+    with _upload_hash_index_lock:
+        indexed = _upload_hash_index.get(folder_id, {}).get(content_hash)
+    if indexed:
+        return indexed
+    query = (f"'{folder_id}' in parents and trashed = false and "
+             f"appProperties has {{ key='{UPLOAD_HASH_APP_PROPERTY}' and value='{content_hash}' }}")
+    response = execute_google_request(drive_service.files().list(
+        q=query, spaces='drive', fields='files(id, webViewLink)', pageSize=1))
+    items = response.get('files', [])
+    if not items:
+        return None
+    _remember_uploaded_file(folder_id, content_hash, items[0]['id'], items[0].get('webViewLink'))
+    return items[0]['id'], items[0].get('webViewLink')
+
+# --- Streaming resumable uploads ---
+# Uploads go out in DRIVE_UPLOAD_CHUNK_BYTES requests read straight from the caller's buffer or
+# stream (the client default would read up to 100 MiB into one request body). A chunk failing
+# with a retryable error resumes the session from the last byte Drive acknowledged.
+class _BufferReader(RawIOBase):
+    """Read-only, seekable stream over a bytes-like object; reads slice it without copying the whole buffer."""
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=SEEK_SET):
+        base = {SEEK_SET: 0, SEEK_CUR: self._position, SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        data = self._view[self._position:end].tobytes() if end > self._position else b''
+        self._position += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+def _as_upload_stream(file_content):
+    """A seekable binary stream over file_content without copying it, or None for unsupported types."""
+    if isinstance(file_content, (bytes, bytearray, memoryview, mmap.mmap)):
+        return _BufferReader(file_content)
+    if hasattr(file_content, 'read') and hasattr(file_content, 'seek'): # BytesIO, Streamlit's UploadedFile, open files
+        file_content.seek(0)
+        return file_content
+    return None
+
+def _execute_drive_upload(request, media_body, progress_callback=None, max_retries=GOOGLE_API_MAX_RETRIES):
+    """
+    Executes a files().create request with resumable media chunk by chunk, one Drive quota token per chunk.
+    progress_callback(bytes_sent, total_bytes) is called after every chunk. The retry budget applies per
+    chunk, so a long upload over a flaky connection keeps going as long as each chunk eventually lands.
+    """
+    total_bytes = media_body.size() or 0
+    if not isinstance(request, HttpRequest): # Local storage backend: the whole body is stored by one call
+        response = execute_google_request(request, max_retries)
+    else:
+        endpoint = getattr(request, 'methodId', None) or 'drive.files.create'
+        response, attempt = None, 0
+        while response is None:
+            throttled_seconds = _quota_buckets['drive'].acquire()
+            _record_api_call(endpoint, calls=1, throttled_seconds=throttled_seconds)
+            try:
+                status, response = request.next_chunk()
+            except Exception as error:
+                # No endpoint passed: a resumable session is safe to retry even though files.create is not
+                if attempt >= max_retries or not _is_retryable_error(error):
+                    _record_api_call(endpoint, errors=1)
+                    raise
+                # The request keeps its session URI; the next call asks Drive how far it got and continues from there
+                _record_api_call(endpoint, retries=1)
+                time.sleep(_backoff_delay(attempt, error))
+                attempt += 1
+                continue
+            attempt = 0
+            if status is not None and progress_callback:
+                progress_callback(status.resumable_progress, total_bytes)
+    if progress_callback:
+        progress_callback(total_bytes, total_bytes)
+    return response
+
+def upload_or_reuse_drive_file(drive_service, file_content_or_path, folder_id, filename_on_drive, progress_callback=None):
+    """
+    Like upload_to_drive, but also reports whether an identical file already in folder_id was
+    reused instead of uploading. Returns (file_id, webViewLink, reused); (None, None, False) on error.
+    """
     try:
         file_metadata = {'name': filename_on_drive, 'parents': [folder_id]}
         media_body = None
+        upload_stream = None if isinstance(file_content_or_path, str) else _as_upload_stream(file_content_or_path)
 
         if isinstance(file_content_or_path, str) and os.path.exists(file_content_or_path):
-            media_body = MediaFileUpload(file_content_or_path, mimetype='application/pdf', resumable=True)
-        elif isinstance(file_content_or_path, bytes): # Handle bytes directly
-            fh = BytesIO(file_content_or_path)
-            media_body = MediaIoBaseUpload(fh, mimetype='application/pdf', resumable=True)
-        elif isinstance(file_content_or_path, BytesIO): # Handle already created BytesIO
-            file_content_or_path.seek(0) # Ensure cursor is at the beginning
-            media_body = MediaIoBaseUpload(file_content_or_path, mimetype='application/pdf', resumable=True)
+            media_body = MediaFileUpload(file_content_or_path, mimetype='application/pdf', chunksize=DRIVE_UPLOAD_CHUNK_BYTES, resumable=True)
+        elif upload_stream is not None: # bytes-like, BytesIO or an UploadedFile, streamed without a copy
+            media_body = MediaIoBaseUpload(upload_stream, mimetype='application/pdf', chunksize=DRIVE_UPLOAD_CHUNK_BYTES, resumable=True)
         else:
             st.error(f"Unsupported file content type for Google Drive upload: {type(file_content_or_path)}")
-            return None, None
+            return None, None, False
 
         if media_body is None: # Should be caught by the else above, but as a safeguard
             st.error("Media body for upload could not be prepared.")
-            return None, None
+            return None, None, False
+
+        # Identical content already in this folder: hand back the existing file
+        content_hash = _content_sha256(file_content_or_path)
+        existing = _find_uploaded_file_by_hash(drive_service, folder_id, content_hash)
+        if existing:
+            _mark_background_upload_shared(existing[0])
+            return existing[0], existing[1], True
 
+        file_metadata['appProperties'] = {UPLOAD_HASH_APP_PROPERTY: content_hash}
         request = drive_service.files().create(
             body=file_metadata,
             media_body=media_body,
             fields='id, webViewLink' # Request webViewLink for direct access
         )
-        file = request.execute()
+        file = _execute_drive_upload(request, media_body, progress_callback)
         file_id = file.get('id')
         if file_id:
-            set_public_read_permission(drive_service, file_id) # Optional: make file publicly readable
-        return file_id, file.get('webViewLink')
+            _share_new_drive_item(drive_service, file_id, folder_id) # Optional: make file publicly readable
+            _remember_uploaded_file(folder_id, content_hash, file_id, file.get('webViewLink'))
+        return file_id, file.get('webViewLink'), False
     except HttpError as error:
         st.error(f"An API error occurred uploading to Drive: {error}")
-        return None, None
+        return None, None, False
     except Exception as e:
         st.error(f"An unexpected error in upload_to_drive: {e}")
-        return None, None
+        return None, None, False
+
+def upload_to_drive(drive_service, file_content_or_path, folder_id, filename_on_drive, progress_callback=None):
+    """
+    Uploads a PDF to folder_id (or reuses an identical one already there). Returns (file_id, webViewLink).
+    file_content_or_path may be a path, a bytes-like object or a seekable stream such as an UploadedFile.
+    """
+    file_id, web_view_link, _ = upload_or_reuse_drive_file(drive_service, file_content_or_path, folder_id, filename_on_drive, progress_callback)
+    return file_id, web_view_link
+
+# --- Background (deferred) uploads ---
+# Lets the audit group start text extraction from the in-memory PDF while the Drive upload runs
+# on a worker thread. The Future is awaited only at submit; a discarded upload is cancelled if it
+# has not started, or its file is deleted once it finishes. Workers carry no ScriptRunContext, so
+# st.error calls inside the upload are dropped and failures surface as (None, None, False).
+_background_upload_executor = None
+_background_upload_executor_lock = threading.Lock()
+# file_id -> handle (Future) of the background upload that created it, and the handles whose file
+# dedup has since handed to another upload, which a discard must then keep. Handles are held
+# weakly, so entries go away once the session that started the upload drops its handle.
+_background_upload_owners = weakref.WeakValueDictionary()
+_shared_background_uploads = weakref.WeakSet()
+_background_upload_owners_lock = threading.Lock()
+
+def _get_background_upload_executor():
+    global _background_upload_executor
+    with _background_upload_executor_lock:
+        if _background_upload_executor is None:
+            _background_upload_executor = ThreadPoolExecutor(max_workers=GOOGLE_API_MAX_WORKERS, thread_name_prefix="drive-upload")
+        return _background_upload_executor
+
+def _run_background_upload(file_content, folder_id, filename_on_drive, progress_callback):
+    try:
+        drive_service, _ = get_thread_google_services()
+        return upload_or_reuse_drive_file(drive_service, file_content, folder_id, filename_on_drive, progress_callback)
+    finally:
+        file_content.release() # Lets the caller's buffer (e.g. an UploadedFile) be resized or closed again
+
+def _register_background_upload(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    file_id, _, reused = future.result()
+    if file_id and not reused:
+        with _background_upload_owners_lock:
+            _background_upload_owners[file_id] = future
+
+def _mark_background_upload_shared(file_id):
+    with _background_upload_owners_lock:
+        owner = _background_upload_owners.get(file_id)
+        if owner is not None:
+            _shared_background_uploads.add(owner)
+
+def start_background_upload(file_content, folder_id, filename_on_drive, progress_callback=None):
+    """
+    Starts upload_or_reuse_drive_file for file_content on a worker thread; returns a Future of (file_id, webViewLink, reused).
+    file_content (bytes-like, e.g. uploaded_file.getbuffer()) is read in place through its own view, so the
+    caller can keep reading the same file meanwhile; it must not be modified until the upload finishes.
+    progress_callback runs on the worker thread and must not call Streamlit.
+    """
+    future = _get_background_upload_executor().submit(_run_background_upload, memoryview(file_content).toreadonly(),
+                                                      folder_id, filename_on_drive, progress_callback)
+    future.add_done_callback(_register_background_upload)
+    return future
+
+def _delete_discarded_upload(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    file_id, _, reused = future.result()
+    if not file_id or reused:
+        return
+    _forget_uploaded_file(file_id) # No further dedup hits on a file about to be deleted
+    with _background_upload_owners_lock:
+        _background_upload_owners.pop(file_id, None)
+        if future in _shared_background_uploads:
+            return
+    try:
+        drive_service, _ = get_thread_google_services()
+        execute_google_request(drive_service.files().delete(fileId=file_id))
+    except Exception: # Runs off the script thread with no UI to report to; the file is left as an orphan
+        pass
+
+def discard_background_upload(future):
+    """
+    Cancels a pending background upload, or deletes the file it created once it completes. Files it
+    reused, and files dedup has meanwhile handed to another upload, are kept.
+    """
+    if future is None or future.cancel():
+        return
+    future.add_done_callback(_delete_discarded_upload)
+
+# --- First-sheet metadata cache ---
+# Title, sheetId (GID) and header row per spreadsheet. Populated by create_spreadsheet or on
+# first use, so steady-state appends, deletes and projected reads need no metadata round-trip.
+_sheet_metadata_cache = {}
+_sheet_metadata_lock = threading.Lock()
+
+def _remember_sheet_metadata(spreadsheet_id, title, sheet_id, header):
+    header = list(header or [])
+    metadata = {'title': title, 'sheet_id': sheet_id, 'header': header, 'has_header': bool(header)}
+    with _sheet_metadata_lock:
+        _sheet_metadata_cache[spreadsheet_id] = metadata
+    return metadata
 
-def create_spreadsheet(sheets_service, drive_service, title, parent_folder_id=None):
+def get_first_sheet_metadata(sheets_service, spreadsheet_id, need_sheet_id=False):
+    """
+    Returns {'title', 'sheet_id', 'header', 'has_header'} for the first sheet, fetched once per process.
+    Entries seeded at creation may not know the GID yet (sheet_id None); need_sheet_id fetches it then.
+    """
+    with _sheet_metadata_lock:
+        cached = _sheet_metadata_cache.get(spreadsheet_id)
+    if cached and (not need_sheet_id or cached['sheet_id'] is not None):
+        return cached
+    # One call returns both the sheet properties and the header row (a range without a sheet
+    # name refers to the first sheet)
+    sheet_metadata = execute_google_request(sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=["1:1"],
+        includeGridData=True,
+        fields='sheets(properties(sheetId,title),data(rowData(values(formattedValue))))'
+    ))
+    first_sheet = sheet_metadata.get('sheets', [{}])[0]
+    properties = first_sheet.get('properties', {})
+    row_data = (first_sheet.get('data') or [{}])[0].get('rowData', [])
+    header = [cell.get('formattedValue', '') for cell in (row_data[0].get('values', []) if row_data else [])]
+    while header and not header[-1]:
+        header.pop()
+    return _remember_sheet_metadata(spreadsheet_id, properties.get('title', 'Sheet1'),
+                                    properties.get('sheetId', 0), header)
+
+def create_spreadsheet(sheets_service, drive_service, title, parent_folder_id=None, header_row=DAR_SHEET_COLUMNS):
+    """
+    Creates a spreadsheet whose first row is header_row; returns (spreadsheet_id, spreadsheet_url).
+    With a drive_service this is a single Drive files.create: the header is uploaded as a one-line
+    CSV that Drive converts to a Google Sheet, and parents places it in parent_folder_id directly.
+    """
     try:
+        if drive_service:
+            file_metadata = {'name': title, 'mimeType': SPREADSHEET_MIME_TYPE}
+            if parent_folder_id:
+                file_metadata['parents'] = [parent_folder_id]
+            media_body = None
+            if header_row:
+                csv_buffer = StringIO()
+                csv.writer(csv_buffer).writerow(header_row)
+                media_body = MediaIoBaseUpload(BytesIO(csv_buffer.getvalue().encode('utf-8')), mimetype='text/csv', resumable=False)
+            spreadsheet = execute_google_request(drive_service.files().create(body=file_metadata, media_body=media_body,
+                                                                              fields='id, webViewLink'))
+            spreadsheet_id = spreadsheet.get('id')
+            if spreadsheet_id:
+                _share_new_drive_item(drive_service, spreadsheet_id, parent_folder_id) # Optional
+                # Drive names the converted sheet's tab after the file (an empty sheet gets "Sheet1"), so
+                # the first append needs no metadata call. The GID is not returned; deletes fetch it on first use.
+                # Titles a tab cannot carry as-is are left for get_first_sheet_metadata to read back.
+                tab_title = title if media_body is not None else 'Sheet1'
+                if len(tab_title) <= 100 and not any(c in tab_title for c in "[]*?/\\:"):
+                    _remember_sheet_metadata(spreadsheet_id, tab_title, None, header_row)
+            return spreadsheet_id, spreadsheet.get('webViewLink')
+
         spreadsheet_body = {'properties': {'title': title}}
-        spreadsheet = sheets_service.spreadsheets().create(body=spreadsheet_body,
-                                                           fields='spreadsheetId,spreadsheetUrl').execute()
+        if header_row:
+            # Write the header as part of the create call so later appends never need to check for it
+            spreadsheet_body['sheets'] = [{
+                'properties': {'title': 'Sheet1'},
+                'data': [{'startRow': 0, 'startColumn': 0, 'rowData': [{
+                    'values': [{'userEnteredValue': {'stringValue': col}} for col in header_row]
+                }]}]
+            }]
+        spreadsheet = execute_google_request(sheets_service.spreadsheets().create(body=spreadsheet_body,
+                                                           fields='spreadsheetId,spreadsheetUrl,sheets.properties(sheetId,title)'))
         spreadsheet_id = spreadsheet.get('spreadsheetId')
-
-        if spreadsheet_id and drive_service:
-            set_public_read_permission(drive_service, spreadsheet_id) # Optional
-            if parent_folder_id: # Move spreadsheet to the specified folder
-                file = drive_service.files().get(fileId=spreadsheet_id, fields='parents').execute()
-                previous_parents = ",".join(file.get('parents'))
-                drive_service.files().update(fileId=spreadsheet_id,
-                                             addParents=parent_folder_id,
-                                             removeParents=previous_parents,
-                                             fields='id, parents').execute()
+        if spreadsheet_id:
+            first_sheet_props = spreadsheet.get('sheets', [{}])[0].get('properties', {})
+            _remember_sheet_metadata(spreadsheet_id, first_sheet_props.get('title', 'Sheet1'),
+                                     first_sheet_props.get('sheetId', 0), header_row)
         return spreadsheet_id, spreadsheet.get('spreadsheetUrl')
     except HttpError as error:
         st.error(f"An error occurred creating Spreadsheet: {error}")
@@ -246,43 +1257,272 @@ def create_spreadsheet(sheets_service, drive_service, title, parent_folder_id=No
         st.error(f"An unexpected error occurred creating Spreadsheet: {e}")
         return None, None
 
+def create_mcm_period_resources(folder_name, spreadsheet_title, parent_folder_id):
+    """
+    Creates a period's DAR folder and its spreadsheet concurrently under parent_folder_id, so the
+    latency is that of the slower single call. Returns (folder_id, folder_url, spreadsheet_id, spreadsheet_url).
+    If either creation fails the other one is deleted again and every value is None.
+    """
+    def create_item(drive_service, sheets_service, item):
+        if item == 'folder':
+            return create_drive_folder(drive_service, folder_name, parent_id=parent_folder_id)
+        return create_spreadsheet(sheets_service, drive_service, spreadsheet_title, parent_folder_id=parent_folder_id)
+
+    created = {'folder': (None, None), 'spreadsheet': (None, None)}
+    items = list(created)
+    for index, result, error in map_google_tasks(create_item, items, max_workers=len(items)):
+        if error is not None:
+            st.error(f"Unexpected error creating the period {items[index]}: {error}")
+        elif result:
+            created[items[index]] = result
+    if created['folder'][0] and created['spreadsheet'][0]:
+        return created['folder'] + created['spreadsheet']
+    # Half-created period: remove the survivor so a retry does not leave orphans in the parent folder
+    drive_service, _ = get_google_services()
+    for item in items:
+        survivor_id = created[item][0]
+        if not survivor_id:
+            continue
+        try:
+            execute_google_request(drive_service.files().delete(fileId=survivor_id))
+        except Exception as e:
+            st.warning(f"Could not remove the partially created period {item} ({survivor_id}): {e}")
+    return None, None, None, None
+
+# --- Read-through cache for sheet values ---
+# Keyed by (spreadsheet_id, sheet_name). Each entry remembers the Drive file version it was
+# downloaded at; a cheap files().get(fields='version') decides whether it can be reused. While
+# the Drive changes watcher is healthy, the per-file generation counter is used instead and
+# cache hits need no API call at all.
+_sheet_values_cache = {}
+_sheet_values_cache_lock = threading.Lock()
+_spreadsheet_invalidation_listeners = []
+
+def add_spreadsheet_invalidation_listener(listener):
+    """Registers listener(spreadsheet_id), called whenever this module writes to a spreadsheet."""
+    if listener not in _spreadsheet_invalidation_listeners:
+        _spreadsheet_invalidation_listeners.append(listener)
+
+def _get_drive_file_version(file_id):
+    drive_service, _ = _get_shared_google_clients()
+    file_meta = execute_google_request(drive_service.files().get(fileId=file_id, fields='version, modifiedTime'))
+    return file_meta.get('version') or file_meta.get('modifiedTime')
+
+def invalidate_spreadsheet_cache(spreadsheet_id, skip_listener=None):
+    """
+    Drops every cached sheet of a spreadsheet; called after writes made by this app and by the changes watcher.
+    A writer that keeps its own copy current passes its listener as skip_listener so it is not notified of its own write.
+    """
+    _bump_drive_file_generation(spreadsheet_id)
+    with _sheet_values_cache_lock:
+        for cache_key in [k for k in _sheet_values_cache if k[0] == spreadsheet_id]:
+            del _sheet_values_cache[cache_key]
+    for listener in list(_spreadsheet_invalidation_listeners):
+        if listener != skip_listener:
+            listener(spreadsheet_id)
+
+# A changed or trashed upload must not be handed out again from the dedup index
+add_spreadsheet_invalidation_listener(_forget_uploaded_file)
+
+# --- Drive changes watcher ---
+# A daemon thread polls changes.list from a page token persisted in DRIVE_CHANGES_PAGE_TOKEN_FILE
+# and bumps a generation counter for every file that changed (config JSON, period sheets, log
+# sheet, ...). Caches key their entries on get_drive_file_generation(file_id), so they are
+# dropped exactly when their file changes instead of on a timer.
+_drive_file_generations = {}
+_drive_file_generations_lock = threading.Lock()
+
+def _bump_drive_file_generation(file_id):
+    with _drive_file_generations_lock:
+        _drive_file_generations[file_id] = _drive_file_generations.get(file_id, 0) + 1
+
+def get_drive_file_generation(file_id):
+    """Counter that moves whenever file_id is seen changing on Drive or is written by this app."""
+    with _drive_file_generations_lock:
+        return _drive_file_generations.get(file_id, 0)
+
+class _DriveChangesWatcher:
+    def __init__(self, poll_seconds, page_token_file):
+        self.poll_seconds = poll_seconds
+        self.page_token_file = page_token_file
+        self.last_poll_ok_at = None
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="drive-changes-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def is_healthy(self):
+        # Stale generations are only trusted while polls keep succeeding
+        return (self._thread.is_alive() and self.last_poll_ok_at is not None
+                and time.time() - self.last_poll_ok_at < 3 * self.poll_seconds)
+
+    def _load_page_token(self):
+        try:
+            with open(self.page_token_file) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _save_page_token(self, page_token):
+        try:
+            with open(self.page_token_file, 'w') as f:
+                f.write(page_token)
+        except OSError as e:
+            self.last_error = f"Could not persist Drive changes page token: {e}"
+
+    def _start_page_token(self, drive_service):
+        return execute_google_request(drive_service.changes().getStartPageToken())['startPageToken']
+
+    def poll_once(self, drive_service, page_token):
+        """Applies every change after page_token; returns the token to resume from."""
+        while True:
+            response = execute_google_request(drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=1000,
+                fields='nextPageToken,newStartPageToken,changes(fileId,removed)'
+            ))
+            for change in response.get('changes', []):
+                if change.get('fileId'):
+                    invalidate_spreadsheet_cache(change['fileId'])
+            if 'newStartPageToken' in response: # Caught up
+                return response['newStartPageToken']
+            page_token = response['nextPageToken']
+            self._save_page_token(page_token)
+
+    def _run(self):
+        drive_service, _ = get_thread_google_services()
+        page_token = self._load_page_token()
+        while True:
+            try:
+                if page_token is None:
+                    page_token = self._start_page_token(drive_service)
+                page_token = self.poll_once(drive_service, page_token)
+                self._save_page_token(page_token)
+                self.last_poll_ok_at = time.time()
+                self.last_error = None
+            except HttpError as error:
+                self.last_error = str(error)
+                if error.resp.status in (400, 404): # Expired or foreign page token: start over from now
+                    page_token = None
+            except Exception as e:
+                self.last_error = str(e)
+            time.sleep(self.poll_seconds)
+
+_drive_changes_watcher = None
+
+@st.cache_resource(show_spinner=False)
+def start_drive_changes_watcher():
+    """Starts the process-wide Drive changes watcher once and returns it."""
+    global _drive_changes_watcher
+    _drive_changes_watcher = _DriveChangesWatcher(DRIVE_CHANGES_POLL_SECONDS, DRIVE_CHANGES_PAGE_TOKEN_FILE).start()
+    return _drive_changes_watcher
+
+def is_drive_changes_watcher_healthy():
+    return _drive_changes_watcher is not None and _drive_changes_watcher.is_healthy()
+
+# --- Single-flight coalescing ---
+# Sessions opening the same period at the same moment would each issue an identical read. The
+# first caller for a key performs the fetch; callers arriving while it is in flight wait on its
+# Future and share the result (or the exception). Keys include the file generation (and Drive
+# version when known), so a read started before this app's own write is never handed to a
+# caller that comes after it.
+_in_flight_fetches = {}
+_in_flight_fetches_lock = threading.Lock()
+_coalesced_fetch_count = 0
+
+def _single_flight(key, fetch):
+    global _coalesced_fetch_count
+    with _in_flight_fetches_lock:
+        shared = _in_flight_fetches.get(key)
+        if shared is None:
+            shared = _in_flight_fetches[key] = Future()
+            leader = True
+        else:
+            leader = False
+            _coalesced_fetch_count += 1
+    if not leader:
+        return shared.result()
+    try:
+        result = fetch()
+    except BaseException as error:
+        shared.set_exception(error)
+        raise
+    else:
+        shared.set_result(result)
+        return result
+    finally:
+        with _in_flight_fetches_lock:
+            _in_flight_fetches.pop(key, None)
+
+def get_coalesced_fetch_count():
+    """Number of reads served by joining an identical in-flight fetch instead of calling the API."""
+    return _coalesced_fetch_count
+
+def _get_sheet_values_entry(sheets_service, spreadsheet_id, sheet_name, use_cache=True,
+                            value_render_option='FORMATTED_VALUE'):
+    cache_key = (spreadsheet_id, sheet_name, value_render_option)
+    version = None
+    generation = get_drive_file_generation(spreadsheet_id) # Taken before the read, so a change during it still invalidates
+    watcher_healthy = use_cache and is_drive_changes_watcher_healthy()
+    if watcher_healthy:
+        with _sheet_values_cache_lock:
+            entry = _sheet_values_cache.get(cache_key)
+        if entry and entry['generation'] == generation:
+            return entry
+    elif use_cache:
+        try:
+            version = _single_flight(('version', spreadsheet_id, generation), lambda: _get_drive_file_version(spreadsheet_id))
+        except Exception:
+            version = None # Version unknown: fall back to an uncached read
+        if version is not None:
+            with _sheet_values_cache_lock:
+                entry = _sheet_values_cache.get(cache_key)
+            if entry and entry['version'] == version:
+                return entry
+
+    def fetch_entry():
+        result = execute_google_request(sheets_service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{sheet_name}'",  # Read the whole sheet
+            valueRenderOption=value_render_option,
+            dateTimeRenderOption='FORMATTED_STRING'
+        ))
+        entry = {'version': version, 'generation': generation, 'values': result.get('values', []), 'frame': None}
+        if version is not None or watcher_healthy:
+            with _sheet_values_cache_lock:
+                _sheet_values_cache[cache_key] = entry
+        return entry
+
+    # Identical concurrent reads of the same sheet version share one values.get
+    return _single_flight(('values', spreadsheet_id, sheet_name, value_render_option, generation, version), fetch_entry)
+
 def append_to_spreadsheet(sheets_service, spreadsheet_id, values_to_append):
     try:
         body = {'values': values_to_append}
-        sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        sheets = sheet_metadata.get('sheets', '')
-        first_sheet_title = sheets[0].get("properties", {}).get("title", "Sheet1")
+        sheet_meta = get_first_sheet_metadata(sheets_service, spreadsheet_id)
+        first_sheet_title = sheet_meta['title']
 
-        # Check if header exists
-        range_to_check_header = f"{first_sheet_title}!A1:N1" # Check up to N (14th column)
-        result_header_check = sheets_service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=range_to_check_header
-        ).execute()
-        header_row_in_sheet = result_header_check.get('values', [])
-
-        if not header_row_in_sheet: # No header at all, create it
-            header_to_write = [[
-                "Audit Group Number", "Audit Circle Number", "GSTIN", "Trade Name", "Category",
-                "Total Amount Detected (Overall Rs)", "Total Amount Recovered (Overall Rs)",
-                "Audit Para Number", "Audit Para Heading",
-                "Revenue Involved (Lakhs Rs)", "Revenue Recovered (Lakhs Rs)", "Status of para",
-                "DAR PDF URL", "Record Created Date"
-            ]]
-            sheets_service.spreadsheets().values().append(
+        if not sheet_meta['has_header']: # No header at all (legacy sheet), create it once
+            execute_google_request(sheets_service.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id,
-                range=f"{first_sheet_title}!A1", # Start at A1
+                range=f"'{first_sheet_title}'!A1", # Start at A1
                 valueInputOption='USER_ENTERED',
-                body={'values': header_to_write}
-            ).execute()
+                body={'values': [DAR_SHEET_COLUMNS]}
+            ))
+            _remember_sheet_metadata(spreadsheet_id, first_sheet_title, sheet_meta['sheet_id'], DAR_SHEET_COLUMNS)
 
         # Append data rows
-        append_result = sheets_service.spreadsheets().values().append(
+        append_result = execute_google_request(sheets_service.spreadsheets().values().append(
             spreadsheetId=spreadsheet_id,
-            range=f"{first_sheet_title}!A1", # Appends after the last row with data in this range
+            range=f"'{first_sheet_title}'!A1", # Appends after the last row with data in this range
             valueInputOption='USER_ENTERED',
             body=body # values_to_append should not include header
-        ).execute()
+        ))
+        invalidate_spreadsheet_cache(spreadsheet_id)
         return append_result
     except HttpError as error:
         st.error(f"An error occurred appending to Spreadsheet: {error}")
@@ -291,179 +1531,616 @@ def append_to_spreadsheet(sheets_service, spreadsheet_id, values_to_append):
         st.error(f"Unexpected error appending to Spreadsheet: {e}")
         return None
 
-def read_from_spreadsheet(sheets_service, spreadsheet_id, sheet_name="Sheet1"):
-    try:
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=sheet_name  # Read the whole sheet
-        ).execute()
-        values = result.get('values', [])
-
-        if not values:
-            return pd.DataFrame() # Return empty DataFrame if sheet is empty
-
-        expected_cols_header = [ # This is the current, correct 14-column header
-            "Audit Group Number", "Audit Circle Number", "GSTIN", "Trade Name", "Category",
-            "Total Amount Detected (Overall Rs)", "Total Amount Recovered (Overall Rs)",
-            "Audit Para Number", "Audit Para Heading",
-            "Revenue Involved (Lakhs Rs)", "Revenue Recovered (Lakhs Rs)", "Status of para",
-            "DAR PDF URL", "Record Created Date"
-        ]
-
-        header_in_sheet = values[0]
-        data_rows = values[1:]
-
-        if not data_rows : # Only header or empty after header
-            if header_in_sheet == expected_cols_header:
-                return pd.DataFrame(columns=expected_cols_header) # Correct header, no data
-            else: # Potentially incorrect header, or just some other content
-                 # Try to return what's there, might be messy, or return empty with expected if too different
-                if len(header_in_sheet) > 5 : # Heuristic: if it looks somewhat like a header
-                    return pd.DataFrame(columns=header_in_sheet)
-                return pd.DataFrame(columns=expected_cols_header) # Fallback to expected if header is very short/unlikely
-
-        num_cols_in_header = len(header_in_sheet)
-        num_cols_in_first_data_row = len(data_rows[0]) if data_rows else 0 # Check first data row
+def _values_to_dataframe(values):
+    """Builds a DataFrame from raw sheet values (header row first), tolerating older layouts."""
+    if not values:
+        return pd.DataFrame() # Return empty DataFrame if sheet is empty
+
+    expected_cols_header = DAR_SHEET_COLUMNS
 
+    header_in_sheet = values[0]
+    data_rows = values[1:]
+
+    if not data_rows : # Only header or empty after header
         if header_in_sheet == expected_cols_header:
-            # Ideal case: Header matches expected.
-            # Ensure all data rows have a consistent number of columns. Pad if necessary.
-            processed_data_rows = []
-            for row in data_rows:
-                if len(row) < len(expected_cols_header):
-                    processed_data_rows.append(row + [None] * (len(expected_cols_header) - len(row)))
-                elif len(row) > len(expected_cols_header):
-                    processed_data_rows.append(row[:len(expected_cols_header)])
-                else:
-                    processed_data_rows.append(row)
-            return pd.DataFrame(processed_data_rows, columns=header_in_sheet)
+            return pd.DataFrame(columns=expected_cols_header) # Correct header, no data
+        else: # Potentially incorrect header, or just some other content
+             # Try to return what's there, might be messy, or return empty with expected if too different
+            if len(header_in_sheet) > 5 : # Heuristic: if it looks somewhat like a header
+                return pd.DataFrame(columns=header_in_sheet)
+            return pd.DataFrame(columns=expected_cols_header) # Fallback to expected if header is very short/unlikely
+
+    num_cols_in_header = len(header_in_sheet)
+    num_cols_in_first_data_row = len(data_rows[0]) if data_rows else 0 # Check first data row
+
+    if header_in_sheet == expected_cols_header:
+        # Ideal case: Header matches expected.
+        # Ensure all data rows have a consistent number of columns. Pad if necessary.
+        processed_data_rows = []
+        for row in data_rows:
+            if len(row) < len(expected_cols_header):
+                processed_data_rows.append(row + [None] * (len(expected_cols_header) - len(row)))
+            elif len(row) > len(expected_cols_header):
+                processed_data_rows.append(row[:len(expected_cols_header)])
+            else:
+                processed_data_rows.append(row)
+        return pd.DataFrame(processed_data_rows, columns=header_in_sheet)
+
+    elif num_cols_in_first_data_row == len(expected_cols_header):
+        # Data structure matches expected 14 columns, but header in sheet might be old/different.
+        # Prioritize using expected_cols_header for the DataFrame.
+        st.warning(f"Spreadsheet header mismatched ({num_cols_in_header} cols), but data rows appear to have the current expected {len(expected_cols_header)} columns. Applying current headers.")
+        # Pad/truncate all data rows to match expected_cols_header length
+        standardized_data_rows = []
+        for row in data_rows:
+            if len(row) < len(expected_cols_header):
+                standardized_data_rows.append(row + [None] * (len(expected_cols_header) - len(row)))
+            elif len(row) > len(expected_cols_header):
+                standardized_data_rows.append(row[:len(expected_cols_header)])
+            else:
+                standardized_data_rows.append(row)
+        return pd.DataFrame(standardized_data_rows, columns=expected_cols_header)
 
-        elif num_cols_in_first_data_row == len(expected_cols_header):
-            # Data structure matches expected 14 columns, but header in sheet might be old/different.
-            # Prioritize using expected_cols_header for the DataFrame.
-            st.warning(f"Spreadsheet header mismatched ({num_cols_in_header} cols), but data rows appear to have the current expected {len(expected_cols_header)} columns. Applying current headers.")
+    elif num_cols_in_header == num_cols_in_first_data_row:
+        # Header is different from expected, but consistent with data. Use sheet's header.
+        #st.warning(f"Spreadsheet header ({num_cols_in_header} cols) differs from expected ({len(expected_cols_header)} cols), but is consistent with data rows. Using header from sheet: {header_in_sheet}")
+        return pd.DataFrame(data_rows, columns=header_in_sheet)
+    else:
+        # Significant mismatch, e.g. header is 12, data is 14.
+        # This was the problematic case. Try to use expected_cols_header if data matches it.
+        error_message = (f"Spreadsheet structure conflict: Header has {num_cols_in_header} columns, "
+                         f"first data row has {num_cols_in_first_data_row} columns. "
+                         f"Expected {len(expected_cols_header)} columns based on current app version.")
+        st.error(error_message)
+        # Fallback: return raw values, which might lead to issues upstream, or an empty DF with expected cols.
+        # For safety, let's try to build a DataFrame with expected columns and fill with what we can.
+        st.info("Attempting to load data with current expected columns. Data might be misaligned.")
+        try:
             # Pad/truncate all data rows to match expected_cols_header length
-            standardized_data_rows = []
-            for row in data_rows:
-                if len(row) < len(expected_cols_header):
-                    standardized_data_rows.append(row + [None] * (len(expected_cols_header) - len(row)))
-                elif len(row) > len(expected_cols_header):
-                    standardized_data_rows.append(row[:len(expected_cols_header)])
-                else:
-                    standardized_data_rows.append(row)
-            return pd.DataFrame(standardized_data_rows, columns=expected_cols_header)
+            standardized_data_rows_fallback = []
+            for row_idx, row_val in enumerate(data_rows):
+                new_row = [None] * len(expected_cols_header)
+                for i in range(min(len(row_val), len(expected_cols_header))):
+                    new_row[i] = row_val[i]
+                standardized_data_rows_fallback.append(new_row)
+            return pd.DataFrame(standardized_data_rows_fallback, columns=expected_cols_header)
+        except Exception as fallback_e:
+            st.error(f"Fallback data loading also failed: {fallback_e}")
+            return pd.DataFrame(columns=expected_cols_header) # Empty DF with correct columns
+
+def _to_numeric_column(series):
+    numeric = pd.to_numeric(series, errors='coerce')
+    # Text such as "1,50,000" or "Rs 200" only needs cleaning where direct conversion failed
+    needs_cleaning = numeric.isna() & series.notna() & (series.astype(str).str.strip() != '')
+    if needs_cleaning.any():
+        cleaned = series[needs_cleaning].astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+        numeric = numeric.astype('float64')
+        numeric[needs_cleaning] = pd.to_numeric(cleaned, errors='coerce')
+    return numeric.astype('float64')
+
+def _smallest_int_dtype(numeric):
+    # Int16 unless a value does not fit, so an out-of-range cell widens the column instead of becoming NA
+    largest = numeric.abs().max()
+    if pd.isna(largest) or largest <= np.iinfo(np.int16).max:
+        return 'Int16'
+    return 'Int32' if largest <= np.iinfo(np.int32).max else 'Int64'
 
-        elif num_cols_in_header == num_cols_in_first_data_row:
-            # Header is different from expected, but consistent with data. Use sheet's header.
-            #st.warning(f"Spreadsheet header ({num_cols_in_header} cols) differs from expected ({len(expected_cols_header)} cols), but is consistent with data rows. Using header from sheet: {header_in_sheet}")
-            return pd.DataFrame(data_rows, columns=header_in_sheet)
+def _to_datetime_column(column):
+    blank = column.isna() | (column.astype(str).str.strip() == '')
+    # format='mixed' parses every cell on its own, so dates with and without a time can share a column
+    parsed = pd.to_datetime(column.where(~blank), errors='coerce', format='mixed')
+    # Cells that are not dates become NaT so the column stays datetime64; their text is returned alongside
+    return parsed, column[parsed.isna() & ~blank]
+
+def apply_dar_sheet_schema(df):
+    """
+    Converts the known period-sheet columns of df in place to DAR_SHEET_SCHEMA dtypes; returns df.
+    Integer columns widen beyond Int16 when a value needs it. Date cells that cannot be parsed become
+    NaT; their original text is kept in df.attrs['unparsed_cells'][col_name], a Series by row index.
+    """
+    for col_name, dtype in DAR_SHEET_SCHEMA.items():
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        if dtype == 'Int16':
+            numeric = _to_numeric_column(column).round()
+            df[col_name] = numeric.astype(_smallest_int_dtype(numeric))
+        elif dtype == 'float64':
+            df[col_name] = _to_numeric_column(column)
+        elif dtype == 'category':
+            df[col_name] = column.where(column.astype(str).str.strip() != '').astype('category')
         else:
-            # Significant mismatch, e.g. header is 12, data is 14.
-            # This was the problematic case. Try to use expected_cols_header if data matches it.
-            error_message = (f"Spreadsheet structure conflict: Header has {num_cols_in_header} columns, "
-                             f"first data row has {num_cols_in_first_data_row} columns. "
-                             f"Expected {len(expected_cols_header)} columns based on current app version.")
-            st.error(error_message)
-            # Fallback: return raw values, which might lead to issues upstream, or an empty DF with expected cols.
-            # For safety, let's try to build a DataFrame with expected columns and fill with what we can.
-            st.info("Attempting to load data with current expected columns. Data might be misaligned.")
-            try:
-                # Pad/truncate all data rows to match expected_cols_header length
-                standardized_data_rows_fallback = []
-                for row_idx, row_val in enumerate(data_rows):
-                    new_row = [None] * len(expected_cols_header)
-                    for i in range(min(len(row_val), len(expected_cols_header))):
-                        new_row[i] = row_val[i]
-                    standardized_data_rows_fallback.append(new_row)
-                return pd.DataFrame(standardized_data_rows_fallback, columns=expected_cols_header)
-            except Exception as fallback_e:
-                st.error(f"Fallback data loading also failed: {fallback_e}")
-                return pd.DataFrame(columns=expected_cols_header) # Empty DF with correct columns
+            df[col_name], unparsed = _to_datetime_column(column)
+            if not unparsed.empty:
+                df.attrs.setdefault('unparsed_cells', {})[col_name] = unparsed
+    return df
+
+def _values_to_typed_dataframe(values):
+    if not values:
+        return apply_dar_sheet_schema(pd.DataFrame(columns=DAR_SHEET_COLUMNS))
+    header, data_rows = values[0], values[1:]
+    if header[:len(DAR_SHEET_COLUMNS)] != DAR_SHEET_COLUMNS:
+        # Older or unexpected layouts go through the tolerant row-based builder
+        return apply_dar_sheet_schema(_values_to_dataframe(values))
+    # zip_longest transposes the ragged rows in C, padding short rows with None; cells beyond the
+    # header width are dropped by only taking len(header) columns.
+    columns_data = list(itertools.zip_longest(*data_rows, fillvalue=None)) if data_rows else []
+    frame = pd.DataFrame({
+        col_name: pd.Series(columns_data[i] if i < len(columns_data) else [None] * len(data_rows), dtype=object)
+        for i, col_name in enumerate(header)
+    })
+    return apply_dar_sheet_schema(frame)
+
+def sheet_values_to_dataframe(values, typed=False):
+    """Builds the same DataFrame read_from_spreadsheet returns from raw sheet values (header row first)."""
+    return _values_to_typed_dataframe(values) if typed else _values_to_dataframe(values)
+
+class _SheetSnapshot:
+    """
+    The raw values a DataFrame was built from, carried in df.attrs['sheet_snapshot'] so that
+    update_spreadsheet_from_df can diff against what the user actually read. Values are never
+    mutated, so pandas' deepcopy of attrs on every operation shares the snapshot instead of copying it.
+    """
+    __slots__ = ('spreadsheet_id', 'sheet_title', 'values')
+
+    def __init__(self, spreadsheet_id, sheet_title, values):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_title = sheet_title
+        self.values = values
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def read_from_spreadsheet(sheets_service, spreadsheet_id, sheet_name=None, use_cache=True, typed=False):
+    """
+    Reads a whole sheet (by default the first one) into a DataFrame.
 
+    With use_cache=True the raw values are served from the process-wide cache whenever the
+    spreadsheet's Drive version is unchanged since the last download. Callers always receive
+    their own copy of the DataFrame, so in-place edits never leak into the cache.
+
+    With typed=True the sheet is read with UNFORMATTED_VALUE and the known columns come back
+    in DAR_SHEET_SCHEMA dtypes (Int16 numbers, float64 amounts, categorical Category/Status,
+    datetime Record Created Date), ready for aggregation without further coercion.
+    """
+    try:
+        if sheet_name is None:
+            # Not assumed to be "Sheet1": Drive names the tab of a CSV-converted sheet after the file
+            sheet_name = get_first_sheet_metadata(sheets_service, spreadsheet_id)['title']
+        entry = _get_sheet_values_entry(sheets_service, spreadsheet_id, sheet_name, use_cache,
+                                        value_render_option='UNFORMATTED_VALUE' if typed else 'FORMATTED_VALUE')
+        if entry.get('frame') is None:
+            entry['frame'] = sheet_values_to_dataframe(entry['values'], typed)
+        frame = entry['frame'].copy()
+        if not typed: # Formatted values are what update_spreadsheet_from_df writes back and diffs against
+            frame.attrs['sheet_snapshot'] = _SheetSnapshot(spreadsheet_id, sheet_name, entry['values'])
+        return frame
     except HttpError as error:
         st.error(f"An API error occurred reading from Spreadsheet: {error}")
-        return pd.DataFrame(columns=expected_cols_header) # Return empty DF with expected structure
+        return pd.DataFrame(columns=DAR_SHEET_COLUMNS) # Return empty DF with expected structure
     except Exception as e:
         st.error(f"Unexpected error reading from Spreadsheet: {e}")
-        return pd.DataFrame(columns=expected_cols_header) # Return empty DF with expected structure
+        return pd.DataFrame(columns=DAR_SHEET_COLUMNS) # Return empty DF with expected structure
+
+def read_spreadsheet_columns(sheets_service, spreadsheet_id, columns=None, start_row=None, end_row=None, typed=False):
+    """
+    Reads selected columns and/or a window of data rows from the first sheet in one values.batchGet.
+
+    Args:
+        columns (list[str] | None): Header names to fetch; None fetches every column.
+        start_row, end_row (int | None): 0-based data-row window [start_row, end_row), matching the
+            DataFrame index of read_from_spreadsheet. None means from the first / to the last row.
+        typed (bool): Read UNFORMATTED_VALUE and apply DAR_SHEET_SCHEMA, as in read_from_spreadsheet.
+
+    Returns:
+        pd.DataFrame indexed by data-row position (so indices line up with full reads and
+        delete_spreadsheet_rows), or an empty DataFrame with the requested columns on error.
+    """
+    requested = list(columns) if columns is not None else None
+    try:
+        sheet_meta = get_first_sheet_metadata(sheets_service, spreadsheet_id)
+        header = sheet_meta['header']
+        requested = requested if requested is not None else list(header)
+        missing = [c for c in requested if c not in header]
+        if missing:
+            st.warning(f"Columns not found in spreadsheet header: {missing}")
+        positions = sorted({header.index(c) for c in requested if c in header})
+        if not positions:
+            return pd.DataFrame(columns=requested)
+
+        first_row = 2 + (start_row or 0) # Sheet row of the first requested data row (row 1 is the header)
+        last_row = str(1 + end_row) if end_row is not None else "" # Open-ended A1 range reads to the last row
+        if end_row is not None and end_row <= (start_row or 0):
+            return pd.DataFrame(columns=requested)
+        ranges = [f"'{sheet_meta['title']}'!{_column_letter(col_start)}{first_row}:{_column_letter(col_end - 1)}{last_row}"
+                  for col_start, col_end in _coalesce_row_ranges(positions)]
+        result = execute_google_request(sheets_service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=ranges,
+            majorDimension='COLUMNS',
+            valueRenderOption='UNFORMATTED_VALUE' if typed else 'FORMATTED_VALUE',
+            dateTimeRenderOption='FORMATTED_STRING'
+        ))
+
+        # COLUMNS major dimension returns one list per column, so padding is per column, not per row
+        fetched_columns = {}
+        for (col_start, col_end), value_range in zip(_coalesce_row_ranges(positions), result.get('valueRanges', [])):
+            range_columns = value_range.get('values', [])
+            for offset, col_pos in enumerate(range(col_start, col_end)):
+                fetched_columns[header[col_pos]] = range_columns[offset] if offset < len(range_columns) else []
+        num_rows = max((len(v) for v in fetched_columns.values()), default=0)
+        row_index = pd.RangeIndex((start_row or 0), (start_row or 0) + num_rows)
+        frame = pd.DataFrame(
+            {c: pd.Series(fetched_columns.get(c, []) + [None] * (num_rows - len(fetched_columns.get(c, []))), index=row_index, dtype=object)
+             for c in requested},
+            index=row_index
+        )
+        return apply_dar_sheet_schema(frame) if typed else frame
+    except HttpError as error:
+        st.error(f"An API error occurred reading columns from Spreadsheet: {error}")
+        return pd.DataFrame(columns=requested or [])
+    except Exception as e:
+        st.error(f"Unexpected error reading columns from Spreadsheet: {e}")
+        return pd.DataFrame(columns=requested or [])
+
+# --- Chunked reads for very large sheets ---
+# The data rows are split into blocks of SHEET_READ_BLOCK_ROWS (A2:N5001, A5002:N10001, ...)
+# fetched by separate values.get calls on worker threads, at most max_workers in flight. Each
+# response is small, and is copied into its final place and dropped as soon as it arrives, so
+# the peak is one block's JSON per worker instead of the whole sheet's.
+def _get_sheet_layout(sheets_service, spreadsheet_id):
+    # Title, header and grid row count of the first sheet in one call; the row count bounds the blocks
+    sheet_metadata = execute_google_request(sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=["1:1"],
+        includeGridData=True,
+        fields='sheets(properties(sheetId,title,gridProperties(rowCount)),data(rowData(values(formattedValue))))'
+    ))
+    first_sheet = sheet_metadata.get('sheets', [{}])[0]
+    properties = first_sheet.get('properties', {})
+    row_data = (first_sheet.get('data') or [{}])[0].get('rowData', [])
+    header = [cell.get('formattedValue', '') for cell in (row_data[0].get('values', []) if row_data else [])]
+    while header and not header[-1]:
+        header.pop()
+    _remember_sheet_metadata(spreadsheet_id, properties.get('title', 'Sheet1'), properties.get('sheetId', 0), header)
+    return properties.get('title', 'Sheet1'), header, properties.get('gridProperties', {}).get('rowCount', 0)
+
+def _iter_sheet_row_blocks(spreadsheet_id, title, header, row_count, block_rows, typed, max_workers):
+    """Yields (first_data_row, rows) per block in completion order; rows are lists of cells."""
+    if not header:
+        return
+    last_column = _column_letter(len(header) - 1)
+    block_starts = list(range(0, max(row_count - 1, 1), block_rows))
+
+    def fetch_block(first_data_row):
+        thread_sheets_service = get_thread_google_services()[1]
+        # The last block has no end row, so rows added after the layout was fetched are still read
+        end_row = first_data_row + block_rows + 1 if first_data_row != block_starts[-1] else ''
+        result = execute_google_request(thread_sheets_service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{title}'!A{first_data_row + 2}:{last_column}{end_row}",
+            valueRenderOption='UNFORMATTED_VALUE' if typed else 'FORMATTED_VALUE',
+            dateTimeRenderOption='FORMATTED_STRING'
+        ))
+        return first_data_row, result.get('values', [])
+
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(block_starts))),
+                            initializer=_attach_script_run_ctx, initargs=(get_script_run_ctx(),)) as executor:
+        # A sliding window of submissions keeps at most max_workers blocks in memory
+        next_block = iter(block_starts)
+        in_flight = {executor.submit(fetch_block, start) for start in itertools.islice(next_block, max_workers)}
+        while in_flight:
+            done = next(as_completed(in_flight))
+            in_flight.discard(done)
+            first_data_row, rows = done.result()
+            for start in itertools.islice(next_block, 1):
+                in_flight.add(executor.submit(fetch_block, start))
+            yield first_data_row, rows
+
+def _rows_to_frame(header, rows, first_data_row):
+    # Same padding/truncation as full reads: short rows get None, cells beyond the header are dropped
+    columns_data = list(itertools.zip_longest(*rows, fillvalue=None)) if rows else []
+    index = pd.RangeIndex(first_data_row, first_data_row + len(rows))
+    return pd.DataFrame({
+        col_name: pd.Series(columns_data[i] if i < len(columns_data) else [None] * len(rows), index=index, dtype=object)
+        for i, col_name in enumerate(header)
+    }, index=index)
+
+def iter_spreadsheet_blocks(sheets_service, spreadsheet_id, block_rows=SHEET_READ_BLOCK_ROWS, typed=False,
+                            max_workers=GOOGLE_API_MAX_WORKERS):
+    """
+    Generator over the first sheet in row blocks: yields one DataFrame per block, in sheet order,
+    indexed by data-row position like read_from_spreadsheet, with DAR_SHEET_SCHEMA dtypes when
+    typed. Lets callers aggregate very large sheets without materialising them; only the blocks
+    being fetched and any that arrived ahead of their turn are held in memory.
+    """
+    title, header, row_count = _get_sheet_layout(sheets_service, spreadsheet_id)
+    arrived, next_start = {}, 0
+    for first_data_row, rows in _iter_sheet_row_blocks(spreadsheet_id, title, header, row_count, block_rows, typed, max_workers):
+        arrived[first_data_row] = rows
+        while next_start in arrived:
+            rows = arrived.pop(next_start)
+            if rows:
+                frame = _rows_to_frame(header, rows, next_start)
+                yield apply_dar_sheet_schema(frame) if typed else frame
+            next_start += block_rows
+
+def read_spreadsheet_chunked(sheets_service, spreadsheet_id, block_rows=SHEET_READ_BLOCK_ROWS, typed=False,
+                             max_workers=GOOGLE_API_MAX_WORKERS):
+    """
+    Reads the whole first sheet like read_from_spreadsheet, but as parallel row-block fetches
+    streamed into preallocated per-column buffers. Meant for very large sheets; uncached.
+    """
+    try:
+        title, header, row_count = _get_sheet_layout(sheets_service, spreadsheet_id)
+        if not header:
+            return pd.DataFrame(columns=DAR_SHEET_COLUMNS)
+        # The grid row count sizes the buffers up front; they only grow if the sheet grew since
+        buffers = [np.full(max(row_count - 1, 0), None, dtype=object) for _ in header]
+        num_rows = 0
+        for first_data_row, rows in _iter_sheet_row_blocks(spreadsheet_id, title, header, row_count, block_rows, typed, max_workers):
+            if not rows:
+                continue
+            overflow = first_data_row + len(rows) - len(buffers[0])
+            if overflow > 0:
+                buffers = [np.concatenate([buffer, np.full(overflow, None, dtype=object)]) for buffer in buffers]
+            for i, column_values in enumerate(itertools.zip_longest(*rows, fillvalue=None)):
+                if i < len(buffers):
+                    buffers[i][first_data_row:first_data_row + len(column_values)] = column_values
+            num_rows = max(num_rows, first_data_row + len(rows))
+        frame = pd.DataFrame({col_name: pd.Series(buffers[i][:num_rows], dtype=object, copy=False) for i, col_name in enumerate(header)},
+                             copy=False)
+        return apply_dar_sheet_schema(frame) if typed else frame
+    except HttpError as error:
+        st.error(f"An API error occurred reading from Spreadsheet: {error}")
+        return pd.DataFrame(columns=DAR_SHEET_COLUMNS)
+    except Exception as e: # Includes transport errors raised from the block-fetch workers
+        st.error(f"Unexpected error reading from Spreadsheet: {e}")
+        return pd.DataFrame(columns=DAR_SHEET_COLUMNS)
+
+def _coalesce_row_ranges(row_indices):
+    # Sorted, de-duplicated indices -> contiguous [start, end) ranges, e.g. [5, 2, 3] -> [(2, 4), (5, 6)]
+    ranges = []
+    for row_index in sorted({int(i) for i in row_indices}):
+        if ranges and ranges[-1][1] == row_index:
+            ranges[-1][1] = row_index + 1
+        else:
+            ranges.append([row_index, row_index + 1])
+    return [tuple(r) for r in ranges]
 
 def delete_spreadsheet_rows(sheets_service, spreadsheet_id, sheet_id_gid, row_indices_to_delete):
-    # row_indices_to_delete are 0-based indices of the *data* rows (DataFrame iloc from read_from_spreadsheet)
+    # row_indices_to_delete are 0-based indices of the *data* rows (DataFrame iloc from read_from_spreadsheet).
+    # Pass sheet_id_gid=None to use the cached GID of the first sheet.
     if not row_indices_to_delete:
         return True
-    requests = []
-    # Sort in descending order to avoid index shifting issues during deletion
-    for data_row_index in sorted(row_indices_to_delete, reverse=True):
-        # Sheet API uses 0-based indexing for rows *within the specified range*,
-        # but deleteDimension needs 0-based index relative to start of sheet if sheetId is used.
-        # If header is row 0 in API terms, data row 0 is sheet row 1.
-        # The 'startIndex' for deleteDimension is 0-based and exclusive of the header if sheet data starts from row 1 (0-indexed) after header.
-        # Assuming read_from_spreadsheet gives data starting from what would be sheet row index 1 (if header is 0).
-        # So, if `data_row_index` is 0 (first data row), it means the 2nd row in the sheet (1-indexed), which is row index 1 for the API.
-        sheet_row_start_index = data_row_index + 1 # If data starts at physical row 2 (index 1)
-        requests.append({
-            "deleteDimension": {
-                "range": {
-                    "sheetId": sheet_id_gid,
-                    "dimension": "ROWS",
-                    "startIndex": sheet_row_start_index, # This is the 0-based index of the row in the sheet (header is 0)
-                    "endIndex": sheet_row_start_index + 1
+    try:
+        if sheet_id_gid is None:
+            sheet_id_gid = get_first_sheet_metadata(sheets_service, spreadsheet_id, need_sheet_id=True)['sheet_id']
+        requests = []
+        # Adjacent rows are merged into one deleteDimension per [start, end) range. Ranges are sent
+        # bottom-up so deleting one never shifts the indices of the ones still to be applied.
+        for data_start, data_end in reversed(_coalesce_row_ranges(row_indices_to_delete)):
+            # Data row 0 is sheet row index 1 for the API (the header is row index 0)
+            requests.append({
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": sheet_id_gid,
+                        "dimension": "ROWS",
+                        "startIndex": data_start + 1,
+                        "endIndex": data_end + 1
+                    }
                 }
-            }
+            })
+        body = {'requests': requests}
+        execute_google_request(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id, body=body))
+        invalidate_spreadsheet_cache(spreadsheet_id)
+        return True
+    except HttpError as error:
+        st.error(f"An error occurred deleting rows from Spreadsheet: {error}")
+        return False
+    except Exception as e:
+        st.error(f"Unexpected error deleting rows: {e}")
+        return False
+
+def delete_spreadsheet_rows_where(sheets_service, spreadsheet_id, predicate):
+    """
+    Deletes every data row for which predicate(df) is True, in a single batchUpdate.
+    Example: delete_spreadsheet_rows_where(svc, sid, lambda df: df['DAR PDF URL'] == url)
+
+    The sheet is read through the version-checked cache right before deleting, so the row
+    positions match the sheet. Returns the number of rows deleted, or None on failure.
+    """
+    try:
+        sheet_title = get_first_sheet_metadata(sheets_service, spreadsheet_id)['title']
+    except Exception as e:
+        st.error(f"Could not read sheet details before deleting rows: {e}")
+        return None
+    df = read_from_spreadsheet(sheets_service, spreadsheet_id, sheet_name=sheet_title)
+    if df.empty:
+        return 0
+    mask = pd.Series(predicate(df), index=df.index).fillna(False).astype(bool)
+    positions = mask.to_numpy().nonzero()[0].tolist()
+    if not positions:
+        return 0
+    if delete_spreadsheet_rows(sheets_service, spreadsheet_id, None, positions):
+        return len(positions)
+    return None
+
+def _column_letter(col_index):
+    # 0-based column index -> A1 column letters (0 -> A, 25 -> Z, 26 -> AA)
+    letters = ""
+    col_index += 1
+    while col_index:
+        col_index, remainder = divmod(col_index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _sheet_cell_value(value):
+    # Normalises a DataFrame cell into something the Sheets API accepts (NaN/None -> '')
+    if value is None:
+        return ''
+    try:
+        if pd.isna(value):
+            return ''
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if hasattr(value, 'item'): # numpy scalar -> Python scalar
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _dataframe_to_sheet_values(df):
+    header = [str(col) for col in df.columns]
+    rows = [[_sheet_cell_value(v) for v in row] for row in df.itertuples(index=False, name=None)]
+    return [header] + rows
+
+def _diff_sheet_values(old_values, new_values, sheet_title):
+    """
+    Compares two value grids (header row first) and returns values.batchUpdate 'data' entries
+    covering only what changed: one range per run of changed cells in existing rows, one block
+    for appended rows and one blank block overwriting rows that no longer exist.
+    """
+    def cell(row, col):
+        return row[col] if col < len(row) else ''
+
+    data = []
+    common_rows = min(len(old_values), len(new_values))
+    for r in range(common_rows):
+        old_row, new_row = old_values[r], new_values[r]
+        row_width = max(len(old_row), len(new_row))
+        c = 0
+        while c < row_width:
+            if str(cell(old_row, c)) == str(cell(new_row, c)):
+                c += 1
+                continue
+            run_start = c
+            while c < row_width and str(cell(old_row, c)) != str(cell(new_row, c)):
+                c += 1
+            data.append({
+                'range': f"'{sheet_title}'!{_column_letter(run_start)}{r + 1}:{_column_letter(c - 1)}{r + 1}",
+                'values': [[cell(new_row, k) for k in range(run_start, c)]]
+            })
+
+    if len(new_values) > common_rows: # Appended rows
+        appended = new_values[common_rows:]
+        width = max(len(row) for row in appended) or 1
+        data.append({
+            'range': f"'{sheet_title}'!A{common_rows + 1}:{_column_letter(width - 1)}{len(new_values)}",
+            'values': [[cell(row, k) for k in range(width)] for row in appended]
         })
-    if requests:
-        try:
-            body = {'requests': requests}
-            sheets_service.spreadsheets().batchUpdate(
-                spreadsheetId=spreadsheet_id, body=body).execute()
-            return True
-        except HttpError as error:
-            st.error(f"An error occurred deleting rows from Spreadsheet: {error}")
-            return False
-        except Exception as e:
-            st.error(f"Unexpected error deleting rows: {e}")
-            return False
-    return True# # google_utils.py
-def update_spreadsheet_from_df(sheets_service, spreadsheet_id, df_to_write):
+    elif len(old_values) > common_rows: # Removed rows are blanked; trailing empty rows are not returned on read
+        removed = old_values[common_rows:]
+        width = max(len(row) for row in removed) or 1
+        data.append({
+            'range': f"'{sheet_title}'!A{common_rows + 1}:{_column_letter(width - 1)}{len(old_values)}",
+            'values': [[''] * width for _ in removed]
+        })
+    return data
+
+def _merge_sheet_row(read_row, new_row, current_row):
+    """Three-way cell merge: cells the user left as read take the sheet's current value, so concurrent edits survive."""
+    if current_row is None:
+        return new_row
+    def cell(row, col):
+        return row[col] if col < len(row) else ''
+    width = max(len(read_row), len(new_row), len(current_row))
+    return [cell(new_row, c) if str(cell(new_row, c)) != str(cell(read_row, c)) else cell(current_row, c) for c in range(width)]
+
+def _update_spreadsheet_incrementally(sheets_service, spreadsheet_id, sheet_title, df_to_write, snapshot=None):
+    # Version-checked read: served from cache when nobody has written since the last read
+    current_values = _get_sheet_values_entry(sheets_service, spreadsheet_id, sheet_title)['values']
+    new_values = _dataframe_to_sheet_values(df_to_write)
+
+    target = new_values
+    if snapshot is not None and snapshot.spreadsheet_id == spreadsheet_id:
+        snapshot_len = len(snapshot.values)
+        # The index of a frame from read_from_spreadsheet is the data-row position it was read at,
+        # and survives filtering, .loc edits and st.data_editor. Any other index is read positionally.
+        index = df_to_write.index
+        positions = list(index) if index.is_unique and pd.api.types.is_integer_dtype(index) else range(len(df_to_write))
+        read_rows, added_rows = [], []
+        for position, new_row in zip(positions, new_values[1:]):
+            sheet_row = position + 1
+            if 0 <= position < snapshot_len - 1:
+                current_row = current_values[sheet_row] if sheet_row < len(current_values) else None
+                read_rows.append(_merge_sheet_row(snapshot.values[sheet_row], new_row, current_row))
+            else:
+                added_rows.append(new_row)
+        # Rows appended by others after the read keep their content (and their place unless rows
+        # above were removed); rows added to the DataFrame go below them
+        target = new_values[:1] + read_rows + current_values[snapshot_len:] + added_rows
+
+    data = _diff_sheet_values(current_values, target, sheet_title)
+    if data:
+        execute_google_request(sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'valueInputOption': 'USER_ENTERED', 'data': data}
+        ))
+    return len(data)
+
+def update_spreadsheet_from_df(sheets_service, spreadsheet_id, df_to_write, incremental=True, source_df=None):
     """
-    Clears the first sheet in a spreadsheet and updates it with data from a pandas DataFrame.
+    Writes a pandas DataFrame (header included) to the first sheet of a spreadsheet.
+
+    By default the DataFrame is diffed against the snapshot it was read from (set by
+    read_from_spreadsheet in df.attrs and kept through filtering and .loc edits) and only the
+    changed cells, appended rows and removed rows are sent in a single values.batchUpdate.
+    Rows other users appended after that read are never overwritten or cleared.
+    With incremental=False the sheet is cleared and rewritten in full.
 
     Args:
         sheets_service: The authenticated Google Sheets service object.
         spreadsheet_id (str): The ID of the spreadsheet to update.
         df_to_write (pd.DataFrame): The DataFrame containing the new data.
+        incremental (bool): Send only the differences instead of clearing and rewriting.
+        source_df (pd.DataFrame | None): The read df_to_write was derived from, for derivations
+            that drop attrs (st.data_editor, pd.concat). Defaults to df_to_write itself.
 
     Returns:
         bool: True if successful, False otherwise.
     """
     try:
-        # Get the title of the first sheet, which is the target for clearing and updating
-        sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        first_sheet_title = sheet_metadata['sheets'][0]['properties']['title']
+        # The first sheet is the target for clearing and updating
+        sheet_meta = get_first_sheet_metadata(sheets_service, spreadsheet_id)
+        first_sheet_title = sheet_meta['title']
+
+        if incremental:
+            snapshot = (source_df if source_df is not None else df_to_write).attrs.get('sheet_snapshot')
+            _update_spreadsheet_incrementally(sheets_service, spreadsheet_id, first_sheet_title, df_to_write, snapshot)
+            invalidate_spreadsheet_cache(spreadsheet_id)
+            _remember_sheet_metadata(spreadsheet_id, first_sheet_title, sheet_meta['sheet_id'], [str(c) for c in df_to_write.columns])
+            return True
 
         # Step 1: Clear the entire sheet to remove old data
-        clear_range = f"{first_sheet_title}"
-        sheets_service.spreadsheets().values().clear(
+        clear_range = f"'{first_sheet_title}'"
+        execute_google_request(sheets_service.spreadsheets().values().clear(
             spreadsheetId=spreadsheet_id,
             range=clear_range
-        ).execute()
+        ))
 
-        # Step 2: Prepare the DataFrame for writing
-        # Replace NaN/NaT values with empty strings, as the API handles them better
-        df_prepared = df_to_write.fillna('')
-        # Convert the DataFrame (including headers) to a list of lists
-        values_to_write = [df_prepared.columns.values.tolist()] + df_prepared.values.tolist()
+        # Step 2: Prepare the DataFrame (including headers) as a list of lists, NaN/NaT -> ''
+        values_to_write = _dataframe_to_sheet_values(df_to_write)
 
         # Step 3: Write the new data to the sheet starting from cell A1
-        update_range = f"{first_sheet_title}!A1"
+        update_range = f"'{first_sheet_title}'!A1"
         body = {'values': values_to_write}
-        sheets_service.spreadsheets().values().update(
+        execute_google_request(sheets_service.spreadsheets().values().update(
             spreadsheetId=spreadsheet_id,
             range=update_range,
             valueInputOption='USER_ENTERED',
             body=body
-        ).execute()
-        
+        ))
+        invalidate_spreadsheet_cache(spreadsheet_id)
+        _remember_sheet_metadata(spreadsheet_id, first_sheet_title, sheet_meta['sheet_id'], values_to_write[0])
+
         return True
 
     except HttpError as error:
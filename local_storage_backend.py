@@ -0,0 +1,772 @@
+# local_storage_backend.py
+# Offline stand-in for Google Drive and Google Sheets.
+#
+# The storage interface the app programs against is the googleapiclient call surface that
+# google_utils and the UI modules already use, so this backend mimics exactly that subset:
+#
+#   Drive:  files().list/get/get_media/create/update/delete, permissions().create,
+#           changes().getStartPageToken/list, new_batch_http_request()
+#   Sheets: spreadsheets().create/get/batchUpdate(deleteDimension),
+#           spreadsheets().values().get/batchGet/append/update/clear/batchUpdate,
+#           new_batch_http_request()
+#
+# Every call returns a request object with methodId/method/uri and execute(), so requests flow
+# through google_utils.execute_google_request (quota buckets, retries, call stats) unchanged.
+# File contents live under <root>/blobs, metadata and sheet cells in <root>/local_storage.sqlite3.
+# Latency, random failures (HttpError with a configurable status) and Google's per-minute
+# Sheets quotas can be simulated to measure the app's throughput and retry behaviour offline.
+import csv
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+_LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT NOT NULL,
+    parents_json TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    modified_time TEXT NOT NULL,
+    trashed INTEGER NOT NULL DEFAULT 0,
+    app_properties_json TEXT NOT NULL DEFAULT '{}',
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS permissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL,
+    type TEXT,
+    role TEXT
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    sheet_index INTEGER NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_id)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0,
+    time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_id INTEGER NOT NULL,
+    row_idx INTEGER NOT NULL,
+    row_json TEXT NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_id, row_idx)
+);
+"""
+
+_A1_CELLS_PATTERN = re.compile(r"^([A-Za-z]{0,3})(\d*)(?::([A-Za-z]{0,3})(\d*))?$")
+_NUMBER_PATTERN = re.compile(r"^-?\d+(\.\d+)?$")
+_QUERY_CLAUSE_PATTERNS = [
+    (re.compile(r"^name\s*=\s*'((?:[^'\\]|\\.)*)'$"), 'name'),
+    (re.compile(r"^mimeType\s*=\s*'((?:[^'\\]|\\.)*)'$"), 'mime_type'),
+    (re.compile(r"^mimeType\s*!=\s*'((?:[^'\\]|\\.)*)'$"), 'not_mime_type'),
+    (re.compile(r"^'((?:[^'\\]|\\.)*)'\s+in\s+parents$"), 'parent'),
+    (re.compile(r"^trashed\s*=\s*(true|false)$"), 'trashed'),
+    (re.compile(r"^appProperties\s+has\s+\{\s*key\s*=\s*'((?:[^'\\]|\\.)*)'\s+and\s+value\s*=\s*'((?:[^'\\]|\\.)*)'\s*\}$"), 'app_property'),
+]
+_QUERY_AND_SPLIT = re.compile(r"\s+and\s+(?![^{]*\})") # 'and' inside appProperties has { ... } is not a clause separator
+
+def _now_rfc3339():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _column_index(letters):
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index - 1
+
+def _column_letters(col_index):
+    letters = ""
+    col_index += 1
+    while col_index > 0:
+        col_index, remainder = divmod(col_index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def _parse_a1_range(a1_range):
+    """Returns (sheet_title or None, row_start, col_start, row_end, col_end), 0-based and inclusive; None means open-ended."""
+    a1_range = a1_range.strip()
+    sheet_title, cells = None, a1_range
+    if '!' in a1_range:
+        sheet_title, cells = a1_range.rsplit('!', 1)
+    elif not _A1_CELLS_PATTERN.match(a1_range) or not a1_range:
+        sheet_title, cells = a1_range, ''
+    if sheet_title is not None and sheet_title.startswith("'") and sheet_title.endswith("'"):
+        sheet_title = sheet_title[1:-1].replace("''", "'")
+    match = _A1_CELLS_PATTERN.match(cells)
+    if not cells or not match:
+        return sheet_title, 0, 0, None, None
+    col1, row1, col2, row2 = match.groups()
+    has_end = ':' in cells
+    row_start = int(row1) - 1 if row1 else 0
+    col_start = _column_index(col1) if col1 else 0
+    if has_end:
+        row_end = int(row2) - 1 if row2 else None
+        col_end = _column_index(col2) if col2 else None
+    else: # A single cell, a whole row ("3") or a whole column ("C")
+        row_end = row_start if row1 else None
+        col_end = col_start if col1 else None
+    return sheet_title, row_start, col_start, row_end, col_end
+
+def _user_entered_value(value):
+    # USER_ENTERED input is parsed the way the Sheets UI would: numbers, booleans, 'literal text
+    if isinstance(value, str):
+        if value.startswith("'"):
+            return value[1:]
+        if _NUMBER_PATTERN.match(value.strip()):
+            number = float(value)
+            return int(number) if number.is_integer() and '.' not in value else number
+        if value.upper() in ('TRUE', 'FALSE'):
+            return value.upper() == 'TRUE'
+    return value
+
+def _formatted_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _trim_grid(rows):
+    # Sheets omits trailing empty cells of each row and trailing empty rows
+    trimmed = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] in (None, ''):
+            row.pop()
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+class LocalRequest:
+    """Mimics googleapiclient.http.HttpRequest: carries methodId/method/uri and runs on execute()."""
+    def __init__(self, backend, method_id, http_method, path, handler, body=None, media_body=None):
+        self.methodId = method_id
+        self.method = http_method
+        self.uri = f"local://{path}"
+        self.body = json.dumps(body) if body is not None else None # Serialized like HttpRequest.body
+        self.media_body = media_body
+        self._backend = backend
+        self._handler = handler
+
+    def execute(self, num_retries=0):
+        return self._backend.dispatch(self)
+
+class LocalBatchRequest:
+    """
+    Mimics googleapiclient.http.BatchHttpRequest: one round-trip of simulated latency for the
+    whole batch, while errors and quotas apply to each sub-request as they do on Google's side.
+    """
+    MAX_REQUESTS = 100 # Drive/Sheets reject larger batches
+
+    def __init__(self, backend, callback=None):
+        self._backend = backend
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= self.MAX_REQUESTS:
+            raise ValueError(f"A batch request can contain at most {self.MAX_REQUESTS} calls")
+        self._requests.append((str(request_id if request_id is not None else len(self._requests) + 1), request, callback))
+
+    def execute(self):
+        self._backend.simulate_latency()
+        for request_id, request, callback in self._requests:
+            response, exception = None, None
+            try:
+                response = self._backend.dispatch(request, simulate_latency=False)
+            except HttpError as error:
+                exception = error
+            for handler in (callback, self._callback):
+                if handler is not None:
+                    handler(request_id, response, exception)
+
+class LocalStorageBackend:
+    def __init__(self, root_dir, latency_seconds=0.0, latency_jitter_seconds=0.0, error_rate=0.0,
+                 error_status=503, sheets_read_quota_per_minute=None, sheets_write_quota_per_minute=None, seed=None,
+                 measure_payload=False):
+        """
+        Args:
+            root_dir (str): Directory holding blobs/ and local_storage.sqlite3; created if missing.
+            latency_seconds, latency_jitter_seconds (float): Added to every call (uniform jitter on top).
+            error_rate (float): Probability in [0, 1] that a call fails with HttpError(error_status).
+            sheets_*_quota_per_minute (int | None): When set, calls beyond the limit in any
+                rolling minute fail with 429 rateLimitExceeded, like the real Sheets API.
+            measure_payload (bool): Count request/response bytes as JSON on the wire (see get_transfer_stats).
+        """
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._quota_limits = {'sheets_read': sheets_read_quota_per_minute, 'sheets_write': sheets_write_quota_per_minute}
+        self._quota_windows = {'sheets_read': deque(), 'sheets_write': deque()}
+        self._random = random.Random(seed)
+        self.measure_payload = measure_payload
+        self._transfer_stats = {'requests': 0, 'request_bytes': 0, 'response_bytes': 0}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(root_dir, 'local_storage.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_LOCAL_SCHEMA)
+
+    # --- Request dispatch: latency, error injection, quotas ---
+    def _http_error(self, request, status, message, reason):
+        resp = httplib2.Response({'status': status, 'content-type': 'application/json'})
+        resp.reason = message
+        content = json.dumps({'error': {'code': status, 'message': message,
+                                        'errors': [{'reason': reason, 'message': message}]}}).encode('utf-8')
+        return HttpError(resp, content, uri=request.uri)
+
+    def _check_quota(self, request):
+        if not request.methodId.startswith('sheets.'):
+            return
+        bucket = 'sheets_read' if request.method == 'GET' else 'sheets_write'
+        limit = self._quota_limits[bucket]
+        if not limit:
+            return
+        now = time.monotonic()
+        with self._lock:
+            window = self._quota_windows[bucket]
+            while window and now - window[0] >= 60.0:
+                window.popleft()
+            if len(window) >= limit:
+                raise self._http_error(request, 429, "Quota exceeded for quota metric 'Requests per minute'", 'rateLimitExceeded')
+            window.append(now)
+
+    def simulate_latency(self):
+        delay = self.latency_seconds + (self._random.uniform(0, self.latency_jitter_seconds) if self.latency_jitter_seconds else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def dispatch(self, request, simulate_latency=True):
+        if simulate_latency:
+            self.simulate_latency()
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise self._http_error(request, self.error_status, "Injected failure", 'backendError')
+        self._check_quota(request)
+        with self._lock:
+            result = request._handler()
+            self._transfer_stats['requests'] += 1
+            if self.measure_payload:
+                self._transfer_stats['request_bytes'] += len(request.body or '') + (request.media_body.size() if request.media_body is not None else 0)
+                self._transfer_stats['response_bytes'] += len(result) if isinstance(result, bytes) else len(json.dumps(result))
+        return result
+
+    def get_transfer_stats(self):
+        """Returns {'requests', 'request_bytes', 'response_bytes'}; byte counts need measure_payload=True."""
+        with self._lock:
+            return dict(self._transfer_stats)
+
+    def reset_transfer_stats(self):
+        with self._lock:
+            self._transfer_stats = {'requests': 0, 'request_bytes': 0, 'response_bytes': 0}
+
+    def _not_found(self, request_path, what):
+        return self._http_error(LocalRequest(self, 'local', 'GET', request_path, None), 404, f"{what} not found", 'notFound')
+
+    # --- Drive: files ---
+    def _file_row(self, file_id):
+        row = self._conn.execute(
+            "SELECT id, name, mime_type, parents_json, version, modified_time, trashed, app_properties_json, size "
+            "FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None:
+            raise self._not_found(f"drive/files/{file_id}", f"File: {file_id}")
+        return row
+
+    def _file_resource(self, row):
+        file_id, name, mime_type, parents_json, version, modified_time, trashed, app_properties_json, size = row
+        return {
+            'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': json.loads(parents_json),
+            'version': str(version), 'headRevisionId': str(version), 'modifiedTime': modified_time,
+            'trashed': bool(trashed), 'appProperties': json.loads(app_properties_json), 'size': str(size),
+            'webViewLink': f"local://drive/{file_id}/view",
+            'permissions': [{'id': str(p[0]), 'type': p[1], 'role': p[2]} for p in self._conn.execute(
+                "SELECT id, type, role FROM permissions WHERE file_id = ? ORDER BY id", (file_id,)).fetchall()],
+        }
+
+    def _record_change(self, file_id, removed=False):
+        self._conn.execute("INSERT INTO changes (file_id, removed, time) VALUES (?, ?, ?)", (file_id, int(removed), _now_rfc3339()))
+
+    def _bump_file_version(self, file_id):
+        self._conn.execute("UPDATE files SET version = version + 1, modified_time = ? WHERE id = ?", (_now_rfc3339(), file_id))
+        self._record_change(file_id)
+
+    def _write_blob(self, file_id, media_body):
+        content = media_body.getbytes(0, media_body.size()) if media_body.size() else b''
+        with open(os.path.join(self.blob_dir, file_id), 'wb') as blob:
+            blob.write(content)
+        return len(content)
+
+    def create_file(self, body, media_body=None):
+        body = body or {}
+        file_id = uuid.uuid4().hex
+        mime_type = body.get('mimeType') or (media_body.mimetype() if media_body is not None else 'application/octet-stream')
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO files (id, name, mime_type, parents_json, version, modified_time, app_properties_json) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?)",
+                (file_id, body.get('name', 'Untitled'), mime_type, json.dumps(body.get('parents') or ['root']),
+                 _now_rfc3339(), json.dumps(body.get('appProperties') or {})))
+            if mime_type == SPREADSHEET_MIME_TYPE:
+                converted = media_body is not None and media_body.size() # CSV upload converted to a Google Sheet
+                # Like Drive, a converted sheet's tab is named after the file; an empty one gets "Sheet1"
+                self._conn.execute("INSERT INTO sheets VALUES (?, 0, ?, 0)", (file_id, body.get('name', 'Untitled') if converted else 'Sheet1'))
+                if converted:
+                    csv_text = media_body.getbytes(0, media_body.size()).decode('utf-8-sig')
+                    self._write_cells(file_id, 0, 0, 0, list(csv.reader(io.StringIO(csv_text))), 'USER_ENTERED')
+            elif media_body is not None:
+                self._conn.execute("UPDATE files SET size = ? WHERE id = ?", (self._write_blob(file_id, media_body), file_id))
+            self._record_change(file_id)
+        return self._file_resource(self._file_row(file_id))
+
+    def update_file(self, file_id, body=None, media_body=None, addParents=None, removeParents=None):
+        row = self._file_row(file_id)
+        parents = json.loads(row[3])
+        if removeParents:
+            parents = [p for p in parents if p not in removeParents.split(',')]
+        if addParents:
+            parents += [p for p in addParents.split(',') if p not in parents]
+        body = body or {}
+        app_properties = json.loads(row[7])
+        app_properties.update(body.get('appProperties') or {})
+        with self._conn:
+            self._conn.execute("UPDATE files SET name = ?, parents_json = ?, app_properties_json = ?, trashed = ? WHERE id = ?",
+                               (body.get('name', row[1]), json.dumps(parents), json.dumps(app_properties),
+                                int(body.get('trashed', row[6])), file_id))
+            if media_body is not None:
+                self._conn.execute("UPDATE files SET size = ? WHERE id = ?", (self._write_blob(file_id, media_body), file_id))
+            self._bump_file_version(file_id)
+        return self._file_resource(self._file_row(file_id))
+
+    def get_file(self, file_id):
+        return self._file_resource(self._file_row(file_id))
+
+    def get_file_media(self, file_id):
+        self._file_row(file_id)
+        blob_path = os.path.join(self.blob_dir, file_id)
+        if not os.path.exists(blob_path):
+            return b''
+        with open(blob_path, 'rb') as blob:
+            return blob.read()
+
+    def list_revisions(self, file_id):
+        # Every write bumps the version by one, so revisions 1..version are the file's history, oldest first
+        version = self._file_row(file_id)[4]
+        return {'revisions': [{'id': str(v)} for v in range(1, version + 1)]}
+
+    def delete_file(self, file_id):
+        self._file_row(file_id)
+        with self._conn:
+            for table, column in (('files', 'id'), ('permissions', 'file_id'), ('sheets', 'spreadsheet_id'), ('sheet_rows', 'spreadsheet_id')):
+                self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (file_id,))
+            self._record_change(file_id, removed=True)
+        blob_path = os.path.join(self.blob_dir, file_id)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+        return ''
+
+    def list_files(self, q=None, pageSize=None, pageToken=None):
+        conditions, params = [], []
+        for clause in _QUERY_AND_SPLIT.split(q.strip()) if q else []:
+            for pattern, kind in _QUERY_CLAUSE_PATTERNS:
+                match = pattern.match(clause.strip())
+                if not match:
+                    continue
+                value = match.group(1).replace("\\'", "'")
+                if kind == 'name':
+                    conditions.append("name = ?"); params.append(value)
+                elif kind == 'mime_type':
+                    conditions.append("mime_type = ?"); params.append(value)
+                elif kind == 'not_mime_type':
+                    conditions.append("mime_type != ?"); params.append(value)
+                elif kind == 'parent':
+                    conditions.append("EXISTS (SELECT 1 FROM json_each(files.parents_json) WHERE json_each.value = ?)"); params.append(value)
+                elif kind == 'app_property':
+                    conditions.append("EXISTS (SELECT 1 FROM json_each(files.app_properties_json) WHERE json_each.key = ? AND json_each.value = ?)")
+                    params.extend([value, match.group(2).replace("\\'", "'")])
+                else:
+                    conditions.append("trashed = ?"); params.append(int(value == 'true'))
+                break
+            else:
+                raise ValueError(f"Unsupported Drive query clause for the local backend: {clause}")
+        query = ("SELECT id, name, mime_type, parents_json, version, modified_time, trashed, app_properties_json, size FROM files"
+                 + (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY rowid")
+        rows = self._conn.execute(query, params).fetchall()
+        offset = int(pageToken or 0)
+        page_size = pageSize or 100
+        result = {'files': [self._file_resource(r) for r in rows[offset:offset + page_size]]}
+        if offset + page_size < len(rows):
+            result['nextPageToken'] = str(offset + page_size)
+        return result
+
+    def get_start_page_token(self):
+        row = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM changes").fetchone()
+        return {'startPageToken': str(row[0])}
+
+    def list_changes(self, pageToken, pageSize=None):
+        page_size = pageSize or 100
+        rows = self._conn.execute("SELECT id, file_id, removed, time FROM changes WHERE id >= ? ORDER BY id LIMIT ?",
+                                  (int(pageToken), page_size + 1)).fetchall()
+        result = {'changes': [{'changeType': 'file', 'fileId': file_id, 'removed': bool(removed), 'time': changed_at}
+                              for _, file_id, removed, changed_at in rows[:page_size]]}
+        if len(rows) > page_size:
+            result['nextPageToken'] = str(rows[page_size][0])
+        else:
+            result['newStartPageToken'] = str((rows[-1][0] if rows else int(pageToken) - 1) + 1)
+        return result
+
+    def create_permission(self, file_id, body):
+        self._file_row(file_id)
+        with self._conn:
+            cursor = self._conn.execute("INSERT INTO permissions (file_id, type, role) VALUES (?, ?, ?)",
+                                        (file_id, body.get('type'), body.get('role')))
+        return {'id': str(cursor.lastrowid), 'type': body.get('type'), 'role': body.get('role')}
+
+    # --- Sheets: grid storage ---
+    def _sheet_props(self, spreadsheet_id):
+        rows = self._conn.execute("SELECT sheet_id, title, sheet_index FROM sheets WHERE spreadsheet_id = ? ORDER BY sheet_index",
+                                  (spreadsheet_id,)).fetchall()
+        if not rows:
+            raise self._not_found(f"sheets/{spreadsheet_id}", f"Requested entity was not found: {spreadsheet_id}")
+        # Like Google, the grid is at least 1000 x 26 and grows with the data
+        return [{'sheetId': r[0], 'title': r[1], 'index': r[2],
+                 'gridProperties': {'rowCount': max(1000, self._last_row_index(spreadsheet_id, r[0]) + 1), 'columnCount': 26}}
+                for r in rows]
+
+    def _resolve_range(self, spreadsheet_id, a1_range):
+        sheets = self._sheet_props(spreadsheet_id)
+        if '!' not in a1_range and any(s['title'] == a1_range.strip("'") for s in sheets):
+            a1_range = f"'{a1_range.strip(chr(39))}'!" # A bare sheet name wins over an A1 lookalike such as "Sheet1"
+        sheet_title, row_start, col_start, row_end, col_end = _parse_a1_range(a1_range)
+        sheet = sheets[0] if sheet_title is None else next((s for s in sheets if s['title'] == sheet_title), None)
+        if sheet is None:
+            raise self._http_error(LocalRequest(self, 'local', 'GET', f"sheets/{spreadsheet_id}", None), 400,
+                                   f"Unable to parse range: {a1_range}", 'badRequest')
+        return sheet, row_start, col_start, row_end, col_end
+
+    def _a1(self, sheet, row_start, col_start, row_end, col_end):
+        title = "'" + sheet['title'].replace("'", "''") + "'"
+        return f"{title}!{_column_letters(col_start)}{row_start + 1}:{_column_letters(col_end)}{row_end + 1}"
+
+    def _read_rows(self, spreadsheet_id, sheet_id, row_start, row_end):
+        query = "SELECT row_idx, row_json FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_id = ? AND row_idx >= ?"
+        params = [spreadsheet_id, sheet_id, row_start]
+        if row_end is not None:
+            query += " AND row_idx <= ?"
+            params.append(row_end)
+        return {idx: json.loads(row_json) for idx, row_json in self._conn.execute(query + " ORDER BY row_idx", params)}
+
+    def _last_row_index(self, spreadsheet_id, sheet_id):
+        row = self._conn.execute("SELECT MAX(row_idx) FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_id = ?",
+                                 (spreadsheet_id, sheet_id)).fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def _write_cells(self, spreadsheet_id, sheet_id, row_start, col_start, values, value_input_option):
+        existing = self._read_rows(spreadsheet_id, sheet_id, row_start, row_start + len(values) - 1) if values else {}
+        updates = []
+        for offset, new_row in enumerate(values):
+            row = existing.get(row_start + offset, [])
+            if len(row) < col_start + len(new_row):
+                row = row + [None] * (col_start + len(new_row) - len(row))
+            for i, cell in enumerate(new_row):
+                row[col_start + i] = _user_entered_value(cell) if value_input_option == 'USER_ENTERED' else cell
+            updates.append((spreadsheet_id, sheet_id, row_start + offset, json.dumps(row)))
+        self._conn.executemany("INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?, ?)", updates)
+        self._bump_file_version(spreadsheet_id)
+        width = max((len(r) for r in values), default=0)
+        return len(values), sum(len(r) for r in values), width
+
+    def _render(self, grid, value_render_option):
+        if value_render_option == 'FORMATTED_VALUE':
+            return [[_formatted_value(v) for v in row] for row in grid]
+        return [['' if v is None else v for v in row] for row in grid]
+
+    def get_values(self, spreadsheet_id, a1_range, majorDimension='ROWS', valueRenderOption='FORMATTED_VALUE'):
+        sheet, row_start, col_start, row_end, col_end = self._resolve_range(spreadsheet_id, a1_range)
+        stored = self._read_rows(spreadsheet_id, sheet['sheetId'], row_start, row_end)
+        last_row = max(stored) if stored else row_start - 1
+        grid = []
+        for row_idx in range(row_start, (row_end if row_end is not None else last_row) + 1):
+            row = stored.get(row_idx, [])
+            grid.append(row[col_start:(col_end + 1) if col_end is not None else None])
+        grid = _trim_grid(self._render(grid, valueRenderOption))
+        if majorDimension == 'COLUMNS':
+            width = max((len(r) for r in grid), default=0)
+            grid = _trim_grid([[row[c] if c < len(row) else '' for row in grid] for c in range(width)])
+        width = max((len(r) for r in grid), default=1) if majorDimension == 'ROWS' else max(len(grid), 1)
+        height = len(grid) if majorDimension == 'ROWS' else max((len(r) for r in grid), default=1)
+        result = {'range': self._a1(sheet, row_start, col_start, row_start + max(height, 1) - 1, col_start + max(width, 1) - 1),
+                  'majorDimension': majorDimension}
+        if grid:
+            result['values'] = grid
+        return result
+
+    def append_values(self, spreadsheet_id, a1_range, values, value_input_option):
+        sheet, _, col_start, _, _ = self._resolve_range(spreadsheet_id, a1_range)
+        row_start = self._last_row_index(spreadsheet_id, sheet['sheetId']) + 1 # Appends after the last row with data
+        rows, cells, width = self._write_cells(spreadsheet_id, sheet['sheetId'], row_start, col_start, values, value_input_option)
+        updated_range = self._a1(sheet, row_start, col_start, row_start + max(rows, 1) - 1, col_start + max(width, 1) - 1)
+        return {'spreadsheetId': spreadsheet_id, 'tableRange': a1_range,
+                'updates': {'spreadsheetId': spreadsheet_id, 'updatedRange': updated_range,
+                            'updatedRows': rows, 'updatedColumns': width, 'updatedCells': cells}}
+
+    def update_values(self, spreadsheet_id, a1_range, values, value_input_option):
+        sheet, row_start, col_start, _, _ = self._resolve_range(spreadsheet_id, a1_range)
+        rows, cells, width = self._write_cells(spreadsheet_id, sheet['sheetId'], row_start, col_start, values, value_input_option)
+        return {'spreadsheetId': spreadsheet_id,
+                'updatedRange': self._a1(sheet, row_start, col_start, row_start + max(rows, 1) - 1, col_start + max(width, 1) - 1),
+                'updatedRows': rows, 'updatedColumns': width, 'updatedCells': cells}
+
+    def clear_values(self, spreadsheet_id, a1_range):
+        sheet, row_start, col_start, row_end, col_end = self._resolve_range(spreadsheet_id, a1_range)
+        sheet_id = sheet['sheetId']
+        if col_start == 0 and col_end is None:
+            query = "DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_id = ? AND row_idx >= ?"
+            params = [spreadsheet_id, sheet_id, row_start]
+            if row_end is not None:
+                query += " AND row_idx <= ?"
+                params.append(row_end)
+            self._conn.execute(query, params)
+        else:
+            updates = []
+            for row_idx, row in self._read_rows(spreadsheet_id, sheet_id, row_start, row_end).items():
+                stop = len(row) if col_end is None else min(len(row), col_end + 1)
+                for i in range(col_start, stop):
+                    row[i] = None
+                updates.append((spreadsheet_id, sheet_id, row_idx, json.dumps(row)))
+            self._conn.executemany("INSERT OR REPLACE INTO sheet_rows VALUES (?, ?, ?, ?)", updates)
+        self._bump_file_version(spreadsheet_id)
+        return {'spreadsheetId': spreadsheet_id, 'clearedRange': a1_range}
+
+    def create_spreadsheet(self, body):
+        body = body or {}
+        title = body.get('properties', {}).get('title', 'Untitled spreadsheet')
+        spreadsheet = self.create_file({'name': title, 'mimeType': SPREADSHEET_MIME_TYPE})
+        spreadsheet_id = spreadsheet['id']
+        self._conn.execute("DELETE FROM sheets WHERE spreadsheet_id = ?", (spreadsheet_id,))
+        for index, sheet_body in enumerate(body.get('sheets') or [{'properties': {'title': 'Sheet1'}}]):
+            properties = sheet_body.get('properties', {})
+            sheet_id = properties.get('sheetId', index)
+            self._conn.execute("INSERT INTO sheets VALUES (?, ?, ?, ?)",
+                               (spreadsheet_id, sheet_id, properties.get('title', f"Sheet{index + 1}"), index))
+            for grid_data in sheet_body.get('data', []):
+                values = [[next(iter(cell.get('userEnteredValue', {'stringValue': None}).values())) for cell in row.get('values', [])]
+                          for row in grid_data.get('rowData', [])]
+                if values:
+                    self._write_cells(spreadsheet_id, sheet_id, grid_data.get('startRow', 0), grid_data.get('startColumn', 0), values, 'RAW')
+        self._conn.commit()
+        return {'spreadsheetId': spreadsheet_id, 'properties': {'title': title},
+                'spreadsheetUrl': f"local://sheets/{spreadsheet_id}/edit",
+                'sheets': [{'properties': p} for p in self._sheet_props(spreadsheet_id)]}
+
+    def get_spreadsheet(self, spreadsheet_id, ranges=None, includeGridData=False):
+        sheets = [{'properties': p} for p in self._sheet_props(spreadsheet_id)]
+        if includeGridData:
+            for a1_range in ranges or []:
+                sheet, *_ = self._resolve_range(spreadsheet_id, a1_range)
+                grid = self.get_values(spreadsheet_id, a1_range).get('values', [])
+                target = next(s for s in sheets if s['properties']['sheetId'] == sheet['sheetId'])
+                target.setdefault('data', []).append({'rowData': [
+                    {'values': [({'formattedValue': v} if v != '' else {}) for v in row]} for row in grid]})
+        return {'spreadsheetId': spreadsheet_id, 'sheets': sheets,
+                'properties': {'title': self._file_row(spreadsheet_id)[1]}}
+
+    def batch_update_spreadsheet(self, spreadsheet_id, body):
+        replies = []
+        for request_body in (body or {}).get('requests', []):
+            delete = request_body.get('deleteDimension')
+            if delete is None or delete['range'].get('dimension') != 'ROWS':
+                raise ValueError(f"Unsupported batchUpdate request for the local backend: {list(request_body)}")
+            sheet_id = delete['range']['sheetId']
+            start, end = delete['range']['startIndex'], delete['range']['endIndex']
+            self._conn.execute("DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_id = ? AND row_idx >= ? AND row_idx < ?",
+                               (spreadsheet_id, sheet_id, start, end))
+            # Shift the rows below up in two steps (via negative indices) to keep the primary key unique
+            self._conn.execute("UPDATE sheet_rows SET row_idx = -(row_idx - ?) - 1 WHERE spreadsheet_id = ? AND sheet_id = ? AND row_idx >= ?",
+                               (end - start, spreadsheet_id, sheet_id, end))
+            self._conn.execute("UPDATE sheet_rows SET row_idx = -row_idx - 1 WHERE spreadsheet_id = ? AND sheet_id = ? AND row_idx < 0",
+                               (spreadsheet_id, sheet_id))
+            replies.append({})
+        self._bump_file_version(spreadsheet_id)
+        self._conn.commit()
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    def in_transaction(self, operation):
+        """Runs operation() and commits, or rolls back everything it wrote if it raises."""
+        with self._conn:
+            return operation()
+
+# --- googleapiclient-shaped resources ---
+class _LocalFiles:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def _request(self, method_id, http_method, path, handler, body=None, media_body=None):
+        return LocalRequest(self._backend, method_id, http_method, path, lambda: self._backend.in_transaction(handler),
+                            body=body, media_body=media_body)
+
+    def list(self, q=None, spaces=None, fields=None, pageSize=None, pageToken=None, orderBy=None, **kwargs):
+        return self._request('drive.files.list', 'GET', 'drive/files', lambda: self._backend.list_files(q, pageSize, pageToken))
+
+    def get(self, fileId, fields=None, **kwargs):
+        return self._request('drive.files.get', 'GET', f"drive/files/{fileId}", lambda: self._backend.get_file(fileId))
+
+    def get_media(self, fileId, **kwargs):
+        return self._request('drive.files.get_media', 'GET', f"drive/files/{fileId}?alt=media", lambda: self._backend.get_file_media(fileId))
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        return self._request('drive.files.create', 'POST', 'drive/files', lambda: self._backend.create_file(body, media_body),
+                             body=body, media_body=media_body)
+
+    def update(self, fileId, body=None, media_body=None, addParents=None, removeParents=None, fields=None, **kwargs):
+        return self._request('drive.files.update', 'PATCH', f"drive/files/{fileId}",
+                             lambda: self._backend.update_file(fileId, body, media_body, addParents, removeParents),
+                             body=body, media_body=media_body)
+
+    def delete(self, fileId, **kwargs):
+        return self._request('drive.files.delete', 'DELETE', f"drive/files/{fileId}", lambda: self._backend.delete_file(fileId))
+
+class _LocalPermissions:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, fileId, body=None, fields=None, **kwargs):
+        return LocalRequest(self._backend, 'drive.permissions.create', 'POST', f"drive/files/{fileId}/permissions",
+                            lambda: self._backend.in_transaction(lambda: self._backend.create_permission(fileId, body or {})), body=body)
+
+class _LocalRevisions:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def list(self, fileId, fields=None, pageSize=None, pageToken=None, **kwargs):
+        return LocalRequest(self._backend, 'drive.revisions.list', 'GET', f"drive/files/{fileId}/revisions",
+                            lambda: self._backend.list_revisions(fileId))
+
+class _LocalChanges:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def getStartPageToken(self, **kwargs):
+        return LocalRequest(self._backend, 'drive.changes.getStartPageToken', 'GET', 'drive/changes/startPageToken',
+                            self._backend.get_start_page_token)
+
+    def list(self, pageToken, pageSize=None, spaces=None, includeRemoved=True, fields=None, **kwargs):
+        return LocalRequest(self._backend, 'drive.changes.list', 'GET', 'drive/changes',
+                            lambda: self._backend.list_changes(pageToken, pageSize))
+
+class LocalDriveService:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def changes(self):
+        return _LocalChanges(self.backend)
+
+    def new_batch_http_request(self, callback=None):
+        return LocalBatchRequest(self.backend, callback)
+
+    def files(self):
+        return _LocalFiles(self.backend)
+
+    def permissions(self):
+        return _LocalPermissions(self.backend)
+
+    def revisions(self):
+        return _LocalRevisions(self.backend)
+
+class _LocalValues:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def _request(self, method_id, http_method, spreadsheet_id, handler, body=None):
+        return LocalRequest(self._backend, method_id, http_method, f"sheets/{spreadsheet_id}/values",
+                            lambda: self._backend.in_transaction(handler), body=body)
+
+    def get(self, spreadsheetId, range, majorDimension='ROWS', valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return self._request('sheets.spreadsheets.values.get', 'GET', spreadsheetId,
+                             lambda: self._backend.get_values(spreadsheetId, range, majorDimension, valueRenderOption))
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension='ROWS', valueRenderOption='FORMATTED_VALUE', **kwargs):
+        ranges = [ranges] if isinstance(ranges, str) else ranges
+        return self._request('sheets.spreadsheets.values.batchGet', 'GET', spreadsheetId, lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._backend.get_values(spreadsheetId, r, majorDimension, valueRenderOption) for r in ranges]})
+
+    def append(self, spreadsheetId, range, body, valueInputOption='RAW', **kwargs):
+        return self._request('sheets.spreadsheets.values.append', 'POST', spreadsheetId,
+                             lambda: self._backend.append_values(spreadsheetId, range, body.get('values', []), valueInputOption), body=body)
+
+    def update(self, spreadsheetId, range, body, valueInputOption='RAW', **kwargs):
+        return self._request('sheets.spreadsheets.values.update', 'PUT', spreadsheetId,
+                             lambda: self._backend.update_values(spreadsheetId, range, body.get('values', []), valueInputOption), body=body)
+
+    def clear(self, spreadsheetId, range, body=None, **kwargs):
+        return self._request('sheets.spreadsheets.values.clear', 'POST', spreadsheetId,
+                             lambda: self._backend.clear_values(spreadsheetId, range))
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def run():
+            responses = [self._backend.update_values(spreadsheetId, d['range'], d.get('values', []), body.get('valueInputOption', 'RAW'))
+                         for d in body.get('data', [])]
+            return {'spreadsheetId': spreadsheetId, 'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+                    'responses': responses}
+        return self._request('sheets.spreadsheets.values.batchUpdate', 'POST', spreadsheetId, run, body=body)
+
+class _LocalSpreadsheets:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, body=None, fields=None, **kwargs):
+        return LocalRequest(self._backend, 'sheets.spreadsheets.create', 'POST', 'sheets',
+                            lambda: self._backend.in_transaction(lambda: self._backend.create_spreadsheet(body)), body=body)
+
+    def get(self, spreadsheetId, ranges=None, includeGridData=False, fields=None, **kwargs):
+        return LocalRequest(self._backend, 'sheets.spreadsheets.get', 'GET', f"sheets/{spreadsheetId}",
+                            lambda: self._backend.get_spreadsheet(spreadsheetId, ranges, includeGridData))
+
+    def batchUpdate(self, spreadsheetId, body=None, **kwargs):
+        return LocalRequest(self._backend, 'sheets.spreadsheets.batchUpdate', 'POST', f"sheets/{spreadsheetId}:batchUpdate",
+                            lambda: self._backend.in_transaction(lambda: self._backend.batch_update_spreadsheet(spreadsheetId, body)),
+                            body=body)
+
+    def values(self):
+        return _LocalValues(self._backend)
+
+class LocalSheetsService:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def spreadsheets(self):
+        return _LocalSpreadsheets(self.backend)
+
+    def new_batch_http_request(self, callback=None):
+        return LocalBatchRequest(self.backend, callback)
+
+def build_local_services(root_dir, **backend_options):
+    """Returns (drive_service, sheets_service) sharing one LocalStorageBackend rooted at root_dir."""
+    backend = LocalStorageBackend(root_dir, **backend_options)
+    return LocalDriveService(backend), LocalSheetsService(backend)
@@ -7,11 +7,13 @@ from datetime import datetime, timedelta
 LOG_SHEET_COLUMNS = ['Timestamp', 'Username', 'Role']
 
 @st.cache_data(ttl=300)
-def get_log_data(_sheets_service, spreadsheet_id):
+def get_log_data(_sheets_service, spreadsheet_id, generation=0):
     """
     Reads and caches data from the log spreadsheet.
     The _sheets_service argument is prefixed with an underscore to indicate it's
     used for caching purposes and shouldn't be hashed by Streamlit's caching mechanism.
+    Pass generation=get_drive_file_generation(spreadsheet_id) so a change to the sheet
+    misses the cache right away instead of waiting for the TTL.
     """
     from google_utils import read_from_spreadsheet # Import here to avoid circular dependency
     
@@ -0,0 +1,349 @@
+# sheet_mirror.py
+# Local, on-disk mirror of period spreadsheets.
+#
+# Dashboards read period sheets from a SQLite file instead of Google Sheets. A daemon thread
+# keeps the mirror fresh: it compares each mirrored spreadsheet's Drive version with the stored
+# one and re-downloads only sheets that changed, rewriting only the rows that differ. Appends
+# made through the mirror are applied locally first (so they show up immediately) and pushed
+# upstream; if Google is unreachable they stay queued in SQLite and are retried by the sync
+# thread, surviving app restarts. Pushes to one spreadsheet are serialized by a per-sheet lock,
+# so a queued row is sent by exactly one caller.
+import json
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from google_utils import (
+    DAR_SHEET_COLUMNS, get_google_services, get_thread_google_services, execute_google_request,
+    get_first_sheet_metadata, read_from_spreadsheet, append_to_spreadsheet,
+    sheet_values_to_dataframe, add_spreadsheet_invalidation_listener, invalidate_spreadsheet_cache, map_google_tasks
+)
+from config import LOCAL_MIRROR_ENABLED, LOCAL_MIRROR_DB_PATH, LOCAL_MIRROR_SYNC_INTERVAL_SECONDS, GOOGLE_API_MAX_WORKERS
+
+_MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrored_sheets (
+    spreadsheet_id TEXT NOT NULL,
+    render_option TEXT NOT NULL,
+    version TEXT,
+    synced_at REAL,
+    stale INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (spreadsheet_id, render_option)
+);
+CREATE TABLE IF NOT EXISTS mirrored_rows (
+    spreadsheet_id TEXT NOT NULL,
+    render_option TEXT NOT NULL,
+    row_idx INTEGER NOT NULL,  -- 0 is the header row
+    row_json TEXT NOT NULL,
+    PRIMARY KEY (spreadsheet_id, render_option, row_idx)
+);
+CREATE TABLE IF NOT EXISTS pending_appends (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spreadsheet_id TEXT NOT NULL,
+    rows_json TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+"""
+
+def _rows_to_json(rows):
+    # numpy scalars coming from DataFrame rows are stored as their plain Python values
+    return json.dumps(rows, default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+
+def _render_option(typed):
+    return 'UNFORMATTED_VALUE' if typed else 'FORMATTED_VALUE'
+
+def _fetch_file_version(drive_service, spreadsheet_id):
+    file_meta = execute_google_request(drive_service.files().get(fileId=spreadsheet_id, fields='version, modifiedTime'))
+    return str(file_meta.get('version') or file_meta.get('modifiedTime'))
+
+class SheetMirror:
+    def __init__(self, db_path, sync_interval_seconds):
+        self.sync_interval_seconds = sync_interval_seconds
+        self.last_sync_error = None
+        self.last_sync_at = None
+        self._lock = threading.RLock() # Guards the connection and the in-memory frame cache
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_MIRROR_SCHEMA)
+        self._frames = {} # (spreadsheet_id, render_option) -> (generation, DataFrame)
+        self._generations = {} # spreadsheet_id -> counter bumped on every local change
+        self._push_locks = {} # spreadsheet_id -> lock held while that sheet's queued appends are pushed
+        self._wake_event = threading.Event()
+        self._sync_thread = None
+
+    # --- Background sync ---
+    def start(self):
+        if self._sync_thread is None:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="sheet-mirror-sync", daemon=True)
+            self._sync_thread.start()
+
+    def request_sync(self):
+        self._wake_event.set()
+
+    def _sync_loop(self):
+        while True:
+            self._wake_event.wait(self.sync_interval_seconds)
+            self._wake_event.clear()
+            try:
+                self.sync_once()
+                self.last_sync_error = None
+            except Exception as e:
+                self.last_sync_error = str(e) # Transient outage: keep serving local data, retry next round
+            self.last_sync_at = time.time()
+
+    def sync_once(self):
+        """Pushes queued appends, then refreshes every mirrored sheet whose Drive version moved."""
+        drive_service, sheets_service = get_thread_google_services()
+        self._push_pending(sheets_service)
+        for spreadsheet_id, render_option in self._mirrored_keys():
+            self._refresh(drive_service, sheets_service, spreadsheet_id, render_option)
+
+    # --- Local state ---
+    def _mirrored_keys(self):
+        with self._lock:
+            return self._conn.execute("SELECT spreadsheet_id, render_option FROM mirrored_sheets").fetchall()
+
+    def _sheet_state(self, spreadsheet_id, render_option):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, stale FROM mirrored_sheets WHERE spreadsheet_id = ? AND render_option = ?",
+                (spreadsheet_id, render_option)).fetchone()
+        return None if row is None else {'version': row[0], 'stale': bool(row[1])}
+
+    def _bump_generation(self, spreadsheet_id):
+        with self._lock:
+            self._generations[spreadsheet_id] = self._generations.get(spreadsheet_id, 0) + 1
+
+    def mark_stale(self, spreadsheet_id):
+        """Called after writes that bypass the mirror; the next read refreshes from Google first."""
+        with self._lock:
+            self._conn.execute("UPDATE mirrored_sheets SET stale = 1 WHERE spreadsheet_id = ?", (spreadsheet_id,))
+            self._conn.commit()
+
+    def pending_append_count(self, spreadsheet_id=None):
+        with self._lock:
+            if spreadsheet_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM pending_appends").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM pending_appends WHERE spreadsheet_id = ?",
+                                      (spreadsheet_id,)).fetchone()[0]
+
+    def _store_values(self, spreadsheet_id, render_option, version, values):
+        # Only rows whose content changed are rewritten; rows past the new end are dropped
+        with self._lock:
+            existing = dict(self._conn.execute(
+                "SELECT row_idx, row_json FROM mirrored_rows WHERE spreadsheet_id = ? AND render_option = ?",
+                (spreadsheet_id, render_option)).fetchall())
+            changed_rows = []
+            for row_idx, row in enumerate(values):
+                row_json = json.dumps(row)
+                if existing.get(row_idx) != row_json:
+                    changed_rows.append((spreadsheet_id, render_option, row_idx, row_json))
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO mirrored_rows VALUES (?, ?, ?, ?)", changed_rows)
+                self._conn.execute(
+                    "DELETE FROM mirrored_rows WHERE spreadsheet_id = ? AND render_option = ? AND row_idx >= ?",
+                    (spreadsheet_id, render_option, len(values)))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO mirrored_sheets (spreadsheet_id, render_option, version, synced_at, stale) "
+                    "VALUES (?, ?, ?, ?, 0)", (spreadsheet_id, render_option, version, time.time()))
+            if changed_rows or len(existing) > len(values):
+                self._bump_generation(spreadsheet_id)
+
+    def _local_values(self, spreadsheet_id, render_option):
+        # Mirrored rows followed by appends that have not reached Google yet
+        with self._lock:
+            rows = [json.loads(r[0]) for r in self._conn.execute(
+                "SELECT row_json FROM mirrored_rows WHERE spreadsheet_id = ? AND render_option = ? ORDER BY row_idx",
+                (spreadsheet_id, render_option))]
+            for (rows_json,) in self._conn.execute(
+                    "SELECT rows_json FROM pending_appends WHERE spreadsheet_id = ? ORDER BY id", (spreadsheet_id,)):
+                if not rows:
+                    rows.append(list(DAR_SHEET_COLUMNS))
+                rows.extend(json.loads(rows_json))
+        return rows
+
+    # --- Upstream I/O ---
+    def _refresh(self, drive_service, sheets_service, spreadsheet_id, render_option, force=False):
+        version = _fetch_file_version(drive_service, spreadsheet_id)
+        state = self._sheet_state(spreadsheet_id, render_option)
+        if not force and state and not state['stale'] and state['version'] == version:
+            return False
+        sheet_title = get_first_sheet_metadata(sheets_service, spreadsheet_id)['title']
+        result = execute_google_request(sheets_service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"'{sheet_title}'",
+            valueRenderOption=render_option,
+            dateTimeRenderOption='FORMATTED_STRING'
+        ))
+        self._store_values(spreadsheet_id, render_option, version, result.get('values', []))
+        return True
+
+    def _push_lock(self, spreadsheet_id):
+        with self._lock:
+            return self._push_locks.setdefault(spreadsheet_id, threading.Lock())
+
+    def _push_pending(self, sheets_service, spreadsheet_id=None):
+        """Pushes queued appends of every sheet (or just spreadsheet_id); raises the first failure after trying all sheets."""
+        with self._lock:
+            query = "SELECT DISTINCT spreadsheet_id FROM pending_appends"
+            params = ()
+            if spreadsheet_id is not None:
+                query += " WHERE spreadsheet_id = ?"
+                params = (spreadsheet_id,)
+            sheet_ids = [row[0] for row in self._conn.execute(query, params).fetchall()]
+        first_error = None
+        for pending_sheet_id in sheet_ids:
+            try:
+                self._push_sheet(sheets_service, pending_sheet_id)
+            except Exception as e:
+                first_error = first_error or e
+        if first_error is not None:
+            raise first_error
+
+    def _push_sheet(self, sheets_service, spreadsheet_id, only_pending_id=None):
+        """
+        Pushes one sheet's queued appends oldest first, stopping at the first failure to keep row order.
+        With only_pending_id, pushes just that entry, and only if nothing older is queued for the sheet.
+        Returns False if that entry was left queued behind older rows, True otherwise.
+        """
+        with self._push_lock(spreadsheet_id):
+            # Read the queue under the push lock: rows another caller already pushed are gone from it
+            with self._lock:
+                pending = self._conn.execute(
+                    "SELECT id, rows_json FROM pending_appends WHERE spreadsheet_id = ? ORDER BY id", (spreadsheet_id,)).fetchall()
+            if only_pending_id is not None:
+                if only_pending_id not in [pending_id for pending_id, _ in pending]:
+                    return True # Already pushed by the sync thread
+                if pending[0][0] != only_pending_id:
+                    return False # Older rows go first; the sync thread pushes them all in order
+                pending = pending[:1]
+            for pending_id, rows_json in pending:
+                rows = json.loads(rows_json)
+                try:
+                    sheet_title = get_first_sheet_metadata(sheets_service, spreadsheet_id)['title']
+                    execute_google_request(sheets_service.spreadsheets().values().append(
+                        spreadsheetId=spreadsheet_id,
+                        range=f"'{sheet_title}'!A1",
+                        valueInputOption='USER_ENTERED',
+                        body={'values': rows}
+                    ))
+                except Exception as e:
+                    with self._lock:
+                        self._conn.execute("UPDATE pending_appends SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                                           (str(e), pending_id))
+                        self._conn.commit()
+                    raise
+                # Pushed: move the rows into the mirrored copy so they stay visible until the next
+                # refresh replaces them with Google's own rendering of the cells
+                with self._lock:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM pending_appends WHERE id = ?", (pending_id,))
+                        for (render_option,) in self._conn.execute(
+                                "SELECT render_option FROM mirrored_sheets WHERE spreadsheet_id = ?", (spreadsheet_id,)).fetchall():
+                            next_idx = self._conn.execute(
+                                "SELECT COALESCE(MAX(row_idx) + 1, 0) FROM mirrored_rows WHERE spreadsheet_id = ? AND render_option = ?",
+                                (spreadsheet_id, render_option)).fetchone()[0]
+                            self._conn.executemany("INSERT OR REPLACE INTO mirrored_rows VALUES (?, ?, ?, ?)",
+                                                   [(spreadsheet_id, render_option, next_idx + i, json.dumps(row))
+                                                    for i, row in enumerate(rows)])
+                # Cached full reads (read_from_spreadsheet) of this sheet are now out of date. The mirror
+                # already holds the rows, so it is not marked stale; the sync thread picks up the new version
+                invalidate_spreadsheet_cache(spreadsheet_id, skip_listener=self.mark_stale)
+            return True
+
+    # --- Public API ---
+    def read(self, sheets_service, spreadsheet_id, typed=False):
+        """Returns the sheet as a DataFrame from the local mirror, refreshing first only if it was never mirrored or is stale."""
+        render_option = _render_option(typed)
+        state = self._sheet_state(spreadsheet_id, render_option)
+        if state is None or state['stale']:
+            try:
+                drive_service, _ = get_google_services()
+                self._refresh(drive_service, sheets_service, spreadsheet_id, render_option)
+            except Exception as e:
+                if state is None:
+                    st.error(f"Could not load spreadsheet from Google Sheets and no local copy exists yet: {e}")
+                    return pd.DataFrame(columns=DAR_SHEET_COLUMNS)
+                st.warning("Google Sheets is unreachable; showing the locally mirrored copy of this sheet.")
+
+        cache_key = (spreadsheet_id, render_option)
+        with self._lock:
+            generation = self._generations.get(spreadsheet_id, 0)
+            cached = self._frames.get(cache_key)
+        if cached is None or cached[0] != generation:
+            cached = (generation, sheet_values_to_dataframe(self._local_values(spreadsheet_id, render_option), typed))
+            with self._lock:
+                self._frames[cache_key] = cached
+        return cached[1].copy()
+
+    def append(self, sheets_service, spreadsheet_id, rows):
+        """
+        Applies rows locally, then pushes them upstream. Returns the API result when Google
+        accepted the append, or {'queued': True} when it was kept for the sync thread to retry.
+        """
+        with self._lock:
+            with self._conn:
+                pending_id = self._conn.execute(
+                    "INSERT INTO pending_appends (spreadsheet_id, rows_json, created_at) VALUES (?, ?, ?)",
+                    (spreadsheet_id, _rows_to_json(rows), time.time())).lastrowid
+            self._bump_generation(spreadsheet_id)
+        try:
+            pushed = self._push_sheet(sheets_service, spreadsheet_id, only_pending_id=pending_id)
+        except Exception as e:
+            st.warning(f"Saved locally; Google Sheets is unreachable ({e}). The rows will be uploaded automatically.")
+            return {'queued': True}
+        if not pushed:
+            self.request_sync()
+            return {'queued': True}
+        self._bump_generation(spreadsheet_id)
+        return {'queued': False, 'updatedRows': len(rows)}
+
+@st.cache_resource(show_spinner=False)
+def get_sheet_mirror():
+    """Process-wide mirror with its sync thread started; shared by every session."""
+    mirror = SheetMirror(LOCAL_MIRROR_DB_PATH, LOCAL_MIRROR_SYNC_INTERVAL_SECONDS)
+    add_spreadsheet_invalidation_listener(mirror.mark_stale)
+    mirror.start()
+    return mirror
+
+def read_period_sheet(sheets_service, spreadsheet_id, typed=False):
+    """Dashboard read path: served from the local mirror when LOCAL_MIRROR_ENABLED, else straight from Sheets."""
+    if not LOCAL_MIRROR_ENABLED:
+        return read_from_spreadsheet(sheets_service, spreadsheet_id, typed=typed)
+    return get_sheet_mirror().read(sheets_service, spreadsheet_id, typed=typed)
+
+def read_period_sheets(sheets_service, mcm_periods, period_keys, typed=True, max_workers=GOOGLE_API_MAX_WORKERS):
+    """
+    Cross-period read path: loads the sheets of several MCM periods (keys of mcm_periods) with
+    read_period_sheet, at most max_workers at a time, and returns one DataFrame with a leading
+    'period' column holding the period key. Periods without a spreadsheet or that fail to load
+    are skipped with a warning.
+    """
+    period_keys = [k for k in period_keys if mcm_periods.get(k, {}).get('spreadsheet_id')]
+    frames = {}
+    if len(period_keys) == 1: # Nothing to overlap: read on the script thread
+        frames[0] = read_period_sheet(sheets_service, mcm_periods[period_keys[0]]['spreadsheet_id'], typed=typed)
+    else:
+        def load_period(_drive_service, thread_sheets_service, period_key):
+            return read_period_sheet(thread_sheets_service, mcm_periods[period_key]['spreadsheet_id'], typed=typed)
+
+        for index, frame, error in map_google_tasks(load_period, period_keys, max_workers=max_workers):
+            if error is not None:
+                st.warning(f"Could not load data for period {period_keys[index]}: {error}")
+            else:
+                frames[index] = frame
+    frames = [frames[i].assign(period=period_keys[i]) for i in sorted(frames) if frames[i] is not None and not frames[i].empty]
+    if not frames:
+        return pd.DataFrame(columns=['period'] + DAR_SHEET_COLUMNS)
+    combined = pd.concat(frames, ignore_index=True)
+    return combined[['period'] + [c for c in combined.columns if c != 'period']]
+
+def append_period_rows(sheets_service, spreadsheet_id, rows):
+    """Appends rows through the mirror (optimistic, queued on outage) when enabled, else via append_to_spreadsheet."""
+    if not LOCAL_MIRROR_ENABLED:
+        return append_to_spreadsheet(sheets_service, spreadsheet_id, rows)
+    return get_sheet_mirror().append(sheets_service, spreadsheet_id, rows)
@@ -0,0 +1,40 @@
+# tests/conftest.py
+# Shared fixtures: the offline LocalStorageBackend (local_storage_backend.py) stands in for Drive
+# and Sheets, so tests run the real google_utils / sheet_mirror code paths against SQLite.
+import pytest
+
+import google_utils as gu
+from local_storage_backend import build_local_services
+
+@pytest.fixture
+def local_services(tmp_path, monkeypatch):
+    """(drive_service, sheets_service) on a fresh local backend, used by every google_utils entry point."""
+    services = build_local_services(str(tmp_path / 'storage'))
+    monkeypatch.setattr(gu, 'STORAGE_BACKEND', 'local')
+    monkeypatch.setattr(gu, '_get_local_storage_services', lambda: services)
+    monkeypatch.setattr(gu, '_get_shared_google_clients', lambda: services)
+    # Listeners registered by a test (e.g. a mirror's mark_stale) must not outlive it
+    monkeypatch.setattr(gu, '_spreadsheet_invalidation_listeners', list(gu._spreadsheet_invalidation_listeners))
+    gu.reset_api_call_stats()
+    return services
+
+def dar_row(para_no, status='Not agreed', url='https://drive.google.com/file/d/dar1/view', gstin='29ABCDE1234F1Z5'):
+    """One data row in DAR_SHEET_COLUMNS order."""
+    return [1, 1, gstin, 'Trade Name Pvt Ltd', 'Large', 100000, 5000, para_no, f"Para {para_no}",
+            1.5, 0.5, status, url, '2025-05-02 10:00:00']
+
+@pytest.fixture
+def new_sheet(local_services):
+    """Factory: creates a period spreadsheet with the DAR header and the given data rows; returns its id."""
+    drive_service, sheets_service = local_services
+
+    def create(rows=()):
+        spreadsheet_id, _ = gu.create_spreadsheet(sheets_service, drive_service, 'MCM Data May 2025')
+        if rows:
+            gu.append_to_spreadsheet(sheets_service, spreadsheet_id, [list(r) for r in rows])
+        return spreadsheet_id
+    return create
+
+def sheet_rows(sheets_service, spreadsheet_id):
+    """Data rows as they are upstream right now, bypassing every cache."""
+    return gu.read_from_spreadsheet(sheets_service, spreadsheet_id, use_cache=False).values.tolist()
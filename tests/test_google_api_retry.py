@@ -0,0 +1,92 @@
+# tests/test_google_api_retry.py
+# Retry and backoff behaviour of google_utils.execute_google_request against a fake HTTP endpoint
+# (googleapiclient's HttpMockSequence) that injects 429/503 responses and dropped connections.
+#
+# Run from the repository root: python -m pytest -q tests
+import json
+
+import pytest
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence, HttpRequest
+from googleapiclient.model import JsonModel
+
+import google_utils as gu
+
+OK_BODY = json.dumps({'values': [['Audit Group Number']]})
+
+def _request(responses, method_id='sheets.spreadsheets.values.get', http_method='GET'):
+    """A real HttpRequest whose transport replays responses: (headers, body) pairs or exceptions."""
+    http = HttpMockSequence([r for r in responses if not isinstance(r, Exception)])
+    failures = [r for r in responses if isinstance(r, Exception)]
+    if failures: # HttpMockSequence cannot raise: wrap it to drop the connection on the listed calls
+        replay, pending = http.request, list(responses)
+        def request(*args, **kwargs):
+            item = pending.pop(0)
+            if isinstance(item, Exception):
+                raise item
+            return replay(*args, **kwargs)
+        http.request = request
+    return HttpRequest(http, JsonModel().response, 'https://sheets.googleapis.com/v4/test',
+                       method=http_method, methodId=method_id)
+
+@pytest.fixture(autouse=True)
+def recorded_sleeps(monkeypatch):
+    """Backoff delays requested by the executor, without actually sleeping."""
+    sleeps = []
+    monkeypatch.setattr(gu.time, 'sleep', sleeps.append)
+    gu.reset_api_call_stats()
+    return sleeps
+
+def test_retries_429_until_success_with_bounded_backoff(recorded_sleeps):
+    request = _request([({'status': '429'}, '{}'), ({'status': '429'}, '{}'), ({'status': '200'}, OK_BODY)])
+    assert gu.execute_google_request(request, max_retries=3) == json.loads(OK_BODY)
+    stats = gu.get_api_call_stats()['sheets.spreadsheets.values.get']
+    assert (stats['calls'], stats['retries'], stats['errors']) == (3, 2, 0)
+    # Full jitter: attempt n waits between 0 and base * 2**n seconds
+    assert len(recorded_sleeps) == 2
+    for attempt, delay in enumerate(recorded_sleeps):
+        assert 0 <= delay <= gu._BACKOFF_BASE_SECONDS * 2 ** attempt
+
+def test_honours_retry_after(recorded_sleeps):
+    request = _request([({'status': '429', 'retry-after': '7'}, '{}'), ({'status': '200'}, OK_BODY)])
+    gu.execute_google_request(request, max_retries=3)
+    assert recorded_sleeps == [7.0]
+
+def test_raises_after_last_attempt(recorded_sleeps):
+    request = _request([({'status': '503'}, '{}')] * 4)
+    with pytest.raises(HttpError) as raised:
+        gu.execute_google_request(request, max_retries=3)
+    assert raised.value.resp.status == 503
+    stats = gu.get_api_call_stats()['sheets.spreadsheets.values.get']
+    assert (stats['calls'], stats['retries'], stats['errors']) == (4, 3, 1)
+    assert len(recorded_sleeps) == 3
+
+def test_non_retryable_status_is_raised_at_once(recorded_sleeps):
+    request = _request([({'status': '400'}, '{}')])
+    with pytest.raises(HttpError):
+        gu.execute_google_request(request, max_retries=3)
+    assert recorded_sleeps == []
+
+def test_dropped_connection_is_retried_for_reads(recorded_sleeps):
+    request = _request([ConnectionResetError("connection reset"), ({'status': '200'}, OK_BODY)])
+    assert gu.execute_google_request(request, max_retries=3) == json.loads(OK_BODY)
+    assert len(recorded_sleeps) == 1
+
+@pytest.mark.parametrize('method_id', sorted(gu._NON_IDEMPOTENT_METHODS))
+def test_non_idempotent_calls_are_not_resent_after_5xx(recorded_sleeps, method_id):
+    request = _request([({'status': '503'}, '{}'), ({'status': '200'}, '{}')], method_id=method_id, http_method='POST')
+    with pytest.raises(HttpError):
+        gu.execute_google_request(request, max_retries=3)
+    assert recorded_sleeps == []
+
+def test_non_idempotent_calls_are_not_resent_after_dropped_connection(recorded_sleeps):
+    request = _request([ConnectionResetError("connection reset"), ({'status': '200'}, '{}')],
+                       method_id='sheets.spreadsheets.values.append', http_method='POST')
+    with pytest.raises(ConnectionResetError):
+        gu.execute_google_request(request, max_retries=3)
+
+def test_non_idempotent_calls_are_retried_on_429(recorded_sleeps):
+    request = _request([({'status': '429'}, '{}'), ({'status': '200'}, '{"updates": {}}')],
+                       method_id='sheets.spreadsheets.values.append', http_method='POST')
+    assert gu.execute_google_request(request, max_retries=3) == {'updates': {}}
+    assert len(recorded_sleeps) == 1
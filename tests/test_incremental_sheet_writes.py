@@ -0,0 +1,93 @@
+# tests/test_incremental_sheet_writes.py
+# update_spreadsheet_from_df's incremental path: only changed cells are sent, and the three-way
+# merge against the snapshot a frame was read from keeps other users' concurrent appends, edits
+# and the rows they sit next to. Runs against the local storage backend (see conftest.py).
+#
+# Run from the repository root: python -m pytest -q tests
+import pandas as pd
+
+import google_utils as gu
+from conftest import dar_row, sheet_rows
+
+STATUS = gu.DAR_SHEET_COLUMNS.index('Status of para')
+HEADING = gu.DAR_SHEET_COLUMNS.index('Audit Para Heading')
+
+def _statuses(sheets_service, spreadsheet_id):
+    return {row[HEADING]: row[STATUS] for row in sheet_rows(sheets_service, spreadsheet_id)}
+
+def test_single_cell_edit_sends_one_batch_update(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 6)])
+    df = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    df.loc[2, 'Status of para'] = 'Agreed and Paid'
+    gu.reset_api_call_stats()
+
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, df)
+
+    stats = gu.get_api_call_stats()
+    assert stats['sheets.spreadsheets.values.batchUpdate']['calls'] == 1
+    assert 'sheets.spreadsheets.values.clear' not in stats
+    assert _statuses(sheets_service, spreadsheet_id) == {
+        'Para 1': 'Not agreed', 'Para 2': 'Not agreed', 'Para 3': 'Agreed and Paid', 'Para 4': 'Not agreed', 'Para 5': 'Not agreed'}
+
+def test_unchanged_frame_writes_nothing(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 4)])
+    df = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    gu.reset_api_call_stats()
+
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, df)
+
+    assert 'sheets.spreadsheets.values.batchUpdate' not in gu.get_api_call_stats()
+
+def test_rows_appended_by_others_after_the_read_are_kept(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 4)])
+    df = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    gu.append_to_spreadsheet(sheets_service, spreadsheet_id, [dar_row(4), dar_row(5)]) # Another user submits a DAR
+    df.loc[0, 'Status of para'] = 'Agreed yet to pay'
+
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, df)
+
+    assert _statuses(sheets_service, spreadsheet_id) == {
+        'Para 1': 'Agreed yet to pay', 'Para 2': 'Not agreed', 'Para 3': 'Not agreed', 'Para 4': 'Not agreed', 'Para 5': 'Not agreed'}
+
+def test_concurrent_edit_of_another_row_is_not_reverted(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 4)])
+    mine = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    theirs = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    theirs.loc[2, 'Status of para'] = 'Agreed and Paid'
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, theirs)
+    mine.loc[0, 'Status of para'] = 'Agreed yet to pay'
+
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, mine)
+
+    assert _statuses(sheets_service, spreadsheet_id) == {
+        'Para 1': 'Agreed yet to pay', 'Para 2': 'Not agreed', 'Para 3': 'Agreed and Paid'}
+
+def test_deleting_rows_keeps_concurrent_appends_and_edits(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 5)])
+    mine = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    theirs = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    theirs.loc[3, 'Status of para'] = 'Agreed and Paid'
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, theirs)
+    gu.append_to_spreadsheet(sheets_service, spreadsheet_id, [dar_row(5)])
+
+    # Filtering keeps the snapshot in attrs; rows 1 and 2 (Para 2, Para 3) are removed
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, mine[~mine.index.isin([1, 2])])
+
+    assert _statuses(sheets_service, spreadsheet_id) == {'Para 1': 'Not agreed', 'Para 4': 'Agreed and Paid', 'Para 5': 'Not agreed'}
+
+def test_frame_rebuilt_without_attrs_merges_through_source_df(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 3)])
+    df = gu.read_from_spreadsheet(sheets_service, spreadsheet_id)
+    gu.append_to_spreadsheet(sheets_service, spreadsheet_id, [dar_row(3)])
+    # pd.concat (as in the tracker pages) drops the snapshot; source_df supplies it
+    combined = pd.concat([df, pd.DataFrame([dar_row(9)], columns=gu.DAR_SHEET_COLUMNS, index=[len(df)])])
+
+    assert gu.update_spreadsheet_from_df(sheets_service, spreadsheet_id, combined, source_df=df)
+
+    assert sorted(_statuses(sheets_service, spreadsheet_id)) == ['Para 1', 'Para 2', 'Para 3', 'Para 9']
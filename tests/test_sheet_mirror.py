@@ -0,0 +1,93 @@
+# tests/test_sheet_mirror.py
+# SheetMirror against the local storage backend (see conftest.py): appends are pushed upstream
+# exactly once even when callers overlap, survive an outage in the local queue in order, and the
+# mirror's own pushes don't force a refetch while other writes do.
+#
+# Run from the repository root: python -m pytest -q tests
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import google_utils as gu
+from sheet_mirror import SheetMirror, _render_option
+from conftest import dar_row, sheet_rows
+
+HEADING = gu.DAR_SHEET_COLUMNS.index('Audit Para Heading')
+
+@pytest.fixture
+def mirror(local_services, tmp_path, monkeypatch):
+    monkeypatch.setattr(gu.time, 'sleep', lambda seconds: None) # No real backoff during injected outages
+    sheet_mirror = SheetMirror(str(tmp_path / 'mirror.sqlite3'), sync_interval_seconds=3600) # Synced by hand, never started
+    gu.add_spreadsheet_invalidation_listener(sheet_mirror.mark_stale)
+    return sheet_mirror
+
+def _headings(rows):
+    return [row[HEADING] for row in rows]
+
+def test_concurrent_appends_land_upstream_exactly_once(local_services, new_sheet, mirror):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda n: mirror.append(sheets_service, spreadsheet_id, [dar_row(n)]), range(1, 9)))
+    mirror.sync_once() # Rows left queued behind an in-flight push go out here
+
+    assert all(result for result in results)
+    assert sorted(_headings(sheet_rows(sheets_service, spreadsheet_id))) == sorted(f"Para {n}" for n in range(1, 9))
+    assert mirror.pending_append_count() == 0
+
+def test_append_during_outage_is_queued_and_pushed_in_order(local_services, new_sheet, mirror):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(1)])
+    mirror.read(sheets_service, spreadsheet_id)
+    backend = sheets_service.backend
+
+    backend.error_rate = 1.0
+    assert mirror.append(sheets_service, spreadsheet_id, [dar_row(2)]) == {'queued': True}
+    assert mirror.append(sheets_service, spreadsheet_id, [dar_row(3)]) == {'queued': True}
+    # Queued rows are visible locally straight away, and nothing reached the sheet
+    assert _headings(mirror.read(sheets_service, spreadsheet_id).values.tolist()) == ['Para 1', 'Para 2', 'Para 3']
+    backend.error_rate = 0.0
+    assert _headings(sheet_rows(sheets_service, spreadsheet_id)) == ['Para 1']
+
+    mirror.sync_once()
+
+    assert _headings(sheet_rows(sheets_service, spreadsheet_id)) == ['Para 1', 'Para 2', 'Para 3']
+    assert mirror.pending_append_count(spreadsheet_id) == 0
+
+def test_append_behind_queued_rows_waits_for_them(local_services, new_sheet, mirror):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet()
+    sheets_service.backend.error_rate = 1.0
+    mirror.append(sheets_service, spreadsheet_id, [dar_row(1)])
+    sheets_service.backend.error_rate = 0.0
+
+    # Pushing the newer row first would reorder the sheet, so it stays queued behind the older one
+    assert mirror.append(sheets_service, spreadsheet_id, [dar_row(2)]) == {'queued': True}
+    assert sheet_rows(sheets_service, spreadsheet_id) == []
+    mirror.sync_once()
+    assert _headings(sheet_rows(sheets_service, spreadsheet_id)) == ['Para 1', 'Para 2']
+
+def test_own_push_does_not_mark_the_mirror_stale(local_services, new_sheet, mirror):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(1)])
+    mirror.read(sheets_service, spreadsheet_id)
+
+    result = mirror.append(sheets_service, spreadsheet_id, [dar_row(2)])
+
+    assert result['queued'] is False
+    assert mirror._sheet_state(spreadsheet_id, _render_option(False))['stale'] is False
+    gu.reset_api_call_stats()
+    assert _headings(mirror.read(sheets_service, spreadsheet_id).values.tolist()) == ['Para 1', 'Para 2']
+    assert gu.get_api_call_stats() == {} # Served from the mirror with no call at all
+    # The process-wide read cache was still invalidated
+    assert _headings(gu.read_from_spreadsheet(sheets_service, spreadsheet_id).values.tolist()) == ['Para 1', 'Para 2']
+
+def test_writes_outside_the_mirror_are_refetched(local_services, new_sheet, mirror):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(1)])
+    mirror.read(sheets_service, spreadsheet_id)
+
+    gu.append_to_spreadsheet(sheets_service, spreadsheet_id, [dar_row(2)])
+
+    assert mirror._sheet_state(spreadsheet_id, _render_option(False))['stale'] is True
+    assert _headings(mirror.read(sheets_service, spreadsheet_id).values.tolist()) == ['Para 1', 'Para 2']
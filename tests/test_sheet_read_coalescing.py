@@ -0,0 +1,80 @@
+# tests/test_sheet_read_coalescing.py
+# Identical reads that overlap share one upstream fetch (_single_flight): followers get the
+# leader's result or its exception, and nothing is reused once the fetch has finished.
+#
+# Run from the repository root: python -m pytest -q tests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import google_utils as gu
+from conftest import dar_row
+
+def _wait_for_followers(start_count, followers):
+    """Blocks until `followers` callers have joined an in-flight fetch since start_count."""
+    deadline = time.monotonic() + 5
+    while gu.get_coalesced_fetch_count() < start_count + followers:
+        assert time.monotonic() < deadline, "followers never joined the in-flight fetch"
+        time.sleep(0.005)
+
+def test_concurrent_callers_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {'values': [['a']]}
+
+    start_count = gu.get_coalesced_fetch_count()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(gu._single_flight, ('test', 'shared'), fetch) for _ in range(4)]
+        _wait_for_followers(start_count, 3)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_leader_exception_reaches_every_caller():
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise RuntimeError("quota exceeded")
+
+    start_count = gu.get_coalesced_fetch_count()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(gu._single_flight, ('test', 'failing'), fetch) for _ in range(3)]
+        _wait_for_followers(start_count, 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="quota exceeded"):
+                future.result()
+
+def test_finished_fetch_is_not_reused():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return len(calls)
+
+    assert gu._single_flight(('test', 'sequential'), fetch) == 1
+    assert gu._single_flight(('test', 'sequential'), fetch) == 2
+
+def test_concurrent_sheet_reads_make_one_values_call(local_services, new_sheet):
+    _, sheets_service = local_services
+    spreadsheet_id = new_sheet([dar_row(n) for n in range(1, 4)])
+    gu.invalidate_spreadsheet_cache(spreadsheet_id)
+    sheets_service.backend.latency_seconds = 0.2 # Keeps the first fetch in flight while the others arrive
+    gu.reset_api_call_stats()
+    start_count = gu.get_coalesced_fetch_count()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        frames = list(executor.map(lambda _: gu.read_from_spreadsheet(sheets_service, spreadsheet_id), range(4)))
+
+    assert gu.get_api_call_stats()['sheets.spreadsheets.values.get']['calls'] == 1
+    assert gu.get_coalesced_fetch_count() > start_count
+    assert all(len(df) == 3 for df in frames)
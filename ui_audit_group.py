@@ -3,18 +3,18 @@ import streamlit as st
 import pandas as pd
 import datetime
 import math # For math.ceil
-from io import BytesIO
 import time
 
 # Assuming these utilities are correctly defined and imported
 from google_utils import (
-    load_mcm_periods, upload_to_drive, append_to_spreadsheet,
-    read_from_spreadsheet, delete_spreadsheet_rows
+    upload_or_reuse_drive_file, read_from_spreadsheet, delete_spreadsheet_rows, delete_spreadsheet_rows_where, get_cached_mcm_periods,
+    start_background_upload, discard_background_upload
 )
+from sheet_mirror import append_period_rows, read_period_sheet
 from dar_processor import preprocess_pdf_text
 from gemini_utils import get_structured_data_with_gemini
 from validation_utils import validate_data_for_sheet, VALID_CATEGORIES, VALID_PARA_STATUSES
-from config import USER_CREDENTIALS, AUDIT_GROUP_NUMBERS
+from config import USER_CREDENTIALS, AUDIT_GROUP_NUMBERS, DEFERRED_DAR_UPLOAD_ENABLED
 from models import ParsedDARReport
 
 from streamlit_option_menu import option_menu
@@ -26,19 +26,57 @@ SHEET_DATA_COLUMNS_ORDER = [
 ]
 # --- Caching helper for MCM Periods ---
 def get_cached_mcm_periods_ag(drive_service, ttl_seconds=120):
-    cache_key_data = 'ag_ui_cached_mcm_periods_data'
-    cache_key_ts = 'ag_ui_cached_mcm_periods_timestamp'
-    current_time = time.time()
-    if (cache_key_data in st.session_state and
-            cache_key_ts in st.session_state and
-            (current_time - st.session_state[cache_key_ts] < ttl_seconds)):
-        return st.session_state[cache_key_data]
-    periods = load_mcm_periods(drive_service)
-    st.session_state[cache_key_data] = periods
-    st.session_state[cache_key_ts] = current_time
-    return periods
+    # Invalidated by the Drive changes watcher when it is running; ttl_seconds is the fallback
+    return get_cached_mcm_periods(drive_service, 'ag_ui_cached_mcm_periods', ttl_seconds=ttl_seconds)
 # --- End Caching helper ---
 
+# --- Deferred DAR upload helpers ---
+# With DEFERRED_DAR_UPLOAD_ENABLED the PDF goes to Drive on a worker thread while extraction runs.
+# st.session_state.ag_pdf_upload holds {'key', 'future', 'progress'} until submit awaits it or the file is
+# discarded. The worker thread cannot draw on the page, so it records {'sent', 'total'} bytes in 'progress'.
+def _ag_pdf_upload_failed(future):
+    if not future.done():
+        return False
+    return future.cancelled() or future.exception() is not None or not future.result()[0]
+
+def _start_ag_pdf_upload(pdf_file, folder_id, filename_on_drive):
+    upload_key = (folder_id, filename_on_drive, pdf_file.size)
+    pending = st.session_state.get('ag_pdf_upload')
+    if pending and pending['key'] == upload_key and not _ag_pdf_upload_failed(pending['future']):
+        return # Re-extraction of the same file: keep the upload already under way
+    _discard_ag_pdf_upload()
+    progress = {'sent': 0, 'total': pdf_file.size}
+    # A view of the UploadedFile's own buffer: no copy, and a read position separate from the extractor's
+    future = start_background_upload(pdf_file.getbuffer(), folder_id, filename_on_drive,
+                                     progress_callback=lambda sent, total: progress.update(sent=sent, total=total))
+    st.session_state.ag_pdf_upload = {'key': upload_key, 'future': future, 'progress': progress}
+
+def _await_ag_pdf_upload():
+    """Blocks until the pending upload finishes; returns its webViewLink, or None if it failed."""
+    pending = st.session_state.get('ag_pdf_upload')
+    if not pending:
+        return None
+    if not pending['future'].done():
+        progress_bar = st.progress(0.0)
+        while not pending['future'].done():
+            sent, total = pending['progress']['sent'], pending['progress']['total']
+            progress_bar.progress(min(1.0, sent / total) if total else 0.0, text=f"Uploading DAR PDF to Drive... {sent // 1024:,} / {total // 1024:,} KiB")
+            time.sleep(0.25)
+        progress_bar.empty()
+    try:
+        file_id, web_view_link, _ = pending['future'].result()
+    except Exception as e:
+        st.error(f"DAR PDF upload to Drive failed: {e}")
+        file_id = web_view_link = None
+    return web_view_link if file_id else None
+
+def _discard_ag_pdf_upload():
+    pending = st.session_state.get('ag_pdf_upload')
+    if pending:
+        discard_background_upload(pending['future'])
+    st.session_state.ag_pdf_upload = None
+# --- End deferred DAR upload helpers ---
+
 # Column names as they are in the DataFrame returned by read_from_spreadsheet (matching expected_cols_header in google_utils)
 # These are Title Cased
 SHEET_COLUMN_NAMES = [
@@ -95,6 +133,7 @@ def audit_group_dashboard(drive_service, sheets_service):
         'ag_current_uploaded_file_name': None,
         'ag_editor_data': pd.DataFrame(columns=DISPLAY_COLUMN_ORDER_EDITOR), # For the editor
         'ag_pdf_drive_url': None,
+        'ag_pdf_upload': None, # Pending background upload (deferred mode)
         'ag_validation_errors': [],
         'ag_uploader_key_suffix': 0,
         'ag_row_to_delete_details': None,
@@ -110,6 +149,7 @@ def audit_group_dashboard(drive_service, sheets_service):
         except Exception: st.sidebar.markdown("*(Logo)*")
         st.markdown(f"**User:** {st.session_state.username}<br>**Group No:** {st.session_state.audit_group_no}", unsafe_allow_html=True)
         if st.button("Logout", key="ag_logout_full_v5", use_container_width=True):
+            _discard_ag_pdf_upload()
             keys_to_clear = list(default_ag_states.keys()) + ['drive_structure_initialized', 'ag_ui_cached_mcm_periods_data', 'ag_ui_cached_mcm_periods_timestamp']
             for ktd in keys_to_clear:
                 if ktd in st.session_state: del st.session_state[ktd]
@@ -130,6 +170,8 @@ def audit_group_dashboard(drive_service, sheets_service):
     # ========================== UPLOAD DAR FOR MCM TAB ==========================
     if selected_tab == "Upload DAR for MCM":
         st.markdown("<h3>Upload DAR PDF for MCM Period</h3>", unsafe_allow_html=True)
+        if st.session_state.get('ag_submit_notice'):
+            st.warning(st.session_state.pop('ag_submit_notice'))
         if not active_periods:
             st.warning("No active MCM periods. Contact Planning Officer.")
         else:
@@ -148,6 +190,7 @@ def audit_group_dashboard(drive_service, sheets_service):
                 mcm_info_current = active_periods[new_mcm_key]
 
                 if st.session_state.ag_current_mcm_key != new_mcm_key:
+                    _discard_ag_pdf_upload()
                     st.session_state.ag_current_mcm_key = new_mcm_key
                     st.session_state.ag_current_uploaded_file_obj = None; st.session_state.ag_current_uploaded_file_name = None
                     st.session_state.ag_editor_data = pd.DataFrame(columns=DISPLAY_COLUMN_ORDER_EDITOR); st.session_state.ag_pdf_drive_url = None
@@ -159,31 +202,51 @@ def audit_group_dashboard(drive_service, sheets_service):
 
                 if uploaded_file:
                     if st.session_state.ag_current_uploaded_file_name != uploaded_file.name or st.session_state.ag_current_uploaded_file_obj is None:
+                        _discard_ag_pdf_upload()
                         st.session_state.ag_current_uploaded_file_obj = uploaded_file; st.session_state.ag_current_uploaded_file_name = uploaded_file.name
                         st.session_state.ag_editor_data = pd.DataFrame(columns=DISPLAY_COLUMN_ORDER_EDITOR); st.session_state.ag_pdf_drive_url = None
                         st.session_state.ag_validation_errors = []
                         # st.rerun() # Avoid rerun here, let extract button control flow
+                elif st.session_state.ag_pdf_upload:
+                    # File removed from the uploader: drop its background upload and the rows extracted from it
+                    _discard_ag_pdf_upload()
+                    st.session_state.ag_current_uploaded_file_obj = None; st.session_state.ag_current_uploaded_file_name = None
+                    st.session_state.ag_editor_data = pd.DataFrame(columns=DISPLAY_COLUMN_ORDER_EDITOR); st.session_state.ag_pdf_drive_url = None
+                    st.session_state.ag_validation_errors = []
 
                 extract_button_key = f"extract_data_btn_final_{st.session_state.ag_current_mcm_key}_{st.session_state.ag_current_uploaded_file_name or 'no_file_yet'}"
                 if st.session_state.ag_current_uploaded_file_obj and st.button("Extract Data from PDF", key=extract_button_key, use_container_width=True):
                     with st.spinner(f"Processing '{st.session_state.ag_current_uploaded_file_name}'... This might take a moment."):
-                        pdf_bytes = st.session_state.ag_current_uploaded_file_obj.getvalue()
                         st.session_state.ag_pdf_drive_url = None 
                         st.session_state.ag_validation_errors = []
 
                         dar_filename_on_drive = f"AG{st.session_state.audit_group_no}_{st.session_state.ag_current_uploaded_file_name}"
-                        pdf_drive_id, pdf_drive_url_temp = upload_to_drive(drive_service, BytesIO(pdf_bytes),
-                                                                           mcm_info_current['drive_folder_id'], dar_filename_on_drive)
+                        if DEFERRED_DAR_UPLOAD_ENABLED:
+                            # Extract from the UploadedFile right away; the upload streams from a view of it and is awaited at submit
+                            _start_ag_pdf_upload(st.session_state.ag_current_uploaded_file_obj, mcm_info_current['drive_folder_id'], dar_filename_on_drive)
+                            pdf_upload_ok = True
+                        else:
+                            # Streamed from the UploadedFile itself in DRIVE_UPLOAD_CHUNK_BYTES requests
+                            upload_progress = st.progress(0.0, text="Uploading DAR PDF to Drive...")
+                            pdf_drive_id, pdf_drive_url_temp, pdf_reused = upload_or_reuse_drive_file(
+                                drive_service, st.session_state.ag_current_uploaded_file_obj, mcm_info_current['drive_folder_id'], dar_filename_on_drive,
+                                progress_callback=lambda sent, total: upload_progress.progress(min(1.0, sent / total) if total else 1.0))
+                            upload_progress.empty()
+                            pdf_upload_ok = bool(pdf_drive_id)
                         temp_list_for_df = []
-                        if not pdf_drive_id:
+                        if not pdf_upload_ok:
                             st.error("Failed to upload PDF to Drive. Cannot proceed with extraction.")
                             base_row_manual = {col: None for col in INTERNAL_DF_COLUMNS_FOR_EDIT}
                             base_row_manual.update({"audit_group_number": st.session_state.audit_group_no, "audit_circle_number": calculate_audit_circle(st.session_state.audit_group_no), "audit_para_heading": "Manual Entry - PDF Upload Failed"})
                             temp_list_for_df.append(base_row_manual)
                         else:
-                            st.session_state.ag_pdf_drive_url = pdf_drive_url_temp
-                            st.success(f"DAR PDF uploaded to Drive: [Link]({st.session_state.ag_pdf_drive_url})")
-                            preprocessed_text = preprocess_pdf_text(BytesIO(pdf_bytes))
+                            if not DEFERRED_DAR_UPLOAD_ENABLED:
+                                st.session_state.ag_pdf_drive_url = pdf_drive_url_temp
+                                if pdf_reused:
+                                    st.success(f"DAR PDF already on Drive (identical file), reusing it: [Link]({st.session_state.ag_pdf_drive_url})")
+                                else:
+                                    st.success(f"DAR PDF uploaded to Drive: [Link]({st.session_state.ag_pdf_drive_url})")
+                            preprocessed_text = preprocess_pdf_text(st.session_state.ag_current_uploaded_file_obj) # UploadedFile is a seekable stream; no extra copy
 
                             if preprocessed_text.startswith("Error"):
                                 st.error(f"PDF Preprocessing Error: {preprocessed_text}")
@@ -297,6 +360,11 @@ def audit_group_dashboard(drive_service, sheets_service):
                 #     st.session_state.ag_validation_errors = validate_data_for_sheet(df_to_submit)
    
                     if not st.session_state.ag_validation_errors:
+                        if st.session_state.ag_pdf_upload:
+                            with st.spinner("Waiting for the DAR PDF upload to Drive to finish..."):
+                                st.session_state.ag_pdf_drive_url = _await_ag_pdf_upload()
+                            if not st.session_state.ag_pdf_drive_url:
+                                st.session_state.ag_pdf_upload = None # Let the next extraction start a fresh upload
                         if not st.session_state.ag_pdf_drive_url: 
                             st.error("PDF Drive URL missing. This indicates the initial PDF upload with extraction failed. Please re-extract data."); st.stop()
 
@@ -315,8 +383,14 @@ def audit_group_dashboard(drive_service, sheets_service):
                                 rows_for_sheet.append(sheet_row)
                             
                             if rows_for_sheet:
-                                if append_to_spreadsheet(sheets_service, mcm_info_current['spreadsheet_id'], rows_for_sheet):
-                                    st.success("Data submitted successfully!"); st.balloons(); time.sleep(1)
+                                append_result = append_period_rows(sheets_service, mcm_info_current['spreadsheet_id'], rows_for_sheet)
+                                if append_result:
+                                    if append_result.get('queued'): # Only in the local mirror so far; its sync thread sends it on
+                                        st.session_state.ag_submit_notice = ("DAR data saved locally but not yet written to Google Sheets. "
+                                                                             "It will be uploaded automatically; do not submit it again.")
+                                    else:
+                                        st.success("Data submitted successfully!"); st.balloons(); time.sleep(1)
+                                    st.session_state.ag_pdf_upload = None # Submitted: the uploaded file is now referenced by the sheet
                                     st.session_state.ag_current_uploaded_file_obj = None; st.session_state.ag_current_uploaded_file_name = None
                                     st.session_state.ag_editor_data = pd.DataFrame(columns=DISPLAY_COLUMN_ORDER_EDITOR); st.session_state.ag_pdf_drive_url = None
                                     st.session_state.ag_validation_errors = []; st.session_state.ag_uploader_key_suffix += 1
@@ -340,7 +414,7 @@ def audit_group_dashboard(drive_service, sheets_service):
                 sel_view_key = st.selectbox("Select MCM Period", options=list(view_period_opts_map.keys()), format_func=lambda k: view_period_opts_map[k], key="ag_view_sel_final_corrected")
                 if sel_view_key and sheets_service:
                     view_sheet_id = mcm_periods_all[sel_view_key]['spreadsheet_id']
-                    with st.spinner("Loading uploads..."): df_sheet_all = read_from_spreadsheet(sheets_service, view_sheet_id)
+                    with st.spinner("Loading uploads..."): df_sheet_all = read_period_sheet(sheets_service, view_sheet_id)
                     
                     if df_sheet_all is not None and not df_sheet_all.empty:
                         # Use SHEET_COLUMN_NAMES (Title Case) which are expected from read_from_spreadsheet
@@ -390,9 +464,6 @@ def audit_group_dashboard(drive_service, sheets_service):
                 sel_del_key = st.selectbox("Select MCM Period", options=list(del_period_opts_map.keys()), format_func=lambda k: del_period_opts_map[k], key="ag_del_sel_final_corrected")
                 if sel_del_key and sheets_service:
                     del_sheet_id = mcm_periods_all[sel_del_key]['spreadsheet_id']
-                    del_sheet_gid = 0
-                    try: del_sheet_gid = sheets_service.spreadsheets().get(spreadsheetId=del_sheet_id).execute().get('sheets', [{}])[0].get('properties', {}).get('sheetId', 0)
-                    except Exception as e_gid: st.error(f"Could not get sheet GID: {e_gid}"); st.stop()
 
                     with st.spinner("Loading entries..."): df_all_del_data = read_from_spreadsheet(sheets_service, del_sheet_id)
                     if df_all_del_data is not None and not df_all_del_data.empty:
@@ -403,7 +474,7 @@ def audit_group_dashboard(drive_service, sheets_service):
 
                             if not my_entries_del.empty:
                                 st.markdown(f"<h4>Your Uploads in {del_period_opts_map[sel_del_key]} (Select to delete):</h4>", unsafe_allow_html=True)
-                                del_options_disp = ["--Select an entry to delete--"]; st.session_state.ag_deletable_map.clear()
+                                del_options_disp = []; st.session_state.ag_deletable_map.clear()
                                 for _, del_row in my_entries_del.iterrows():
                                     # Use TitleCase for .get() as df_all_del_data columns are TitleCase
                                     del_ident = f"TN: {str(del_row.get('Trade Name', 'N/A'))[:20]} | Para: {del_row.get('Audit Para Number', 'N/A')} | Date: {del_row.get('Record Created Date', 'N/A')}"
@@ -416,21 +487,33 @@ def audit_group_dashboard(drive_service, sheets_service):
                                         "DAR PDF URL": str(del_row.get('DAR PDF URL'))
                                     }
                                 
-                                sel_entry_del_str = st.selectbox("Select Entry:", options=del_options_disp, key=f"del_box_final_corrected_{sel_del_key}")
-                                if sel_entry_del_str != "--Select an entry to delete--":
-                                    entry_info_to_delete = st.session_state.ag_deletable_map.get(sel_entry_del_str)
-                                    if entry_info_to_delete is not None :
-                                        orig_idx_to_del = entry_info_to_delete["original_df_index"]
-                                        st.warning(f"Confirm Deletion: TN: **{entry_info_to_delete.get('Trade Name')}**, Para: **{entry_info_to_delete.get('Audit Para Number')}**")
-                                        with st.form(key=f"del_form_final_corrected_{orig_idx_to_del}"):
-                                            pwd = st.text_input("Password:", type="password", key=f"del_pwd_final_corrected_{orig_idx_to_del}")
-                                            if st.form_submit_button("Yes, Delete This Entry"):
+                                sel_entries_del = st.multiselect("Select Entries:", options=del_options_disp, key=f"del_multi_final_corrected_{sel_del_key}")
+                                delete_whole_dar = st.checkbox("Delete all entries of the selected DAR(s)", key=f"del_whole_dar_{sel_del_key}")
+                                if sel_entries_del:
+                                    entries_info_to_delete = [st.session_state.ag_deletable_map[e] for e in sel_entries_del if e in st.session_state.ag_deletable_map]
+                                    if entries_info_to_delete:
+                                        if delete_whole_dar:
+                                            st.warning(f"Confirm Deletion: all your entries of **{len({e['DAR PDF URL'] for e in entries_info_to_delete})}** DAR(s): " + ", ".join(sorted({f"**{e.get('Trade Name')}**" for e in entries_info_to_delete})))
+                                        else:
+                                            st.warning("Confirm Deletion: " + "; ".join(f"TN: **{e.get('Trade Name')}**, Para: **{e.get('Audit Para Number')}**" for e in entries_info_to_delete))
+                                        with st.form(key=f"del_form_final_corrected_{sel_del_key}"):
+                                            pwd = st.text_input("Password:", type="password", key=f"del_pwd_final_corrected_{sel_del_key}")
+                                            if st.form_submit_button("Yes, Delete Selected Entries"):
                                                 if pwd == USER_CREDENTIALS.get(st.session_state.username):
-                                                    if delete_spreadsheet_rows(sheets_service, del_sheet_id, del_sheet_gid, [orig_idx_to_del]): 
-                                                        st.success("Entry deleted."); time.sleep(1); st.rerun()
+                                                    if delete_whole_dar:
+                                                        dar_urls_to_delete = {e["DAR PDF URL"] for e in entries_info_to_delete}
+                                                        my_group_str = str(st.session_state.audit_group_no)
+                                                        deleted_count = delete_spreadsheet_rows_where(
+                                                            sheets_service, del_sheet_id,
+                                                            lambda df: df['DAR PDF URL'].astype(str).isin(dar_urls_to_delete) & (df['Audit Group Number'].astype(str) == my_group_str))
+                                                        deleted_ok = deleted_count is not None
+                                                    else:
+                                                        deleted_ok = delete_spreadsheet_rows(sheets_service, del_sheet_id, None, [e["original_df_index"] for e in entries_info_to_delete])
+                                                    if deleted_ok:
+                                                        st.success("Selected entries deleted."); time.sleep(1); st.rerun()
                                                     else: st.error("Failed to delete from sheet.")
                                                 else: st.error("Incorrect password.")
-                                    else: st.error("Could not identify selected entry. Please refresh and re-select.")
+                                    else: st.error("Could not identify selected entries. Please refresh and re-select.")
                             else: st.info(f"You have no entries in {del_period_opts_map[sel_del_key]} to delete.")
                         else: st.warning("Sheet missing 'Audit Group Number' column.")
                     elif df_all_del_data is None: st.error("Error reading sheet for deletion.")
@@ -484,10 +484,10 @@ from reportlab.lib.units import inch
 from PyPDF2 import PdfWriter, PdfReader
 from reportlab.pdfgen import canvas
 
-from google_utils import read_from_spreadsheet
-from googleapiclient.http import MediaIoBaseDownload
+from google_utils import map_google_tasks, download_drive_media_spooled
+from sheet_mirror import read_period_sheet
 from googleapiclient.errors import HttpError
-from google_utils import update_spreadsheet_from_df
+from google_utils import update_spreadsheet_from_df, read_from_spreadsheet
 # --- NEW HELPER FUNCTION FOR INDIAN NUMBERING ---
 def format_inr(n):
     """
@@ -538,6 +538,14 @@ def get_file_id_from_drive_url(url: str) -> str | None:
             return query_params['id'][0]
     return None
 
+def fetch_dar_pdf_reader(drive_service, sheets_service, file_id):
+    """Downloads one DAR PDF from Drive; runs on a worker thread via map_google_tasks."""
+    if not file_id:
+        return None
+    request = drive_service.files().get_media(fileId=file_id)
+    # Large scanned DARs spill to a memory-mapped temp file instead of sitting in RAM for every concurrent compile
+    return PdfReader(download_drive_media_spooled(request))
+
 def create_page_number_stamp_pdf(buffer, page_num, total_pages):
     """
     Creates a PDF in memory with 'Page X of Y' at the bottom center.
@@ -624,6 +632,13 @@ def calculate_audit_circle_agenda(audit_group_number_val):
         return 0
     except (ValueError, TypeError, AttributeError): return 0
 
+def para_row_keys(df):
+    # (DAR PDF URL, Audit Para Number) identifies a para wherever its row sits; positions shift when
+    # DARs are added or deleted. Typed and text reads of the same row give the same key.
+    urls = df['DAR PDF URL'].fillna('').astype(str).str.strip() if 'DAR PDF URL' in df.columns else pd.Series('', index=df.index)
+    para_numbers = pd.to_numeric(df['Audit Para Number'], errors='coerce') if 'Audit Para Number' in df.columns else pd.Series(pd.NA, index=df.index)
+    return pd.Series([(url, None if pd.isna(num) else int(num)) for url, num in zip(urls, para_numbers)], index=df.index, dtype=object)
+
 
 def mcm_agenda_tab(drive_service, sheets_service, mcm_periods):
     st.markdown("### MCM Agenda Preparation")
@@ -664,20 +679,18 @@ def mcm_agenda_tab(drive_service, sheets_service, mcm_periods):
     # --- Data Loading using Session State ---
     if 'df_period_data' not in st.session_state or st.session_state.get('current_period_key') != selected_period_key:
         with st.spinner(f"Loading data for {month_year_str}..."):
-            df = read_from_spreadsheet(sheets_service, selected_period_info['spreadsheet_id'])
+            # Typed read: numeric columns already arrive as Int16/float64, no re-parsing needed
+            df = read_period_sheet(sheets_service, selected_period_info['spreadsheet_id'], typed=True)
             if df is None or df.empty:
                 st.info(f"No data found in the spreadsheet for {month_year_str}.")
                 st.session_state.df_period_data = pd.DataFrame()
                 return
             
-            cols_to_convert_numeric = ['Audit Group Number', 'Audit Circle Number', 'Total Amount Detected (Overall Rs)',
-                                       'Total Amount Recovered (Overall Rs)', 'Audit Para Number',
-                                       'Revenue Involved (Lakhs Rs)', 'Revenue Recovered (Lakhs Rs)']
-            for col_name in cols_to_convert_numeric:
-                if col_name in df.columns:
-                    df[col_name] = df[col_name].astype(str).str.replace(r'[^\d.]', '', regex=True)
-                    df[col_name] = pd.to_numeric(df[col_name], errors='coerce')
-                else:
+            cols_expected_numeric = ['Audit Group Number', 'Audit Circle Number', 'Total Amount Detected (Overall Rs)',
+                                     'Total Amount Recovered (Overall Rs)', 'Audit Para Number',
+                                     'Revenue Involved (Lakhs Rs)', 'Revenue Recovered (Lakhs Rs)']
+            for col_name in cols_expected_numeric:
+                if col_name not in df.columns:
                     df[col_name] = 0 if "Amount" in col_name or "Revenue" in col_name else pd.NA
             
             st.session_state.df_period_data = df
@@ -867,23 +880,46 @@ def mcm_agenda_tab(drive_service, sheets_service, mcm_periods):
                                 with st.spinner("Saving decisions..."):
                                     if 'MCM Decision' not in st.session_state.df_period_data.columns:
                                         st.session_state.df_period_data['MCM Decision'] = ""
+                                    # df_period_data is typed for display and may be stale; write back through a fresh
+                                    # untyped read, matching paras by key rather than row position, so only the
+                                    # decision cells change and every other cell stays as entered
+                                    df_decisions_to_save = read_from_spreadsheet(sheets_service, selected_period_info['spreadsheet_id'])
+                                    if df_decisions_to_save is None:
+                                        df_decisions_to_save = pd.DataFrame()
+                                    if 'MCM Decision' not in df_decisions_to_save.columns:
+                                        df_decisions_to_save['MCM Decision'] = ""
+                                    sheet_para_keys = para_row_keys(df_decisions_to_save)
+                                    sheet_para_key_set = set(sheet_para_keys)
+                                    item_para_keys = para_row_keys(df_trade_paras_item)
                                     
+                                    decisions_by_key, missing_paras = {}, []
                                     for index, row in df_trade_paras_item.iterrows():
                                         para_num_str = str(int(row["Audit Para Number"])) if pd.notna(row["Audit Para Number"]) and row["Audit Para Number"] != 0 else "N/A"
                                         decision_key = f"mcm_decision_{trade_name_item}_{para_num_str}_{index}"
-                                        selected_decision = st.session_state.get(decision_key, decision_options[0])
-                                        st.session_state.df_period_data.loc[index, 'MCM Decision'] = selected_decision
-                                    
-                                    success = update_spreadsheet_from_df(
-                                        sheets_service=sheets_service,
-                                        spreadsheet_id=selected_period_info['spreadsheet_id'],
-                                        df_to_write=st.session_state.df_period_data
-                                    )
+                                        decisions_by_key[item_para_keys[index]] = st.session_state.get(decision_key, decision_options[0])
+                                        if not item_para_keys[index][0] or item_para_keys[index] not in sheet_para_key_set:
+                                            missing_paras.append(para_num_str)
                                     
-                                    if success:
-                                        st.success("✅ Decisions saved successfully!")
+                                    if missing_paras:
+                                        # The sheet changed since the agenda was loaded; the next run reloads it
+                                        st.session_state.current_period_key = None
+                                        st.error(f"❌ Decisions not saved: para(s) {', '.join(missing_paras)} of {trade_name_item} are no longer in the sheet as loaded "
+                                                 "(DARs may have been added or deleted). Reload the agenda, review the decisions and save again.")
                                     else:
-                                        st.error("❌ Failed to save decisions. Check app logs for details.")
+                                        sheet_decisions = sheet_para_keys.map(decisions_by_key.get)
+                                        df_decisions_to_save.loc[sheet_decisions.notna(), 'MCM Decision'] = sheet_decisions[sheet_decisions.notna()]
+                                        success = update_spreadsheet_from_df(
+                                            sheets_service=sheets_service,
+                                            spreadsheet_id=selected_period_info['spreadsheet_id'],
+                                            df_to_write=df_decisions_to_save
+                                        )
+                                        
+                                        if success:
+                                            for index in df_trade_paras_item.index:
+                                                st.session_state.df_period_data.loc[index, 'MCM Decision'] = decisions_by_key[item_para_keys[index]]
+                                            st.success("✅ Decisions saved successfully!")
+                                        else:
+                                            st.error("❌ Failed to save decisions. Check app logs for details.")
                             
                             st.markdown("<hr>", unsafe_allow_html=True)
 
@@ -919,42 +955,32 @@ def mcm_agenda_tab(drive_service, sheets_service, mcm_periods):
                     total_steps_for_pdf = 4 + (2 * total_dars)
                     current_pdf_step = 0
 
-                    # Step 1: Pre-fetch DAR PDFs to count pages
+                    # Step 1: Pre-fetch DAR PDFs to count pages (downloads fan out over a thread pool)
                     if drive_service:
                         status_message_area.info(f"Pre-fetching {total_dars} DAR PDFs to count pages and prepare content...")
-                        for idx, dar_row in unique_dars_to_process.iterrows():
-                            current_pdf_step += 1
-                            dar_url_val = dar_row.get('DAR PDF URL')
-                            file_id_val = get_file_id_from_drive_url(dar_url_val)
-                            num_pages_val = 1  # Default in case of fetch failure
-                            reader_obj_val = None
-                            trade_name_val = dar_row.get('Trade Name', 'Unknown DAR')
-                            circle_val = f"Circle {int(dar_row.get(circle_col_to_use, 0))}"
-
-                            status_message_area.info(f"Step {current_pdf_step}/{total_steps_for_pdf}: Fetching DAR for {trade_name_val}...")
-                            if file_id_val:
-                                try:
-                                    req_val = drive_service.files().get_media(fileId=file_id_val)
-                                    fh_val = BytesIO()
-                                    downloader = MediaIoBaseDownload(fh_val, req_val)
-                                    done = False
-                                    while not done:
-                                        status, done = downloader.next_chunk(num_retries=2)
-                                    fh_val.seek(0)
-                                    reader_obj_val = PdfReader(fh_val)
-                                    num_pages_val = len(reader_obj_val.pages) if reader_obj_val.pages else 1
-                                except HttpError as he:
-                                    st.warning(f"PDF HTTP Error for {trade_name_val} ({dar_url_val}): {he}. Using placeholder.")
-                                except Exception as e_fetch_val:
-                                    st.warning(f"PDF Read Error for {trade_name_val} ({dar_url_val}): {e_fetch_val}. Using placeholder.")
-
+                        for _, dar_row in unique_dars_to_process.iterrows():
                             dar_objects_for_merge_and_index.append({
-                                'circle': circle_val,
-                                'trade_name': trade_name_val,
-                                'num_pages_in_dar': num_pages_val,
-                                'pdf_reader': reader_obj_val,
-                                'dar_url': dar_url_val
+                                'circle': f"Circle {int(dar_row.get(circle_col_to_use, 0))}",
+                                'trade_name': dar_row.get('Trade Name', 'Unknown DAR'),
+                                'num_pages_in_dar': 1,  # Default in case of fetch failure
+                                'pdf_reader': None,
+                                'dar_url': dar_row.get('DAR PDF URL')
                             })
+
+                        file_ids_to_fetch = [get_file_id_from_drive_url(item['dar_url']) for item in dar_objects_for_merge_and_index]
+                        for idx, reader_obj_val, fetch_error in map_google_tasks(fetch_dar_pdf_reader, file_ids_to_fetch):
+                            current_pdf_step += 1
+                            dar_item = dar_objects_for_merge_and_index[idx]
+                            trade_name_val, dar_url_val = dar_item['trade_name'], dar_item['dar_url']
+                            if isinstance(fetch_error, HttpError):
+                                st.warning(f"PDF HTTP Error for {trade_name_val} ({dar_url_val}): {fetch_error}. Using placeholder.")
+                            elif fetch_error is not None:
+                                st.warning(f"PDF Read Error for {trade_name_val} ({dar_url_val}): {fetch_error}. Using placeholder.")
+                            elif reader_obj_val is not None:
+                                dar_item['pdf_reader'] = reader_obj_val
+                                dar_item['num_pages_in_dar'] = len(reader_obj_val.pages) if reader_obj_val.pages else 1
+
+                            status_message_area.info(f"Step {current_pdf_step}/{total_steps_for_pdf}: Fetched DAR for {trade_name_val}...")
                             progress_bar.progress(current_pdf_step / total_steps_for_pdf)
                     else:
                         status_message_area.error("Google Drive service not available.")
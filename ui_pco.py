@@ -12,14 +12,17 @@ from ui_mcm_agenda import mcm_agenda_tab # <--- IMPORT THE NEW TAB FUNCTION
 
 # Assuming google_utils.py and config.py are in the same directory and correctly set up
 from google_utils import (
-    load_mcm_periods, save_mcm_periods, create_drive_folder,
-    create_spreadsheet, read_from_spreadsheet,update_spreadsheet_from_df
+    save_mcm_periods, create_mcm_period_resources, read_from_spreadsheet,update_spreadsheet_from_df, get_cached_mcm_periods,
+    new_mcm_period_changeset, stage_mcm_period_update, stage_mcm_period_delete, mcm_period_changeset_size,
+    apply_mcm_period_changeset, commit_mcm_period_changes, drop_mcm_period_conflicts, get_mcm_periods_revision_id,
+    reconcile_drive_sharing
 )
-from config import USER_CREDENTIALS, MCM_PERIODS_FILENAME_ON_DRIVE
+from sheet_mirror import read_period_sheets
+from config import USER_CREDENTIALS, MCM_PERIODS_FILENAME_ON_DRIVE, DRIVE_SHARING_MODE
 
 def pco_dashboard(drive_service, sheets_service):
     st.markdown("<div class='sub-header'>Planning & Coordination Officer Dashboard</div>", unsafe_allow_html=True)
-    mcm_periods = load_mcm_periods(drive_service)  # Direct load, no caching
+    mcm_periods = get_cached_mcm_periods(drive_service, 'pco_cached_mcm_periods')  # Shared in-process copy, refetched only when the file changes
 
     with st.sidebar:
         try:
@@ -96,8 +99,8 @@ def pco_dashboard(drive_service, sheets_service):
                         folder_name = f"MCM_DARs_{selected_month_name}_{selected_year}"
                         spreadsheet_title = f"MCM_Audit_Paras_{selected_month_name}_{selected_year}"
 
-                        folder_id, folder_url = create_drive_folder(drive_service, folder_name, parent_id=master_folder_id)
-                        sheet_id, sheet_url = create_spreadsheet(sheets_service, drive_service, spreadsheet_title, parent_folder_id=master_folder_id)
+                        # Folder and spreadsheet are created in parallel, each with a single Drive call
+                        folder_id, folder_url, sheet_id, sheet_url = create_mcm_period_resources(folder_name, spreadsheet_title, master_folder_id)
 
                         if folder_id and sheet_id:
                             mcm_periods_local_copy_create[period_key] = {
@@ -106,6 +109,9 @@ def pco_dashboard(drive_service, sheets_service):
                                 "spreadsheet_id": sheet_id, "spreadsheet_url": sheet_url, "active": True
                             }
                             if save_mcm_periods(drive_service, mcm_periods_local_copy_create):  # Save the updated dict
+                                if 'pco_period_changeset' in st.session_state:
+                                    # Our own write is not a concurrent change: staged edits now apply on top of it
+                                    st.session_state.pco_period_changeset['base_revision_id'] = get_mcm_periods_revision_id()
                                 st.success(f"Successfully created MCM period for {selected_month_name} {selected_year}!")
                                 st.markdown(f"**Drive Folder:** <a href='{folder_url}' target='_blank'>Open Folder</a>", unsafe_allow_html=True)
                                 st.markdown(f"**Spreadsheet:** <a href='{sheet_url}' target='_blank'>Open Sheet</a>", unsafe_allow_html=True)
@@ -121,7 +127,13 @@ def pco_dashboard(drive_service, sheets_service):
         st.markdown("<h4 style='color: red;'>Pls Note ,Deleting the records will delete all the DAR and Spreadsheet data uploaded for that month.</h4>", unsafe_allow_html=True)
         st.markdown("<h5 style='color: green;'>Only the Months which are marked as 'Active' by Planning officer, will be available in Audit group screen for uploading DARs.</h5>", unsafe_allow_html=True)
         
-        mcm_periods_manage_local_copy = mcm_periods.copy()  # Work with a copy
+        # Toggles and deletions are staged in a change set and saved together with one Drive write
+        if 'pco_period_changeset' not in st.session_state:
+            st.session_state.pco_period_changeset = new_mcm_period_changeset(get_mcm_periods_revision_id())
+        changeset = st.session_state.pco_period_changeset
+        mcm_periods_manage_local_copy = apply_mcm_period_changeset(mcm_periods, changeset)  # What the config will look like once saved
+
+        save_bar = st.container()  # Filled after the list below, so it reflects toggles made in this run
 
         if not mcm_periods_manage_local_copy:
             st.info("No MCM periods created yet.")
@@ -142,13 +154,8 @@ def pco_dashboard(drive_service, sheets_service):
                     is_active_current = data_for_manage.get("active", False)
                     new_status_current = st.checkbox("Active", value=is_active_current, key=f"active_manage_tab_{period_key_for_manage}")
                     if new_status_current != is_active_current:
-                        mcm_periods_manage_local_copy[period_key_for_manage]["active"] = new_status_current
-                        if save_mcm_periods(drive_service, mcm_periods_manage_local_copy):
-                            st.success(f"Status for {month_name_disp_mng} {year_disp_mng} updated.")
-                            st.rerun()
-                        else:
-                            st.error("Failed to save updated status to Drive.")
-                            mcm_periods_manage_local_copy[period_key_for_manage]["active"] = is_active_current  # Revert local copy
+                        # Staged only; written to Drive by the Save button together with other changes
+                        stage_mcm_period_update(changeset, mcm_periods, period_key_for_manage, active=new_status_current)
                 with col4_manage:
                     if st.button("Delete Period Record", key=f"delete_mcm_btn_mng_tab_{period_key_for_manage}", type="secondary"):
                         st.session_state.period_to_delete = period_key_for_manage
@@ -174,16 +181,66 @@ def pco_dashboard(drive_service, sheets_service):
                             st.rerun()
                     if submitted_delete_final:
                         if pco_password_confirm_del == USER_CREDENTIALS.get("planning_officer"):
-                            del mcm_periods_manage_local_copy[period_key_to_delete_confirm]
-                            if save_mcm_periods(drive_service, mcm_periods_manage_local_copy):
-                                st.success(f"MCM record for {period_data_to_delete_confirm.get('month_name')} {period_data_to_delete_confirm.get('year')} deleted from tracking.")
-                            else:
-                                st.error("Failed to save changes to Drive after deleting record locally.")
+                            stage_mcm_period_delete(changeset, period_key_to_delete_confirm)
+                            st.success(f"MCM record for {period_data_to_delete_confirm.get('month_name')} {period_data_to_delete_confirm.get('year')} marked for deletion. Click Save to apply.")
                             st.session_state.show_delete_confirm = False
                             st.session_state.period_to_delete = None
                             st.rerun()
                         else:
                             st.error("Incorrect password.")
+
+        with save_bar:
+            pending_changes = mcm_period_changeset_size(changeset)
+            if pending_changes:
+                save_col, discard_col = st.columns(2)
+                with save_col:
+                    if st.button(f"Save {pending_changes} pending change(s)", type="primary", use_container_width=True, key="save_period_changeset"):
+                        saved, rebased, conflicts = commit_mcm_period_changes(drive_service, changeset)
+                        conflict_lines = "\n".join(f"- {conflict['message']}" for conflict in conflicts)
+                        if saved and conflicts:
+                            # Saved, but a concurrent save was overwritten: stay on this run so the warning is read
+                            st.warning("Period changes saved, with a problem:\n" + conflict_lines)
+                            del st.session_state.pco_period_changeset
+                        elif saved:
+                            if rebased:
+                                st.info("The period configuration was changed elsewhere meanwhile; your changes were applied on top of the latest version.")
+                            st.success("Period changes saved.")
+                            del st.session_state.pco_period_changeset
+                            time.sleep(0.5); st.rerun()
+                        elif conflicts:
+                            # Nothing was written. The conflicting edits are taken out; the rest stay staged on the latest version
+                            drop_mcm_period_conflicts(changeset, conflicts)
+                            changeset['base_revision_id'] = get_mcm_periods_revision_id()
+                            for conflict in conflicts:
+                                st.session_state.pop(f"active_manage_tab_{conflict['period_key']}", None)
+                            st.warning("Nothing was saved: the period configuration was changed elsewhere meanwhile and these "
+                                       "changes of yours conflict with it. They have been removed from your pending changes; "
+                                       "review the periods and save again.\n" + conflict_lines)
+                with discard_col:
+                    if st.button("Discard changes", use_container_width=True, key="discard_period_changeset"):
+                        del st.session_state.pco_period_changeset
+                        for period_key_reset in mcm_periods:  # Let the checkboxes pick up the saved values again
+                            st.session_state.pop(f"active_manage_tab_{period_key_reset}", None)
+                        st.rerun()
+                if changeset['deleted']:
+                    st.caption("Marked for deletion: " + ", ".join(f"{mcm_periods.get(k, {}).get('month_name', k)} {mcm_periods.get(k, {}).get('year', '')}" for k in changeset['deleted']))
+
+        with st.expander("Drive sharing maintenance"):
+            st.caption(f"Sharing mode: **{DRIVE_SHARING_MODE}**. "
+                       + ("Files inherit the public read permission of their folder." if DRIVE_SHARING_MODE == "folder"
+                          else "Every file is shared individually.")
+                       + " Reconciling checks every folder and file under the app's master folder and fixes missing permissions in batches.")
+            master_folder_id_sharing = st.session_state.get('master_drive_folder_id')
+            if st.button("Reconcile Drive sharing", key="pco_reconcile_drive_sharing", disabled=not master_folder_id_sharing):
+                sharing_progress = st.empty()
+                sharing_stats = {'folders': 0, 'files': 0, 'fixed': 0, 'errors': 0}
+                try:
+                    for sharing_stats in reconcile_drive_sharing(drive_service, master_folder_id_sharing):
+                        sharing_progress.info(f"Checked {sharing_stats['folders']} folder(s) and {sharing_stats['files']} file(s); fixed {sharing_stats['fixed']}...")
+                    sharing_progress.success(f"Sharing reconciled: {sharing_stats['folders']} folder(s), {sharing_stats['files']} file(s) checked, "
+                                             f"{sharing_stats['fixed']} permission(s) added, {sharing_stats['errors']} error(s).")
+                except Exception as e:
+                    sharing_progress.error(f"Sharing reconciliation stopped: {e}")
     # ========================== VIEW UPLOADED REPORTS TAB ==========================
     elif selected_tab == "View Uploaded Reports":
         st.markdown("<h3>View Uploaded Reports Summary</h3>", unsafe_allow_html=True)
@@ -252,7 +309,7 @@ def pco_dashboard(drive_service, sheets_service):
     
                                     if st.button("Save Changes to Spreadsheet", type="primary"):
                                         with st.spinner("Saving changes to Google Sheet..."):
-                                            success = update_spreadsheet_from_df(sheets_service, sheet_id_for_report_view, edited_df)
+                                            success = update_spreadsheet_from_df(sheets_service, sheet_id_for_report_view, edited_df, source_df=df_report_data)
                                             if success:
                                                 st.success("Changes saved successfully!")
                                                 time.sleep(1)
@@ -343,22 +400,24 @@ def pco_dashboard(drive_service, sheets_service):
             elif not viz_options_list:
                 st.info("No MCM periods available to visualize.")
             else:
-                selected_viz_period_str_tab = st.selectbox("Select MCM Period for Visualization", options=viz_options_list, key="pco_viz_selectbox_final_v4")
-                if selected_viz_period_str_tab and sheets_service:
-                    selected_viz_period_k_tab = next((k for k, p in all_mcm_periods_for_viz_tab.items() if f"{p.get('month_name')} {p.get('year')}" == selected_viz_period_str_tab), None)
+                # Several periods (e.g. year-to-date) can be combined; their sheets are loaded concurrently
+                selected_viz_period_strs_tab = st.multiselect("Select MCM Period(s) for Visualization", options=viz_options_list,
+                                                              default=viz_options_list[:1], key="pco_viz_periods_multiselect")
+                selected_viz_period_str_tab = ", ".join(selected_viz_period_strs_tab)
+                if selected_viz_period_strs_tab and sheets_service:
+                    selected_viz_period_k_tab = [k for k, p in sorted(all_mcm_periods_for_viz_tab.items()) if f"{p.get('month_name')} {p.get('year')}" in selected_viz_period_strs_tab]
                     if selected_viz_period_k_tab:
-                        sheet_id_for_viz_tab = all_mcm_periods_for_viz_tab[selected_viz_period_k_tab]['spreadsheet_id']
                         with st.spinner("Loading data for visualizations..."):
-                            df_viz_data = read_from_spreadsheet(sheets_service, sheet_id_for_viz_tab)  # Main DataFrame for this tab
+                            df_viz_data = read_period_sheets(sheets_service, all_mcm_periods_for_viz_tab, selected_viz_period_k_tab, typed=True)  # Main DataFrame for this tab (typed columns, 'period' column)
                         if df_viz_data is not None and not df_viz_data.empty:
-                            # --- Data Cleaning and Preparation ---
+                            # --- Data Preparation (amounts and group numbers arrive already numeric) ---
                             viz_amount_cols = ['Total Amount Detected (Overall Rs)', 'Total Amount Recovered (Overall Rs)', 'Revenue Involved (Lakhs Rs)', 'Revenue Recovered (Lakhs Rs)']
                             for v_col in viz_amount_cols:
                                 if v_col in df_viz_data.columns:
-                                    df_viz_data[v_col] = pd.to_numeric(df_viz_data[v_col], errors='coerce').fillna(0)
+                                    df_viz_data[v_col] = df_viz_data[v_col].fillna(0)
                             
                             if 'Audit Group Number' in df_viz_data.columns:
-                                df_viz_data['Audit Group Number'] = pd.to_numeric(df_viz_data['Audit Group Number'], errors='coerce').fillna(0).astype(int)
+                                df_viz_data['Audit Group Number'] = df_viz_data['Audit Group Number'].fillna(0).astype(int)
     
                             # --- De-duplicate data for aggregated charts to prevent inflated sums ---
                             if 'DAR PDF URL' in df_viz_data.columns and df_viz_data['DAR PDF URL'].notna().any():
@@ -424,9 +483,10 @@ def pco_dashboard(drive_service, sheets_service):
                                     df['Circle Number For Plot'] = 0
                                 df['Circle Number Str Plot'] = df['Circle Number For Plot'].astype(str)
                                 
-                                df['Category'] = df.get('Category', pd.Series(dtype='str')).fillna('Unknown')
+                                # Category/Status are categorical in typed reads; cast so the placeholder label can be filled in
+                                df['Category'] = df.get('Category', pd.Series(dtype='str')).astype(object).fillna('Unknown')
                                 df['Trade Name'] = df.get('Trade Name', pd.Series(dtype='str')).fillna('Unknown Trade Name')
-                                df['Status of para'] = df.get('Status of para', pd.Series(dtype='str')).fillna('Unknown')
+                                df['Status of para'] = df.get('Status of para', pd.Series(dtype='str')).astype(object).fillna('Unknown')
     
                             # --- Para Status Distribution (uses original full data) ---
                             st.markdown("---")
@@ -4,7 +4,7 @@ import pandas as pd
 from datetime import datetime, timedelta
 
 # Utility imports
-from google_utils import find_or_create_log_sheet
+from google_utils import find_or_create_log_sheet, get_drive_file_generation
 from reports_utils import generate_login_report, get_log_data
 
 def pco_reports_dashboard(drive_service, sheets_service):
@@ -40,7 +40,7 @@ def pco_reports_dashboard(drive_service, sheets_service):
 
         with st.spinner("Fetching and processing log data..."):
             # Use the cached data fetching function
-            log_df = get_log_data(sheets_service, log_sheet_id)
+            log_df = get_log_data(sheets_service, log_sheet_id, get_drive_file_generation(log_sheet_id))
             
             if log_df.empty:
                 st.info("No log data has been recorded yet.")
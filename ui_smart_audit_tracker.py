@@ -10,6 +10,7 @@ import time
 # Assuming google_utils.py and config.py are correctly set up
 from google_utils import (
     read_from_spreadsheet,
+    read_spreadsheet_columns,
     find_or_create_spreadsheet,
     update_spreadsheet_from_df,
     upload_to_drive
@@ -18,6 +19,17 @@ from config import SMART_AUDIT_MASTER_DB_SHEET_NAME
 
 # --- Helper Functions ---
 
+def upload_pdf_with_progress(drive_service, uploaded_pdf, folder_id, filename_on_drive):
+    """Streams an uploaded PDF to Drive while showing a progress bar. Returns (file_id, webViewLink)."""
+    progress_bar = st.progress(0.0, text=f"Uploading {filename_on_drive}...")
+    def show_progress(sent, total):
+        progress_bar.progress(min(1.0, sent / total) if total else 1.0,
+                              text=f"Uploading {filename_on_drive}... {sent // 1024:,} / {total // 1024:,} KiB")
+    try:
+        return upload_to_drive(drive_service, uploaded_pdf, folder_id, filename_on_drive, progress_callback=show_progress)
+    finally:
+        progress_bar.empty()
+
 def df_to_excel(df):
     """Converts a DataFrame to an in-memory Excel file."""
     output = BytesIO()
@@ -193,9 +205,11 @@ def render_reassign_units_tab(drive_service, sheets_service, db_sheet_id):
         search_button = st.form_submit_button("Search GSTIN", use_container_width=True)
 
     if search_button and search_gstin:
-        master_df = read_from_spreadsheet(sheets_service, db_sheet_id)
-        if master_df is not None and not master_df.empty and 'GSTIN' in master_df.columns:
-            result_df = master_df[(master_df['GSTIN'] == search_gstin.strip()) & (master_df['Financial Year'] == search_fy)]
+        # Scan only the two key columns, then fetch the matching row alone
+        key_df = read_spreadsheet_columns(sheets_service, db_sheet_id, ['GSTIN', 'Financial Year'])
+        if key_df is not None and not key_df.empty and 'GSTIN' in key_df.columns:
+            match_idx = key_df.index[(key_df['GSTIN'] == search_gstin.strip()) & (key_df['Financial Year'] == search_fy)]
+            result_df = read_spreadsheet_columns(sheets_service, db_sheet_id, start_row=match_idx[0], end_row=match_idx[0] + 1) if len(match_idx) else pd.DataFrame()
             if not result_df.empty:
                 st.session_state.found_gstin_details = result_df.iloc[0].to_dict()
                 st.session_state.show_reassign_form = True
@@ -365,7 +379,7 @@ def process_allocation_upload(drive_service, sheets_service, db_sheet_id, excel_
         st.info("Validation successful. Uploading office order and saving data...")
         master_folder_id = st.session_state.get('master_drive_folder_id')
         pdf_filename = f"OfficeOrder_{fin_year.replace('-', '_')}_{int(time.time())}.pdf"
-        pdf_id, pdf_url = upload_to_drive(drive_service, pdf_file.getvalue(), master_folder_id, pdf_filename)
+        pdf_id, pdf_url = upload_pdf_with_progress(drive_service, pdf_file, master_folder_id, pdf_filename)
 
         if not pdf_url:
             st.error("Failed to upload Office Order PDF. Aborting data save.")
@@ -381,7 +395,7 @@ def process_allocation_upload(drive_service, sheets_service, db_sheet_id, excel_
         new_data_df['Old Circle Number'] = None
 
         final_df = pd.concat([master_df, new_data_df], ignore_index=True)
-        success = update_spreadsheet_from_df(sheets_service, db_sheet_id, final_df)
+        success = update_spreadsheet_from_df(sheets_service, db_sheet_id, final_df, source_df=master_df)
 
         if success:
             st.success("Excel data validated and saved successfully!")
@@ -405,7 +419,7 @@ def process_reassignment(drive_service, sheets_service, db_sheet_id, old_details
         record_index = idx[0]
         master_folder_id = st.session_state.get('master_drive_folder_id')
         pdf_filename = f"ReallocOrder_{old_details['Financial Year'].replace('-', '_')}_{old_details['GSTIN']}_{int(time.time())}.pdf"
-        pdf_id, pdf_url = upload_to_drive(drive_service, realloc_pdf.getvalue(), master_folder_id, pdf_filename)
+        pdf_id, pdf_url = upload_pdf_with_progress(drive_service, realloc_pdf, master_folder_id, pdf_filename)
 
         if not pdf_url:
             st.error("Failed to upload Reallocation Office Order PDF. Aborting update.")
@@ -629,7 +643,7 @@ def process_allocation_upload(drive_service, sheets_service, db_sheet_id, excel_
         st.info("Validation successful. Uploading office order and saving data...")
         master_folder_id = st.session_state.get('master_drive_folder_id')
         pdf_filename = f"OfficeOrder_{fin_year.replace('-', '_')}_{int(time.time())}.pdf"
-        pdf_id, pdf_url = upload_to_drive(drive_service, pdf_file.getvalue(), master_folder_id, pdf_filename)
+        pdf_id, pdf_url = upload_pdf_with_progress(drive_service, pdf_file, master_folder_id, pdf_filename)
 
         if not pdf_url:
             st.error("Failed to upload Office Order PDF. Aborting data save.")
@@ -646,7 +660,7 @@ def process_allocation_upload(drive_service, sheets_service, db_sheet_id, excel_
 
         # Combine with master and save
         final_df = pd.concat([master_df, new_data_df], ignore_index=True)
-        success = update_spreadsheet_from_df(sheets_service, db_sheet_id, final_df)
+        success = update_spreadsheet_from_df(sheets_service, db_sheet_id, final_df, source_df=master_df)
 
         if success:
             st.success("Excel data validated and saved successfully!")
@@ -765,7 +779,7 @@ def process_reassignment(drive_service, sheets_service, db_sheet_id, old_details
         # Upload new PDF
         master_folder_id = st.session_state.get('master_drive_folder_id')
         pdf_filename = f"ReallocOrder_{old_details['Financial Year'].replace('-', '_')}_{old_details['GSTIN']}_{int(time.time())}.pdf"
-        pdf_id, pdf_url = upload_to_drive(drive_service, realloc_pdf.getvalue(), master_folder_id, pdf_filename)
+        pdf_id, pdf_url = upload_pdf_with_progress(drive_service, realloc_pdf, master_folder_id, pdf_filename)
 
         if not pdf_url:
             st.error("Failed to upload Reallocation Office Order PDF. Aborting update.")